@@ -0,0 +1,64 @@
+"""add story stats
+
+Revision ID: 5b1e7c3f9a20
+Revises: 4058ebc3ae14
+Create Date: 2026-10-17 09:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c3f9a20'
+down_revision: Union[str, Sequence[str], None] = '4058ebc3ae14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('story_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('story_id', sa.Integer(), nullable=False),
+    sa.Column('views_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('hugs_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('favorites_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('laugh_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('fire_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('angry_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['story_id'], ['story.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_story_stats_id'), 'story_stats', ['id'], unique=False)
+    op.create_index(op.f('ix_story_stats_story_id'), 'story_stats', ['story_id'], unique=True)
+
+    # Бэкфилл счётчиков для уже существующих историй
+    op.execute(
+        """
+        INSERT INTO story_stats (
+            story_id, views_count, hugs_count, comments_count, favorites_count,
+            laugh_count, fire_count, angry_count
+        )
+        SELECT
+            s.id,
+            (SELECT count(*) FROM view v WHERE v.story_id = s.id),
+            (SELECT count(*) FROM hug h WHERE h.story_id = s.id),
+            (SELECT count(*) FROM comment c WHERE c.story_id = s.id),
+            (SELECT count(*) FROM favoritestory f WHERE f.story_id = s.id),
+            (SELECT count(*) FROM reaction r WHERE r.story_id = s.id AND r.type_reaction = 'LAUGH'),
+            (SELECT count(*) FROM reaction r WHERE r.story_id = s.id AND r.type_reaction = 'FIRE'),
+            (SELECT count(*) FROM reaction r WHERE r.story_id = s.id AND r.type_reaction = 'ANGRY')
+        FROM story s
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_story_stats_story_id'), table_name='story_stats')
+    op.drop_index(op.f('ix_story_stats_id'), table_name='story_stats')
+    op.drop_table('story_stats')
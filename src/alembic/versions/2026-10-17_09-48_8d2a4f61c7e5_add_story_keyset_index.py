@@ -0,0 +1,28 @@
+"""add story keyset index
+
+Revision ID: 8d2a4f61c7e5
+Revises: 5b1e7c3f9a20
+Create Date: 2026-10-17 09:48:05.117390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2a4f61c7e5'
+down_revision: Union[str, Sequence[str], None] = '5b1e7c3f9a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_story_created_id', 'story', ['created', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_story_created_id', table_name='story')
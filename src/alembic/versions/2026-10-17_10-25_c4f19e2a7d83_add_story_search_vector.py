@@ -0,0 +1,46 @@
+"""add story search vector
+
+Revision ID: c4f19e2a7d83
+Revises: 8d2a4f61c7e5
+Create Date: 2026-10-17 10:25:44.608213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f19e2a7d83'
+down_revision: Union[str, Sequence[str], None] = '8d2a4f61c7e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('story', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Бэкфилл: те же веса, что и в CRUDStory.refresh_search_vector
+    op.execute(
+        """
+        UPDATE story SET search_vector =
+            setweight(to_tsvector('russian', coalesce(story.title, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce((
+                SELECT string_agg(hashtag.text, ' ')
+                FROM storyhashtag JOIN hashtag ON hashtag.id = storyhashtag.hashtag_id
+                WHERE storyhashtag.story_id = story.id
+            ), '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(story.text, '')), 'B')
+        """
+    )
+
+    op.create_index('ix_story_search_vector', 'story', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_story_search_vector', table_name='story', postgresql_using='gin')
+    op.drop_column('story', 'search_vector')
@@ -0,0 +1,36 @@
+"""add hashtag trigram indexes
+
+Revision ID: e7a3b95d1c48
+Revises: c4f19e2a7d83
+Create Date: 2026-10-17 11:02:17.935561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b95d1c48'
+down_revision: Union[str, Sequence[str], None] = 'c4f19e2a7d83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_hashtag_text_trgm', 'hashtag', ['text'], unique=False,
+        postgresql_using='gin', postgresql_ops={'text': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_hashtag_text_lower_pattern', 'hashtag', [sa.text('lower(text) text_pattern_ops')], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_hashtag_text_lower_pattern', table_name='hashtag')
+    op.drop_index('ix_hashtag_text_trgm', table_name='hashtag', postgresql_using='gin')
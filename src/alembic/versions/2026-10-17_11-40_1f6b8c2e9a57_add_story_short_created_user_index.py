@@ -0,0 +1,28 @@
+"""add story short created user index
+
+Revision ID: 1f6b8c2e9a57
+Revises: e7a3b95d1c48
+Create Date: 2026-10-17 11:40:09.271845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f6b8c2e9a57'
+down_revision: Union[str, Sequence[str], None] = 'e7a3b95d1c48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_story_short_created_user', 'story', ['is_short_story', 'created', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_story_short_created_user', table_name='story')
@@ -0,0 +1,51 @@
+"""add hashtag stats
+
+Revision ID: 9c2d7e4b1a06
+Revises: 1f6b8c2e9a57
+Create Date: 2026-10-17 12:15:52.384021
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2d7e4b1a06'
+down_revision: Union[str, Sequence[str], None] = '1f6b8c2e9a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('hashtag', sa.Column('stories_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('hashtag', sa.Column('cover_attachment_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'hashtag_cover_attachment_id_fkey', 'hashtag', 'storyattachment',
+        ['cover_attachment_id'], ['id'], ondelete='SET NULL'
+    )
+
+    # Бэкфилл: то же, что CRUDHashtag.refresh_stats
+    op.execute(
+        """
+        UPDATE hashtag SET
+            stories_count = (
+                SELECT count(storyhashtag.id) FROM storyhashtag
+                WHERE storyhashtag.hashtag_id = hashtag.id
+            ),
+            cover_attachment_id = (
+                SELECT min(storyattachment.id) FROM storyattachment
+                JOIN storyhashtag ON storyhashtag.story_id = storyattachment.story_id
+                WHERE storyhashtag.hashtag_id = hashtag.id
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('hashtag_cover_attachment_id_fkey', 'hashtag', type_='foreignkey')
+    op.drop_column('hashtag', 'cover_attachment_id')
+    op.drop_column('hashtag', 'stories_count')
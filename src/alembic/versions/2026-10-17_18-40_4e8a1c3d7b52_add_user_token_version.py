@@ -0,0 +1,28 @@
+"""add user token version
+
+Revision ID: 4e8a1c3d7b52
+Revises: 9c2d7e4b1a06
+Create Date: 2026-10-17 18:40:11.702415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8a1c3d7b52'
+down_revision: Union[str, Sequence[str], None] = '9c2d7e4b1a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user', 'token_version')
@@ -8,8 +8,11 @@ from app.api.v1 import (
     stage,
     lesson,
     story,
+    short_story,
+    hashtag,
     settings,
     callback,
+    cache,
 )
 
 api_router = APIRouter()
@@ -17,8 +20,11 @@ api_router.include_router(login.router)
 api_router.include_router(verification_code.router)
 api_router.include_router(user.router)
 api_router.include_router(story.router)
+api_router.include_router(short_story.router)
+api_router.include_router(hashtag.router)
 api_router.include_router(stage.router)
 api_router.include_router(lesson.router)
 api_router.include_router(task.router)
 api_router.include_router(settings.router)
-api_router.include_router(callback.router)
\ No newline at end of file
+api_router.include_router(callback.router)
+api_router.include_router(cache.router)
\ No newline at end of file
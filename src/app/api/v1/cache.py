@@ -0,0 +1,88 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Query
+
+from app import schemas, deps
+from app.exceptions import UnprocessableEntity
+from app.utils.response import get_responses_description_by_codes
+
+router = APIRouter(prefix="/cp/cache", tags=["Административная панель / Кеш"])
+
+
+@router.get(
+    "/",
+    response_model=schemas.Response[schemas.GettingCacheReport],
+    name="Метрики кеша по пространствам имён",
+    responses=get_responses_description_by_codes([400, 401, 403, 422]),
+)
+async def get_cache_report(
+        current_user: deps.CurrentActiveSuperUserDependency,
+        redis: deps.RedisDependency,
+        cache: deps.CacheDependency,
+        metrics: deps.CacheMetricsDependency,
+        limit: int = Query(20, title="Количество пространств", ge=1, le=200),
+        sample: int = Query(2000, title="Размер выборки SCAN", ge=100, le=50000),
+        sort: Literal["requests", "memory"] = Query("requests", title="Сортировка"),
+):
+    await metrics.flush()
+    report = await metrics.report()
+    keyspace = await metrics.sample_keyspace(sample=sample)
+    local = cache.local.snapshot() if cache.local is not None else {}
+
+    namespaces = [
+        schemas.GettingCacheNamespace(
+            namespace=namespace,
+            **report.get(namespace, {}),
+            **keyspace.get(namespace, {}),
+            l1=local.get(namespace.split(":", 1)[0]),
+        )
+        for namespace in set(report) | set(keyspace)
+    ]
+    if sort == "memory":
+        namespaces.sort(key=lambda item: item.estimated_memory, reverse=True)
+    else:
+        namespaces.sort(key=lambda item: item.hits + item.misses, reverse=True)
+
+    memory = await redis.info("memory")
+    return schemas.Response(
+        data=schemas.GettingCacheReport(
+            total_keys=await redis.dbsize(),
+            used_memory=memory.get("used_memory"),
+            namespaces=namespaces[:limit],
+            circuit_state=deps.redis_breaker.state.value,
+            circuit_transitions=await metrics.circuit(),
+        )
+    )
+
+
+@router.delete(
+    "/",
+    response_model=schemas.Response[schemas.GettingCacheFlush],
+    name="Сбросить пространство имён или тег кеша",
+    responses=get_responses_description_by_codes([400, 401, 403, 422]),
+)
+async def flush_cache(
+        current_user: deps.CurrentActiveSuperUserDependency,
+        cache: deps.CacheDependency,
+        namespace: Optional[str] = Query(
+            None, title="Пространство имён",
+            description="stories_by_user - сброс версии, user:{id}:object - удаление ключей по шаблону",
+        ),
+        tag: Optional[str] = Query(None, title="Тег", description="например author:15"),
+):
+    if namespace is None and tag is None:
+        raise UnprocessableEntity(message="Укажите namespace или tag")
+    if namespace is not None and (namespace.startswith("cache:") or any(char in namespace for char in "*?[")):
+        raise UnprocessableEntity(message="Служебное пространство или шаблон нельзя сбросить")
+
+    data = schemas.GettingCacheFlush(namespace=namespace, tag=tag)
+    if tag is not None:
+        data.deleted_keys += await cache.invalidate_tags(tag)
+    if namespace is not None:
+        if "{id}" in namespace:
+            data.deleted_keys += await cache.delete_by_pattern(namespace.replace("{id}", "*"))
+        else:
+            await cache.invalidate(namespace)
+            data.version = await cache.version(namespace)
+
+    return schemas.Response(data=data)
@@ -6,6 +6,7 @@ from app import crud, deps, models, schemas, enums
 from app.utils.datetime import utcnow
 from app.exceptions import InaccessibleEntity, UnprocessableEntity, raise_if_none
 from app.utils.response import get_responses_description_by_codes
+from app.utils.side_effects import after_commit
 from app.exceptions import raise_if_none
 
 
@@ -22,6 +23,8 @@ logger = logging.getLogger(__name__)
 async def tinkoff_callback(
     data: schemas.payment.TinkoffNotificationPayment,
     db: deps.DbDependency,
+    principals: deps.PrincipalsDependency,
+    token_versions: deps.TokenVersionsDependency,
     #notificator: Notificator = Depends(deps.get_notificator),
     #redis_cache: RedisCache = Depends(deps.get_redis_cache)
 ):
@@ -31,6 +34,7 @@ async def tinkoff_callback(
 
     logger.info("data: %s", data)
     payment = None
+    premium_user_id = None
 
     if data.status == "CONFIRMED" and data.success:
         payment = await crud.payment.get_payment(db=db, order_id=data.order_id)
@@ -44,6 +48,7 @@ async def tinkoff_callback(
                 user = await crud.user.get(db=db, id=payment.user_id)
                 raise_if_none(user, message="Пользотвалеь не найден")
                 user.is_premium = True
+                premium_user_id = user.id
 
     # возврат чека
     if data.status == "RECEIPT" and data.success:
@@ -52,6 +57,9 @@ async def tinkoff_callback(
         payment.ofd_url = data.url
 
     await db.commit()
+    if premium_user_id is not None:
+        await token_versions.bump(db, [premium_user_id])
+        await after_commit(principals.forget(premium_user_id), breaker=deps.redis_breaker)
     return Response(content="OK")
 
 
@@ -0,0 +1,58 @@
+import logging
+from typing import List
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, schemas, getters, deps
+from app.config import settings
+from app.services.trending import TrendingService, TrendingWindow
+from app.utils.cache import Cache
+from app.utils.response import get_responses_description_by_codes
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+@router.get(
+    '/hashtags/autocomplete/',
+    response_model=schemas.Response[List[schemas.GettingHashtag]],
+    name="Подсказки хештегов по введённому тексту",
+    responses=get_responses_description_by_codes([400, 422]),
+    tags=["Хештеги"]
+)
+async def autocomplete_hashtags(
+        db: AsyncSession = Depends(deps.get_db),
+        q: str = Query(..., title="Начало хештега", max_length=100),
+        limit: int = Query(10, title="Количество подсказок", ge=1, le=50),
+        cache: Cache = Depends(deps.get_cache),
+):
+    prefix = crud.hashtag.normalize_prefix(q)
+    if not prefix:
+        return schemas.Response(data=[])
+
+    async def fetch_hashtags():
+        hashtags = await crud.hashtag.autocomplete(db, prefix=prefix, limit=limit)
+        return schemas.Response(data=await getters.hashtag.get_hashtags_batch(db, hashtags))
+
+    key_tuple = ('hashtag_autocomplete', f"prefix - {prefix} - limit - {limit}")
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fetch_hashtags, ttl=settings.HASHTAG_AUTOCOMPLETE_TTL
+    )
+    return data
+
+
+@router.get(
+    '/hashtags/trending/',
+    response_model=schemas.Response[List[schemas.GettingTrendingHashtag]],
+    name="Популярные хештеги",
+    responses=get_responses_description_by_codes([400, 422]),
+    tags=["Хештеги"]
+)
+async def get_trending_hashtags(
+        db: AsyncSession = Depends(deps.get_db),
+        window: TrendingWindow = Query(TrendingWindow.day, title="Окно", description="24h или 7d"),
+        trending: TrendingService = Depends(deps.get_trending),
+):
+    return schemas.Response(data=await trending.get(db, window))
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, status, UploadFile, File, Body, Path, Qu
 from app import crud, models, schemas, deps, getters
 from app.exceptions import InaccessibleEntity, UnprocessableEntity, raise_if_none
 from app.utils.response import get_responses_description_by_codes
+from app.utils.counting import CachedCount, invalidate_counts
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,7 @@ async def create_lesson(
     data: schemas.CreatingLesson,
     db: deps.DbDependency,
     current_user: deps.CurrentActiveSuperUserDependency,
+    cache: deps.CacheDependency,
 ):
     if data.stage_id is not None:
         stage_id = data.stage_id
@@ -31,6 +33,7 @@ async def create_lesson(
 
     lesson = await crud.lesson.create(db=db, obj_in=data)
     await db.commit()
+    await invalidate_counts(cache, "lesson")
     await db.refresh(lesson)
     lesson_get = await getters.get_lesson(db=db, lesson=lesson)
 
@@ -48,9 +51,11 @@ async def create_lesson(
 async def delete_lesson(
     db: deps.DbDependency,
     current_user: deps.CurrentActiveSuperUserDependency,
+    cache: deps.CacheDependency,
     lesson_id: int = Path(...),
 ):
     await crud.lesson.remove_by_id(db=db, id=lesson_id)
+    await invalidate_counts(cache, "lesson")
 
     return schemas.response.Response(
         data=None,
@@ -91,10 +96,11 @@ async def update_lesson(
 )
 async def get_lessons(
     db: deps.DbDependency,
-    current_user: deps.CurrentActiveUserDependency,
+    current_user: deps.CurrentActivePrincipalDependency,
+    cache: deps.CacheDependency,
     page: int = Query(1),
 ):
-    lessons, paginator = await crud.lesson.get_page(db=db, page=page)
+    lessons, paginator = await crud.lesson.get_page(db=db, page=page, counter=CachedCount(cache, "lesson"))
     lesson_get = [await getters.get_lesson(db=db, lesson=lesson) for lesson in lessons]
 
     return schemas.response.Response(
@@ -112,9 +118,10 @@ async def get_lessons(
 async def get_lessons(
     db: deps.DbDependency,
     current_user: deps.CurrentActiveSuperUserDependency,
+    cache: deps.CacheDependency,
     page: int = Query(1),
 ):
-    lessons, paginator = await crud.lesson.get_page(db=db, page=page)
+    lessons, paginator = await crud.lesson.get_page(db=db, page=page, counter=CachedCount(cache, "lesson"))
     lesson_get = [await getters.get_lesson(db=db, lesson=lesson) for lesson in lessons]
 
     return schemas.response.Response(
@@ -2,16 +2,17 @@ from typing import Optional, List
 import logging
 
 from fastapi import APIRouter, Depends, Query
-from fastapi.params import Path, Header
-from sqlalchemy.orm import Session
+from fastapi.params import Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
-from app import  crud, models, schemas, getters, deps
-from app.exceptions import UnprocessableEntity, UnfoundEntity, ListOfEntityError, InaccessibleEntity
-from app.schemas import CreatingStory, UpdatingStory
-from app.schemas.story import HugBody, HidingBody, IsFavoriteBody
+from app import crud, models, schemas, getters, deps
+from app.config import settings
+from app.services.exclusion import ExclusionService
+from app.services.principal import Principal
+from app.services.story_entity import StoryEntityService, ring_page
 from app.utils.response import get_responses_description_by_codes
-from app.utils.cache import Cache
+from app.utils.cache import Cache, cache_tag, feed_namespace
 
 router = APIRouter()
 
@@ -25,32 +26,35 @@ logger = logging.getLogger(__name__)
     tags=["Истории"]
 )
 async def get_short_stories_from_subscriptions(
-        db: Session = Depends(deps.get_db),
+        db: AsyncSession = Depends(deps.get_db),
         page: Optional[int] = Query(1, title="Номер страницы"),
-        current_user: models.User = Depends(deps.get_current_active_user),
-        cache: Cache = Depends(deps.get_cache_list),
+        cursor: Optional[str] = Query(None, title="Курсор", description="Курсор из paginator.next_cursor. Пустое значение - первая страница в режиме курсора, page при этом игнорируется"),
+        current_user: Principal = Depends(deps.get_current_active_principal),
+        cache: Cache = Depends(deps.get_cache),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    async def fatch_short_stories_subscriptions():
+    async def fatch_short_stories_subscriptions(db: AsyncSession):
         data, paginator = await crud.story.get_short_stories_from_subscriptions(
             db,
             page=page,
+            cursor=cursor,
             current_user=current_user,
+            exclusions=await exclusion.get(db, current_user.id),
         )
 
-        return schemas.ListOfEntityResponse(
-            data=[
-                getters.story.get_grouped_short_story(db, datum, current_user)
-                for datum
-                in data
-            ],
-            paginator=paginator
-        )
+        return ring_page(data, paginator)
+
 
+    key_tuple = (feed_namespace.short_subscriptions,
+                 f"user_subscriptions - {current_user.id} - page - {page} - cursor - {cursor} - grouped_by_users")
+    tags = [cache_tag.viewer.format(current_user.id)]
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fatch_short_stories_subscriptions, ttl=7200, tags=tags,
+        soft_ttl=settings.FEED_CACHE_SOFT_TTL, db=db,
+    )
+    data = await story_entity.render_ring_page(db, data, current_user)
 
-    key_tuple = ('short_stories_by_user',
-                 f"user_subscriptions - {current_user.id} - page - {page} - grouped_by_users")
-    data, from_cache = await cache.behind_cache(key_tuple, fatch_short_stories_subscriptions, ttl=7200)
-    
     if from_cache:
         logger.info("From the cache")
     else:
@@ -68,21 +72,47 @@ async def get_short_stories_from_subscriptions(
 )
 async def get_short_stories(
         request: Request,
-        db: Session = Depends(deps.get_db),
+        db: AsyncSession = Depends(deps.get_db),
         page: Optional[int] = Query(1, title="Номер страницы"),
-        current_user: Optional[models.User] = Depends(deps.get_optional_current_user),
+        cursor: Optional[str] = Query(None, title="Курсор", description="Курсор из paginator.next_cursor. Пустое значение - первая страница в режиме курсора, page при этом игнорируется"),
+        current_user: Optional[Principal] = Depends(deps.get_current_active_principal_or_none),
         x_real_ip: Optional[str] = Header(None),
         accept_language: Optional[str] = Header(None),
         user_agent: Optional[str] = Header(None),
         x_firebase_token: Optional[str] = Header(None),
-        cache: Cache = Depends(deps.get_cache_list),
-
+        cache: Cache = Depends(deps.get_cache),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    async def fatch_short_stories():
+    async def fatch_short_stories(db: AsyncSession):
         data, paginator = await crud.story.get_short_stories(
             db,
             page=page,
+            cursor=cursor,
             current_user=current_user,
+            exclusions=await exclusion.get(db, current_user.id) if current_user is not None else None,
+        )
+
+        return ring_page(data, paginator)
+    if current_user:
+        key_tuple = (feed_namespace.short_stories, f"user - {current_user.id} - page - \
+                     {page} - cursor - {cursor} - grouped_by_users")
+    else:
+        key_tuple = (feed_namespace.short_stories, f"page - \
+                            {page} - cursor - {cursor} - grouped_by_users")
+    tags = []
+    if current_user is not None:
+        tags.append(cache_tag.viewer.format(current_user.id))
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fatch_short_stories, ttl=7200, tags=tags,
+        soft_ttl=settings.FEED_CACHE_SOFT_TTL, db=db,
+    )
+    data = await story_entity.render_ring_page(db, data, current_user)
+
+    if current_user is not None:
+        await crud.user.handle_device(
+            db=db,
+            owner=current_user,
             host=request.client.host,
             x_real_ip=x_real_ip,
             accept_language=accept_language,
@@ -90,24 +120,6 @@ async def get_short_stories(
             x_firebase_token=x_firebase_token,
         )
 
-
-        return schemas.ListOfEntityResponse(
-            data=[
-                getters.story.get_grouped_short_story(db, datum, current_user)
-                for datum
-                in data
-            ],
-            paginator=paginator
-        )
-    if current_user:
-        key_tuple = ('short_stories_by_user', f"user - {current_user.id} - page - \
-                     {page} - grouped_by_users")
-    else:
-        key_tuple = ('short_stories_by_user', f"page - \
-                            {page} - grouped_by_users")
-    data, from_cache = await cache.behind_cache(key_tuple, fatch_short_stories, ttl=7200)
-
-
     if from_cache:
         logger.info("From the cache")
     else:
@@ -107,7 +107,7 @@ async def get_stages_cp(
 )
 async def get_stages(
     db: deps.DbDependency,
-    current_user: deps.CurrentActiveUserDependency,
+    current_user: deps.CurrentActivePrincipalDependency,
     page: int = Query(1),
 ):
     stages, paginator = await crud.stage.get_page(db=db, page=page)
@@ -147,7 +147,7 @@ async def get_stage_cp(
 )
 async def get_stage(
     db: deps.DbDependency,
-    current_user: deps.CurrentActiveUserDependency,
+    current_user: deps.CurrentActivePrincipalDependency,
     stage_id: int = Path(...),
 ):
     stage = await crud.stage.get(db=db, id=stage_id)
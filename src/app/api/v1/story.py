@@ -8,10 +8,19 @@ import logging
 
 
 from app import crud, models, schemas, getters, deps
+from app.config import settings
 from app.exceptions import UnprocessableEntity, UnfoundEntity, ListOfEntityError, InaccessibleEntity
+from app.enums import StorySort
 from app.schemas import CreatingStory, UpdatingStory, HugBody, HidingBody, IsFavoriteBody, SetReaction
 from app.utils.response import get_responses_description_by_codes
-from app.utils.cache import Cache
+from app.services.exclusion import ExclusionService
+from app.services.principal import Principal
+from app.services.story_entity import StoryEntityService, id_page, ring_page
+from app.services.timeline import TimelineService
+from app.services.trending import TrendingService, TrendingWeight
+from app.services.viewer_state import ViewerFlag, ViewerStateService
+from app.utils.cache import Cache, cache_tag, feed_namespace
+from app.utils.side_effects import after_commit
 
 router = APIRouter()
 
@@ -27,34 +36,41 @@ logger = logging.getLogger(__name__)
 async def get_stories_by_user(
         db: AsyncSession = Depends(deps.get_db),
         page: Optional[int] = Query(1, title="Номер страницы"),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        cursor: Optional[str] = Query(None, title="Курсор", description="Курсор из paginator.next_cursor. Пустое значение - первая страница в режиме курсора, page при этом игнорируется"),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         is_hugged: Optional[bool] = Query(None),
         is_favorite: Optional[bool] = Query(None),
         is_short_story: Optional[bool] = Query(None),
         cache: Cache = Depends(deps.get_cache),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
 
-    async def fatch_stories():
+    async def fatch_stories(db: AsyncSession):
         data, paginator = await crud.story.get_stories_by_user(
             db,
             user=current_user,
             page=page,
+            cursor=cursor,
             current_user=current_user,
+            exclusions=await exclusion.get(db, current_user.id),
             is_hugged=is_hugged,
             is_favorite=is_favorite,
             is_short_story=is_short_story,
         )
 
-        return schemas.Response(
-            data=[await getters.story.get_story(db, datum, current_user) for datum in data],
-            paginator=paginator
-            )
+        return id_page(data, paginator)
 
     if is_short_story:
-        key_tuple = ('short_stories_by_user', f"user_me - {current_user.id} - page - {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
+        key_tuple = ('short_story_ids', f"user_me - {current_user.id} - page - {page} - cursor - {cursor} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
     else:
-        key_tuple = ('stories_by_user', f"user_me - {current_user.id} - page - {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
-    data, from_cache = await cache.behind_cache(key_tuple, fatch_stories, ttl=7200)
+        key_tuple = ('story_ids', f"user_me - {current_user.id} - page - {page} - cursor - {cursor} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
+    tags = [cache_tag.author.format(current_user.id), cache_tag.viewer.format(current_user.id)]
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fatch_stories, ttl=7200, tags=tags,
+        soft_ttl=settings.FEED_CACHE_SOFT_TTL, db=db,
+    )
+    data = await story_entity.render_page(db, data, current_user)
 
     if from_cache:
         logger.info("From the cache")
@@ -75,8 +91,10 @@ async def get_stories_from_subscriptions(
         request: Request,
         db: AsyncSession = Depends(deps.get_db),
         page: Optional[int] = Query(1, title="Номер страницы"),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        cursor: Optional[str] = Query(None, title="Курсор", description="Курсор из paginator.next_cursor. Пустое значение - первая страница в режиме курсора, page при этом игнорируется"),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         search: Optional[str] = Query(None, title="Текст истории, название хештега или темы"),
+        sort: StorySort = Query(StorySort.relevance, title="Сортировка результатов поиска", description="relevance - по релевантности (только постранично, с cursor - ошибка 400), recent - сначала новые"),
         is_hugged: Optional[bool] = Query(None),
         is_favorite: Optional[bool] = Query(None),
         is_short_story: Optional[bool] = Query(None),
@@ -85,32 +103,48 @@ async def get_stories_from_subscriptions(
         user_agent: Optional[str] = Header(None),
         x_firebase_token: Optional[str] = Header(None),
         cache: Cache = Depends(deps.get_cache),
+        timeline: TimelineService = Depends(deps.get_timeline),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    async def fatch_stories_subscriptions():
-        data, paginator = await crud.story.get_stories_from_subscriptions(
-            db,
-            page=page,
-            current_user=current_user,
-            search=search,
-            is_hugged=is_hugged,
-            is_favorite=is_favorite,
-            is_short_story=is_short_story,
-        )
+    async def fatch_stories_subscriptions(db: AsyncSession):
+        exclusions = await exclusion.get(db, current_user.id)
+        # пока Redis недоступен, лента подписок собирается запросом к БД
+        if timeline.available and search is None and is_hugged is None and is_favorite is None and not is_short_story:
+            story_ids, paginator = await timeline.get_page(
+                db, user_id=current_user.id, page=page, cursor=cursor, exclusions=exclusions
+            )
+            data, missing_ids = await crud.story.get_by_ids_ordered(db, ids=story_ids)
+            await timeline.forget(current_user.id, missing_ids)
+        else:
+            data, paginator = await crud.story.get_stories_from_subscriptions(
+                db,
+                page=page,
+                cursor=cursor,
+                current_user=current_user,
+                exclusions=exclusions,
+                search=search,
+                sort=sort,
+                is_hugged=is_hugged,
+                is_favorite=is_favorite,
+                is_short_story=is_short_story,
+            )
 
-        return schemas.Response(
-            data=[
-                await getters.story.get_story(db, datum, current_user)
-                for datum
-                in data
-            ],
-            paginator=paginator
-        )
+        return id_page(data, paginator)
 
+    key_params = f"subscriptions - {current_user.id} - page - {page} - cursor - {cursor} - is_hugged - {is_hugged} - is_favorite - {is_favorite} - search - {search} - sort - {sort.value}"
     if is_short_story:
-        key_tuple = ('short_stories_by_user', f"user_me - {current_user.id} - page - {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
+        key_tuple = (feed_namespace.short_subscriptions, key_params)
     else:
-        key_tuple = ('stories_by_user', f"user_me - {current_user.id} - page - {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
-    data, from_cache = await cache.behind_cache(key_tuple, fatch_stories_subscriptions, ttl=7200)
+        key_tuple = (feed_namespace.subscriptions, key_params)
+    tags = [cache_tag.viewer.format(current_user.id)]
+    if search is not None:
+        tags.append(cache_tag.search)
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fatch_stories_subscriptions, ttl=7200, tags=tags,
+        soft_ttl=settings.FEED_CACHE_SOFT_TTL, db=db,
+    )
+    data = await story_entity.render_page(db, data, current_user)
     await crud.user.handle_device(
         db=db,
         owner=current_user,
@@ -140,42 +174,47 @@ async def get_stories_by_user(
         user_id: int = Path(...,title="Идентификатор пользователя"),
         db: AsyncSession = Depends(deps.get_db),
         page: Optional[int] = Query(1, title="Номер страницы"),
+        cursor: Optional[str] = Query(None, title="Курсор", description="Курсор из paginator.next_cursor. Пустое значение - первая страница в режиме курсора, page при этом игнорируется"),
         is_hugged: Optional[bool] = Query(None),
         is_favorite: Optional[bool] = Query(None),
         is_short_story: Optional[bool] = Query(None),
-        current_user: Optional[models.User] = Depends(deps.get_current_active_user_or_none),
+        current_user: Optional[Principal] = Depends(deps.get_current_active_principal_or_none),
         cache: Cache = Depends(deps.get_cache),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
     user = await crud.user.get(db, user_id)
 
     if user is None:
         raise UnfoundEntity(num=2, message="Пользователь не найден")
 
-    async def fеtch_stories_user():
+    async def fеtch_stories_user(db: AsyncSession):
         data, paginator = await crud.story.get_stories_by_user(
             db,
             user=user,
             page=page,
+            cursor=cursor,
             current_user=current_user,
+            exclusions=await exclusion.get(db, current_user.id) if current_user is not None else None,
             is_hugged=is_hugged,
             is_favorite=is_favorite,
             is_short_story=is_short_story
         )
 
-        return schemas.Response(
-            data=[
-                await getters.story.get_story(db, datum,current_user)
-                for datum
-                in data
-            ],
-            paginator=paginator
-        )
+        return id_page(data, paginator)
     if is_short_story:
-        key_tuple = ('short_stories_by_user', f"user - {user.id} - page - {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
+        key_tuple = ('short_story_ids', f"user - {user.id} - page - {page} - cursor - {cursor} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
     else:
-        key_tuple = ('stories_by_user', f"user - {user.id} - page - {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
-
-    data, from_cache = await cache.behind_cache(key_tuple, fеtch_stories_user, ttl=7200)
+        key_tuple = ('story_ids', f"user - {user.id} - page - {page} - cursor - {cursor} - is_hugged - {is_hugged} - is_favorite - {is_favorite}")
+
+    tags = [cache_tag.author.format(user.id)]
+    if current_user is not None:
+        tags.append(cache_tag.viewer.format(current_user.id))
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fеtch_stories_user, ttl=7200, tags=tags,
+        soft_ttl=settings.FEED_CACHE_SOFT_TTL, db=db,
+    )
+    data = await story_entity.render_page(db, data, current_user)
     
     if from_cache:
         logger.info("From the cache")
@@ -195,19 +234,15 @@ async def get_stories_by_users(
         user_id: int = Path(...,title="Идентификатор пользователя"),
         db: AsyncSession = Depends(deps.get_db),
         page: Optional[int] = Query(1, title="Номер страницы"),
-        current_user: Optional[models.User] = Depends(deps.get_current_active_su),
+        current_user: Principal = Depends(deps.get_current_active_su_principal),
 ):
     user = await crud.user.get(db, user_id)
 
     if user is None:
         raise UnfoundEntity(num=2, message="Пользователь не найден")
-    data, paginator = await crud.story.get_stories_by_user(db, user=user, page=page) 
+    data, paginator = await crud.story.get_stories_by_user(db, user=user, page=page, profile='feed_item')
     return schemas.Response(
-        data=[
-            await getters.story.get_story(db, datum,current_user)
-            for datum
-            in data
-        ],
+        data=await getters.story.get_stories_batch(db, data, current_user),
         paginator=paginator
     )
 
@@ -223,15 +258,15 @@ async def add_new_story(
         request: Request,
         data: CreatingStory,
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        timeline: TimelineService = Depends(deps.get_timeline),
+        trending: TrendingService = Depends(deps.get_trending),
         x_real_ip: Optional[str] = Header(None),
         accept_language: Optional[str] = Header(None),
         user_agent: Optional[str] = Header(None),
         x_firebase_token: Optional[str] = Header(None),
 ):
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
     data, code, indexes = await crud.story.create_story_by_user(db, user=current_user, obj_in=data)
 
     if code == -2:
@@ -289,6 +324,15 @@ async def add_new_story(
             description='Видео уже использовалось'
         )
 
+    # сброс после коммита: иначе параллельное чтение закеширует ленту без новой истории
+    await after_commit(
+        cache.invalidate_tags(cache_tag.author.format(current_user.id)),
+        cache.invalidate(*feed_namespace.of(data.is_short_story)),
+        timeline.push_story(db, data),
+        trending.record_story(db, data.id, TrendingWeight.usage),
+        breaker=deps.redis_breaker,
+    )
+
     await crud.user.handle_device(
         db=db,
         owner=current_user,
@@ -314,13 +358,12 @@ async def add_new_story(
 async def add_new_story(
         data: CreatingStory,
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_su),
+        current_user: Principal = Depends(deps.get_current_active_su_principal),
         user_id: int = Path(...,title="Идентификатор пользователя"),
         cache: Cache = Depends(deps.get_cache),
+        timeline: TimelineService = Depends(deps.get_timeline),
+        trending: TrendingService = Depends(deps.get_trending),
 ):
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
     user = await crud.user.get(db, user_id)
     if user is None:
         raise UnfoundEntity(num=2, message="Пользователь не найден")
@@ -383,6 +426,14 @@ async def add_new_story(
             description='Видео уже использовалось'
         )
 
+    await after_commit(
+        cache.invalidate_tags(cache_tag.author.format(user_id)),
+        cache.invalidate(*feed_namespace.of(data.is_short_story)),
+        timeline.push_story(db, data),
+        trending.record_story(db, data.id, TrendingWeight.usage),
+        breaker=deps.redis_breaker,
+    )
+
     return schemas.Response(
         data= await getters.story.get_story(db, data, current_user)
     )
@@ -399,16 +450,14 @@ async def edit_story(
         data: UpdatingStory,
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
-    story = await crud.story.get(db, id=story_id)
+    story = await crud.story.get(db, id=story_id, profile='story_detail')
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
-    if story.user != current_user:
+    if story.user_id != current_user.id:
         raise InaccessibleEntity(
             message="История не принадлежит порльзователю",
             description="История не принадлежит порльзователю"
@@ -475,6 +524,12 @@ async def edit_story(
             description='Видео уже использовалось'
         )
 
+    await after_commit(
+        cache.invalidate_tags(cache_tag.search),
+        story_entity.forget(story_id),
+        breaker=deps.redis_breaker,
+    )
+
     return schemas.Response(
         data=await getters.story.get_story(db, data, current_user)
     )
@@ -490,28 +545,14 @@ async def edit_story(
 async def get_story(
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
-        cache: Cache = Depends(deps.get_cache),
+        current_user: Principal = Depends(deps.get_current_active_principal),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
+    data = await story_entity.render(db, [story_id], current_user)
+    if not data:
+        raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
 
-    async def fatch_stories_single():
-        story = await crud.story.get(db, id=story_id)
-        if story is None:
-            raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
-
-        return schemas.Response(
-            data=await getters.story.get_story(db, story, current_user)
-        )
-
-    key_tuple = ('stories_by_user', f"story_id - {story_id}")
-    data, from_cache = await cache.behind_cache(key_tuple, fatch_stories_single, ttl=7200)
-    
-    if from_cache:
-        logger.info("From the cache")
-    else:
-        logger.info("From the database")
-
-    return data
+    return schemas.Response(data=data[0])
 
 
 @router.put(
@@ -525,16 +566,14 @@ async def edit_story(
         data: UpdatingStory,
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_su),
+        current_user: Principal = Depends(deps.get_current_active_su_principal),
         cache: Cache = Depends(deps.get_cache),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    story = await crud.story.get(db, id=story_id)
+    story = await crud.story.get(db, id=story_id, profile='story_detail')
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="История не найдена",num=1)
 
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
     data, code, indexes = await crud.story.update(db, db_obj=story, obj_in=data)
 
     if code == -2:
@@ -596,6 +635,12 @@ async def edit_story(
             description='Видео уже использовалось'
         )
 
+    await after_commit(
+        cache.invalidate_tags(cache_tag.search),
+        story_entity.forget(story_id),
+        breaker=deps.redis_breaker,
+    )
+
     return schemas.Response(
         data= await getters.story.get_story(db, data, current_user)
     )
@@ -611,13 +656,23 @@ async def edit_story(
 async def mark_viewed(
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
+        trending: TrendingService = Depends(deps.get_trending),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
+        viewer_state: ViewerStateService = Depends(deps.get_viewer_state),
 ):
-    story = await crud.story.get(db, id=story_id)
+    story = await crud.story.get(db, id=story_id, profile='story_detail')
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена", num=1)
 
-    await crud.story.mark_story_as_viewed(db, story=story, user=current_user)
+    if await crud.story.mark_story_as_viewed(db, story=story, user=current_user):
+        # в теле истории views_count
+        await after_commit(
+            story_entity.forget(story.id),
+            viewer_state.mark(current_user.id, ViewerFlag.viewed, story.id, True),
+            trending.record_story(db, story.id, TrendingWeight.view),
+            breaker=deps.redis_breaker,
+        )
 
     return schemas.Response(
         data= await getters.story.get_story(db, story, current_user)
@@ -635,22 +690,26 @@ async def mark_hugged(
         hugbody: HugBody,
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        trending: TrendingService = Depends(deps.get_trending),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
+        viewer_state: ViewerStateService = Depends(deps.get_viewer_state),
 ):
-    story = await crud.story.get(db, id=story_id)
+    story = await crud.story.get(db, id=story_id, profile='story_detail')
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
 
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
-    key_tuple_user = (f'user_me', f"user_me - {story.user_id}")
-    await cache.delete(key_tuple_user)
-
-    await crud.story.hug_story(db, story=story, user=current_user, hugs=hugbody.hugs)
-
-    await db.refresh(story)
+    if await crud.story.hug_story(db, story=story, user=current_user, hugs=hugbody.hugs):
+        await after_commit(
+            cache.invalidate_tags(cache_tag.viewer.format(current_user.id)),
+            story_entity.forget(story_id),
+            cache.delete(('user_me', f"user_me - {story.user_id}")),
+            viewer_state.mark(current_user.id, ViewerFlag.hugged, story.id, hugbody.hugs),
+            breaker=deps.redis_breaker,
+        )
+        if hugbody.hugs:
+            await after_commit(trending.record_story(db, story.id, TrendingWeight.hug), breaker=deps.redis_breaker)
 
     return schemas.Response(
         data=await getters.story.get_story(db, story, current_user)
@@ -667,23 +726,29 @@ async def set_reaction(
         reaction_body: SetReaction,
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        trending: TrendingService = Depends(deps.get_trending),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
+        viewer_state: ViewerStateService = Depends(deps.get_viewer_state),
 ):
-    story = await crud.story.get(db, id=story_id)
+    story = await crud.story.get(db, id=story_id, profile='story_detail')
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
 
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
-    key_tuple_user = (f'user_me', f"user_me - {story.user_id}")
-    await cache.delete(key_tuple_user)
-
-    await crud.story.react_story(db, story=story, user=current_user,
+    changed = await crud.story.react_story(db, story=story, user=current_user,
                            set_reaction=reaction_body.set_reaction, type_reaction=reaction_body.type_reaction)
-
-    await db.refresh(story)
+    if changed:
+        await after_commit(
+            story_entity.forget(story_id),
+            cache.delete(('user_me', f"user_me - {story.user_id}")),
+            viewer_state.mark(
+                current_user.id, ViewerFlag.reacted(reaction_body.type_reaction), story.id, reaction_body.set_reaction
+            ),
+            breaker=deps.redis_breaker,
+        )
+        if reaction_body.set_reaction:
+            await after_commit(trending.record_story(db, story.id, TrendingWeight.reaction), breaker=deps.redis_breaker)
 
     return schemas.Response(
         data=await getters.story.get_story(db, story, current_user)
@@ -700,20 +765,21 @@ async def mark_favorite(
         favbody: IsFavoriteBody,
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        viewer_state: ViewerStateService = Depends(deps.get_viewer_state),
 ):
-    await cache.delete_by_prefix('stories_by_user')
-    key_tuple_user = ('user_me', f"user_me - {current_user.id}")
-    await cache.delete(key_tuple_user)
-    story = await crud.story.get(db, id=story_id)
+    story = await crud.story.get(db, id=story_id, profile='story_detail')
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="История не найдена",num=1)
 
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
-    await crud.story.favorite_story(db, story=story, user=current_user,is_favorite=favbody.is_favorite)
+    if await crud.story.favorite_story(db, story=story, user=current_user,is_favorite=favbody.is_favorite):
+        await after_commit(
+            cache.delete(('user_me', f"user_me - {current_user.id}")),
+            cache.invalidate_tags(cache_tag.viewer.format(current_user.id)),
+            viewer_state.mark(current_user.id, ViewerFlag.is_favorite, story.id, favbody.is_favorite),
+            breaker=deps.redis_breaker,
+        )
 
     return schemas.Response(
         data=await getters.story.get_story(db, story, current_user)
@@ -731,18 +797,21 @@ async def mark_hidden(
         hiding_body: HidingBody,
         story_id: int = Path(..., title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
 ):
-    key_tuple_user = ('user_me', f"user_me - {current_user.id}")
-    await cache.delete(key_tuple_user)
     story = await crud.story.get(db, id=story_id)
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
 
-    await crud.story.hide_story(db, story=story, user=current_user,hide=hiding_body.hiding)
+    if await crud.story.hide_story(db, story=story, user=current_user,hide=hiding_body.hiding):
+        await after_commit(
+            cache.delete(('user_me', f"user_me - {current_user.id}")),
+            cache.invalidate_tags(cache_tag.viewer.format(current_user.id)),
+            exclusion.set_hidden(current_user.id, story.id, hiding_body.hiding),
+            breaker=deps.redis_breaker,
+        )
 
     return schemas.Response(data=None)
 
@@ -757,11 +826,11 @@ async def mark_hidden(
 async def delete_profile_story(
         story_id: int = Path(...,title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_user),
+        current_user: Principal = Depends(deps.get_current_active_principal),
         cache: Cache = Depends(deps.get_cache),
+        timeline: TimelineService = Depends(deps.get_timeline),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    key_tuple_user = ('user_me', f"user_me - {current_user.id}")
-    await cache.delete(key_tuple_user)
     story = await crud.story.get(db, id=story_id)
     if story is None:
         raise UnfoundEntity(
@@ -770,16 +839,21 @@ async def delete_profile_story(
             num=1
         )
 
-    if story.user != current_user:
+    if story.user_id != current_user.id:
         raise InaccessibleEntity(
             message="История не принадлежит порльзователю",
             description="История не принадлежит порльзователю"
         )
 
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
     await crud.story.remove(db, id=story_id)
+    await after_commit(
+        cache.delete(('user_me', f"user_me - {current_user.id}")),
+        cache.invalidate_tags(cache_tag.author.format(story.user_id)),
+        cache.invalidate(*feed_namespace.of(story.is_short_story)),
+        story_entity.forget(story_id),
+        timeline.remove_story(story_id, story.user_id),
+        breaker=deps.redis_breaker,
+    )
     return schemas.Response(data=None)
 
 
@@ -793,18 +867,23 @@ async def delete_profile_story(
 async def delete_user_story(
         story_id: int = Path(...,title="Идентификатор истории"),
         db: AsyncSession = Depends(deps.get_db),
-        current_user: models.User = Depends(deps.get_current_active_su),
+        current_user: Principal = Depends(deps.get_current_active_su_principal),
         cache: Cache = Depends(deps.get_cache),
+        timeline: TimelineService = Depends(deps.get_timeline),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ):
-    await cache.delete_by_prefix('stories_by_user')
     story = await crud.story.get(db, id=story_id)
     if story is None:
         raise UnfoundEntity(message="История не найдена", description="Исторрия не найдена",num=1)
 
-    await cache.delete_by_prefix(f'short_stories_by_user')
-    await cache.delete_by_prefix(f'stories_by_user')
-
     await crud.story.remove(db,id=story_id)
+    await after_commit(
+        cache.invalidate_tags(cache_tag.author.format(story.user_id)),
+        cache.invalidate(*feed_namespace.of(story.is_short_story)),
+        story_entity.forget(story_id),
+        timeline.remove_story(story_id, story.user_id),
+        breaker=deps.redis_breaker,
+    )
     return schemas.Response(data=None)
 
 
@@ -821,15 +900,19 @@ async def get_stories_by_criteria(
         user_id: Optional[int] = Query(None, title="Идентификатор пользователя"),
         hashtag_id: Optional[int] = Query(None, title="Идентификатопр хештега"),
         search: Optional[str] = Query(None, title="Текст истории, название хештега или темы"),
+        sort: StorySort = Query(StorySort.relevance, title="Сортировка результатов поиска", description="relevance - по релевантности (только постранично, с cursor - ошибка 400), recent - сначала новые"),
         is_hugged: Optional[bool] = Query(None),
         is_favorite: Optional[bool] = Query(None),
         page: Optional[int] = Query(1, title="Номер страницы"),
-        current_user: Optional[models.User] = Depends(deps.get_current_active_user_or_none),
+        cursor: Optional[str] = Query(None, title="Курсор", description="Курсор из paginator.next_cursor. Пустое значение - первая страница в режиме курсора, page при этом игнорируется"),
+        current_user: Optional[Principal] = Depends(deps.get_current_active_principal_or_none),
         cache: Cache = Depends(deps.get_cache),
+        exclusion: ExclusionService = Depends(deps.get_exclusion),
         x_real_ip: Optional[str] = Header(None),
         accept_language: Optional[str] = Header(None),
         user_agent: Optional[str] = Header(None),
         x_firebase_token: Optional[str] = Header(None),
+        story_entity: StoryEntityService = Depends(deps.get_story_entity),
 ): 
     if user_id is not None:
         user = await crud.user.get(db,user_id)
@@ -844,15 +927,18 @@ async def get_stories_by_criteria(
             raise UnfoundEntity(description="Хештег не найден", message="Хештег не найден", num=2)
     else:
         hashtag = None
-    async def fatch_stories_criteria():
+    async def fatch_stories_criteria(db: AsyncSession):
         if current_user is not None:
             data, paginator = await crud.story.get_stories(
                 db,
                 user=user,
                 hashtag=hashtag,
                 page=page,
+                cursor=cursor,
                 current_user=current_user,
+                exclusions=await exclusion.get(db, current_user.id),
                 search=search,
+                sort=sort,
                 is_hugged=is_hugged,
                 is_favorite=is_favorite
             )
@@ -862,24 +948,30 @@ async def get_stories_by_criteria(
                 user=user,
                 hashtag=hashtag,
                 page=page,
+                cursor=cursor,
                 current_user=current_user,
                 search=search,
+                sort=sort,
             )
 
-        return schemas.Response(
-            data=[
-                await getters.story.get_story(db, datum, current_user)
-                for datum
-                in data
-            ],
-            paginator=paginator
-        )
+        return id_page(data, paginator)
     
 
-    key_tuple = ('stories_by_user', f"user - {current_user.id} - page - \
-                 {page} - is_hugged - {is_hugged} - is_favorite - {is_favorite} - user_id - {user_id} - \
-                 hashtag_id - {hashtag_id} - search - {search}")
-    data, from_cache = await cache.behind_cache(key_tuple, fatch_stories_criteria, ttl=7200)
+    key_tuple = (feed_namespace.stories, f"user - {current_user.id if current_user else None} - page - \
+                 {page} - cursor - {cursor} - is_hugged - {is_hugged} - is_favorite - {is_favorite} - user_id - {user_id} - \
+                 hashtag_id - {hashtag_id} - search - {search} - sort - {sort.value}")
+    tags = []
+    if current_user is not None:
+        tags.append(cache_tag.viewer.format(current_user.id))
+    if user_id is not None:
+        tags.append(cache_tag.author.format(user_id))
+    if search is not None or hashtag_id is not None:
+        tags.append(cache_tag.search)
+    data, from_cache = await cache.behind_cache(
+        key_tuple, fatch_stories_criteria, ttl=7200, tags=tags,
+        soft_ttl=settings.FEED_CACHE_SOFT_TTL, db=db,
+    )
+    data = await story_entity.render_page(db, data, current_user)
     await crud.user.handle_device(
         db=db,
         owner=current_user,
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Path, Query
 from app import crud, schemas, deps
 from app.exceptions import raise_if_none
 from app.utils.response import get_responses_description_by_codes
+from app.utils.counting import EstimatedCount
 
 logger = logging.getLogger(__name__)
 
@@ -92,7 +93,7 @@ async def get_tasks(
     current_user: deps.CurrentActiveSuperUserDependency,
     page: int = Query(1),
 ):
-    tasks, paginator = await crud.task.get_page(db=db, page=page)
+    tasks, paginator = await crud.task.get_page(db=db, page=page, counter=EstimatedCount())
 
     return schemas.response.Response(
         data=tasks,
@@ -108,7 +109,7 @@ async def get_tasks(
 )
 async def get_tasks(
     db: deps.DbDependency,
-    current_user: deps.CurrentActiveUserDependency,
+    current_user: deps.CurrentActivePrincipalDependency,
     page: int = Query(1),
 ):
     tasks, paginator = await crud.task.get_page(db=db, page=page)
@@ -146,7 +147,7 @@ async def get_task_cp(
 )
 async def get_task(
     db: deps.DbDependency,
-    current_user: deps.CurrentActiveUserDependency,
+    current_user: deps.CurrentActivePrincipalDependency,
     task_id: int = Path(...),
 ):
     task = await crud.task.get(db=db, id=task_id)
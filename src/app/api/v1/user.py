@@ -8,6 +8,8 @@ from user_agents import parse
 from app import crud, models, schemas, deps, getters
 from app.exceptions import InaccessibleEntity, UnprocessableEntity, raise_if_none
 from app.utils.response import get_responses_description_by_codes
+from app.utils.counting import CachedCount, invalidate_counts
+from app.utils.side_effects import after_commit
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,7 @@ async def sign_user_cp(
     data: schemas.CreatingUserForCP,
     db: deps.DbDependency,
     current_user: deps.CurrentActiveSuperUserDependency,
+    cache: deps.CacheDependency,
 ):
     is_email = await crud.user.get_by(db=db, email=data.email) if data.email else None
     is_phone = await crud.user.get_by(db=db, phone=data.phone)
@@ -34,6 +37,7 @@ async def sign_user_cp(
         raise UnprocessableEntity(message="Пользователь с таким номером телефона уже есть")
 
     user = await crud.user.registration(db=db, data=data)
+    await invalidate_counts(cache, "user")
 
     return schemas.response.Response(
         data=await getters.get_user(db=db, user=user),
@@ -49,6 +53,7 @@ async def sign_user_cp(
 async def get_all_user(
         db: deps.DbDependency,
         current_user: deps.CurrentActiveSuperUserDependency,
+        cache: deps.CacheDependency,
         is_active: bool = Query(True),
         page: int | None = Query(None),
         q: str | None = Query(None),
@@ -61,6 +66,7 @@ async def get_all_user(
         is_active=is_active,
         q=q,
         order_by=order_by,
+        counter=CachedCount(cache, "user"),
     )
 
     users = [await getters.get_user(db=db, user=user) for user in user_all]
@@ -128,6 +134,10 @@ async def update_user_admin(
         db: deps.DbDependency,
         data: schemas.UpdatingUserForCP,
         current_user: deps.CurrentActiveSuperUserDependency,
+        cache: deps.CacheDependency,
+        story_entity: deps.StoryEntityDependency,
+        principals: deps.PrincipalsDependency,
+        token_versions: deps.TokenVersionsDependency,
         user_id: int = Path(...),
 ):
     is_email_user = await crud.user.get_by(db=db, email=data.email) if data.email else None
@@ -142,6 +152,14 @@ async def update_user_admin(
     raise_if_none(user)
 
     user_for_return = await crud.user.update(db=db, db_obj=user, obj_in=data)
+    if data.is_superuser is not None or data.is_premium is not None:
+        await token_versions.bump(db, [user_id])
+    await after_commit(
+        principals.forget(user_id),
+        invalidate_counts(cache, "user"),
+        story_entity.forget_author(user_id),
+        breaker=deps.redis_breaker,
+    )
 
     return schemas.Response[schemas.GettingUser](
         data=await getters.get_user(db=db, user=user_for_return)
@@ -165,10 +183,17 @@ async def update_user(
         db: deps.DbDependency,
         data: schemas.UpdatingUser,
         cache: deps.CacheDependency,
+        principals: deps.PrincipalsDependency,
+        story_entity: deps.StoryEntityDependency,
         current_user: models.User = Depends(deps.get_current_active_su)
 ):
     user = await crud.user.update(db=db, db_obj=current_user, obj_in=data)
-    await cache.delete_by_prefix(f"user:{user.id}")
+    await after_commit(
+        principals.forget(user.id),
+        invalidate_counts(cache, "user"),
+        story_entity.forget_author(user.id),
+        breaker=deps.redis_breaker,
+    )
     return schemas.Response[schemas.GettingUser](
         data=await getters.get_user(db=db, user=user)
     )
@@ -183,6 +208,9 @@ async def update_user(
 async def delete_user(
         db: deps.DbDependency,
         current_user: deps.CurrentActiveSuperUserDependency,
+        cache: deps.CacheDependency,
+        principals: deps.PrincipalsDependency,
+        token_versions: deps.TokenVersionsDependency,
         user_id: int = Path(...),
 ):
     user = await crud.user.get_by(db=db, id=user_id)
@@ -191,6 +219,12 @@ async def delete_user(
     await crud.user.delete_user(db=db, user=user)
     await db.delete(user)
     await db.commit()
+    await token_versions.bump(db, [user_id])
+    await after_commit(
+        principals.forget(user_id),
+        invalidate_counts(cache, "user"),
+        breaker=deps.redis_breaker,
+    )
     return schemas.Response[None](
         data=None
     )
@@ -205,6 +239,9 @@ async def delete_user(
 async def deactivate_user_cp(
         db: deps.DbDependency,
         current_user: deps.CurrentActiveSuperUserDependency,
+        cache: deps.CacheDependency,
+        principals: deps.PrincipalsDependency,
+        token_versions: deps.TokenVersionsDependency,
         user_id: int = Path(...),
 ):
     user = await crud.user.get_by(db=db, id=user_id)
@@ -212,6 +249,12 @@ async def deactivate_user_cp(
 
     await crud.user.delete_firebase(db=db, user=user)
     await crud.user.delete_user(db=db, user=user)
+    await token_versions.bump(db, [user_id])
+    await after_commit(
+        principals.forget(user_id),
+        invalidate_counts(cache, "user"),
+        breaker=deps.redis_breaker,
+    )
     return schemas.Response[None](
         data=None
     )
@@ -225,11 +268,20 @@ async def deactivate_user_cp(
 )
 async def deactivate_user(
         db: deps.DbDependency,
+        cache: deps.CacheDependency,
+        principals: deps.PrincipalsDependency,
+        token_versions: deps.TokenVersionsDependency,
         current_user: models.User = Depends(deps.get_current_active_su),
         x_firebase_token: str | None = Header(None),
 ):
     await crud.user.delete_firebase(db=db, user=current_user)
     await crud.user.delete_user(db=db, user=current_user)
+    await token_versions.bump(db, [current_user.id])
+    await after_commit(
+        principals.forget(current_user.id),
+        invalidate_counts(cache, "user"),
+        breaker=deps.redis_breaker,
+    )
     return schemas.Response[None](
         data=None
     )
@@ -244,7 +296,7 @@ async def deactivate_user(
 )
 async def sign_out_user(
         db: deps.DbDependency,
-        current_user: models.User = Depends(deps.get_current_active_su),
+        current_user: deps.CurrentActiveSuperUserDependency,
         x_firebase_token: str | None = Header(None),
 ):
     if x_firebase_token is not None:
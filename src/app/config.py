@@ -82,6 +82,39 @@ class Settings(BaseSettings):
 
     REDIS_URL: str
     CACHE_TTL: int
+    HASHTAG_AUTOCOMPLETE_TTL: int = 60
+    TIMELINE_MAX_LENGTH: int = 800
+    TIMELINE_FANOUT_LIMIT: int = 5000
+    TIMELINE_TTL: int = 7 * 24 * 3600
+    EXCLUSION_TTL: int = 24 * 3600
+    TRENDING_REFRESH_INTERVAL: int = 300
+    TRENDING_SIZE: int = 50
+    L1_CACHE_SIZE: int = 1000
+    L1_CACHE_TTL: int = 30
+    L1_CACHE_LIMITS: dict[str, int] = {
+        "user": 5000, "story_entity": 5000, "story_ids": 2000, "short_story_ids": 1000,
+        "feed_story_ids": 2000, "subscription_story_ids": 2000,
+        "feed_short_story_ids": 1000, "subscription_short_story_ids": 1000,
+    }
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    CACHE_LOCK_TTL: int = 10
+    CACHE_LOCK_WAIT: float = 5
+    FEED_CACHE_SOFT_TTL: int = 300
+    STORY_ENTITY_TTL: int = 600
+    VIEWER_STATE_TTL: int = 24 * 3600
+    CACHE_CODEC: str = "json"
+    CACHE_COMPRESSION: str | None = None
+    CACHE_COMPRESS_THRESHOLD: int = 1024
+    CACHE_METRICS_FLUSH_INTERVAL: float = 10
+    VISIT_RECORD_INTERVAL: int = 300
+    VISIT_FLUSH_INTERVAL: float = 60
+    PRINCIPAL_TTL: int = 300
+    TOKEN_VERSION_TTL: int = 300
+    REDIS_HEALTH_INTERVAL: float = 1
+    REDIS_PING_TIMEOUT: float = 0.5
+    REDIS_FAILURE_THRESHOLD: int = 3
+    REDIS_RESET_TIMEOUT: float = 5
+    REDIS_PROBE_SUCCESSES: int = 2
 
     S3_SERVICE_NAME: str | None = None
     S3_ENDPOINTS_URL: str | None = None
@@ -4,6 +4,8 @@ from .crud_user import user
 from .crud_lesson import lesson
 from .crud_task import task
 from .crud_stage import stage
+from .crud_story_stats import story_stats
 from .crud_story import story
+from .crud_hashtag import hashtag
 from .crud_payment import payment
 from .crud_settings import settings
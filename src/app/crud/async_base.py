@@ -6,21 +6,38 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.models.base_model import Base
-from app.utils.pagination import get_page_async
+from app.utils.counting import CountStrategy
+from app.utils.pagination import get_page_async, get_page_keyset_async
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreatingSchemaType = TypeVar("CreatingSchemaType", bound=BaseModel)
 UpdatingSchemaType = TypeVar("UpdatingSchemaType", bound=BaseModel)
 
 class AsyncCRUDBase(Generic[ModelType, CreatingSchemaType, UpdatingSchemaType]):
+    # именованные наборы опций загрузки связей: {"feed_item": (selectinload(...), ...)}
+    loader_profiles: dict[str, tuple] = {}
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
-    async def get(self, db: AsyncSession, id: Any) -> ModelType | None:
-        return await db.get(self.model, id)
+    def _loader_options(self, profile: str | None) -> tuple:
+        if profile is None:
+            return ()
+        if profile not in self.loader_profiles:
+            raise ValueError(f"Модель {self.model.__name__} не имеет профиля загрузки '{profile}'")
+        return self.loader_profiles[profile]
+
+    async def get(self, db: AsyncSession, id: Any, profile: str | None = None) -> ModelType | None:
+        return await db.get(self.model, id, options=self._loader_options(profile))
+
+    async def reload(self, db: AsyncSession, db_obj: ModelType, profile: str | None = None) -> ModelType:
+        "перечитывает объект из БД с опциями профиля, в т.ч. если он уже есть в сессии"
+        return await db.get(
+            self.model, db_obj.id, options=self._loader_options(profile), populate_existing=True
+        )
 
-    async def get_many(self, db: AsyncSession, ids: list[Any]) -> list[ModelType]:
-        stmt = select(self.model).filter(self.model.id.in_(ids))
+    async def get_many(self, db: AsyncSession, ids: list[Any], profile: str | None = None) -> list[ModelType]:
+        stmt = select(self.model).filter(self.model.id.in_(ids)).options(*self._loader_options(profile))
         res = await db.execute(stmt)
         return res.scalars().unique().all()
 
@@ -114,9 +131,15 @@ class AsyncCRUDBase(Generic[ModelType, CreatingSchemaType, UpdatingSchemaType]):
             order_by: Any = None,
             page: int | None = None,
             size: int = 30,
+            cursor: str | None = None,
+            counter: CountStrategy | None = None,
             **kwargs,
     ):
+        "cursor is not None -> keyset-пагинация по (created, id), order_by и page игнорируются"
         stmt = select(self.model)
+        stmt = self._filters(stmt, kwargs)
+        if cursor is not None:
+            return await get_page_keyset_async(db, stmt, cursor, self._keyset_columns(), size)
         if order_by is None:
             if hasattr(self.model, "created"):
                 stmt = stmt.order_by(self.model.created.desc())
@@ -124,8 +147,13 @@ class AsyncCRUDBase(Generic[ModelType, CreatingSchemaType, UpdatingSchemaType]):
                 stmt = stmt.order_by(self.model.id)
         else:
             stmt = stmt.order_by(order_by)
-        stmt = self._filters(stmt, kwargs)
-        return await get_page_async(db, stmt, page, size)
+        return await get_page_async(db, stmt, page, size, counter=counter)
+
+    def _keyset_columns(self) -> tuple:
+        "columns of a stable descending keyset order"
+        if hasattr(self.model, "created"):
+            return self.model.created, self.model.id
+        return (self.model.id,)
 
     async def _adapt_fields(
             self, obj: dict[str, Any] | BaseModel, **kwargs
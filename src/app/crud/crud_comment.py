@@ -1,9 +1,10 @@
 from typing import Optional, Type
 
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import desc, select
+from sqlalchemy.orm import Session, joinedload
 
 from app.crud import AsyncCRUDBase
+from app.crud.crud_story_stats import story_stats as story_stats_crud
 from app.models.story import Story
 from app.models.user import User
 from app.schemas.story import CreatingStory, UpdatingStory
@@ -20,11 +21,12 @@ class CRUDComment(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
 
     async def comment_story(self, db: AsyncSession, *, user: User, story: Story, obj_in: CreatingComment):
         comment = Comment()
-        comment.story = story
+        comment.story_id = story.id
         comment.user = user
         comment.text = obj_in.text
         db.add(comment)
         db.add(user)
+        await story_stats_crud.apply_delta(db, story_id=story.id, comments=1)
         await db.commit()
         await db.refresh(comment)
 
@@ -34,7 +36,9 @@ class CRUDComment(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
         return await pagination.get_page_async(
             db,
             (
-                story.comments
+                select(Comment)
+                    .options(joinedload(Comment.user))
+                    .where(Comment.story_id == story.id)
                     .join(UserBlock, Comment.user_id == UserBlock.object_id, isouter=True)
                     .filter(UserBlock.id == None)
                     .order_by(desc(Comment.created))
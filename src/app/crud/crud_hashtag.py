@@ -2,16 +2,27 @@ from typing import Union, Dict, Any, Optional, Tuple, List
 
 from app.crud import AsyncCRUDBase
 from app.models.hashtag import Hashtag
+from app.models.story_hashtag import StoryHashtag
+from app.models.story_attachment import StoryAttachment
 from app.schemas.hashtag import CreatingHashtag, UpdatingHashtag
 from app.schemas.response import Paginator
 from app.utils import pagination
-from sqlalchemy import select
+from sqlalchemy import select, func, or_, desc, update
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
 class CRUDHashtag(AsyncCRUDBase[Hashtag, CreatingHashtag, UpdatingHashtag]):
 
+    @staticmethod
+    def normalize_prefix(prefix: str) -> str:
+        "'  #Котики ' -> 'котики'"
+        return prefix.strip().lstrip('#').strip().lower()
+
     async def update(
         self,
         db: AsyncSession,
@@ -26,6 +37,43 @@ class CRUDHashtag(AsyncCRUDBase[Hashtag, CreatingHashtag, UpdatingHashtag]):
 
         return await super().update(db,db_obj=db_obj,obj_in=update_data)
 
+    async def refresh_stats(self, db: AsyncSession, *, hashtag_ids) -> None:
+        """Пересчитывает stories_count и cover_attachment_id одним UPDATE.
+
+        Обложка - первое по id вложение среди историй с хештегом.
+        Выполняется в текущей транзакции, коммит остаётся за вызывающим кодом.
+
+        Строки хештегов сначала блокируются (FOR UPDATE, по id - без взаимных
+        блокировок): пересчёт ждёт коммита параллельной транзакции с теми же
+        хештегами и следующим оператором, с новым снимком READ COMMITTED, видит её
+        StoryHashtag. Иначе оба пересчёта считают по своим снимкам и второй
+        записывает заниженный stories_count.
+        """
+        hashtag_ids = sorted(hashtag_id for hashtag_id in set(hashtag_ids) if hashtag_id is not None)
+        if not hashtag_ids:
+            return
+        await db.execute(
+            select(Hashtag.id).where(Hashtag.id.in_(hashtag_ids)).order_by(Hashtag.id).with_for_update()
+        )
+        await db.execute(
+            update(Hashtag)
+            .where(Hashtag.id.in_(hashtag_ids))
+            .values(
+                stories_count=(
+                    select(func.count(StoryHashtag.id))
+                    .where(StoryHashtag.hashtag_id == Hashtag.id)
+                    .scalar_subquery()
+                ),
+                cover_attachment_id=(
+                    select(func.min(StoryAttachment.id))
+                    .join(StoryHashtag, StoryHashtag.story_id == StoryAttachment.story_id)
+                    .where(StoryHashtag.hashtag_id == Hashtag.id)
+                    .scalar_subquery()
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
     async def search(
             self,
             db: AsyncSession,
@@ -35,9 +83,38 @@ class CRUDHashtag(AsyncCRUDBase[Hashtag, CreatingHashtag, UpdatingHashtag]):
     ) -> Tuple[List[Hashtag], Paginator]:
         stmt = select(Hashtag)
         if search is not None:
-            stmt = stmt.where(Hashtag.text.ilike(f"%{search}%"))
+            # ILIKE '%q%' обслуживается GIN-индексом ix_hashtag_text_trgm
+            stmt = stmt.where(Hashtag.text.ilike(f"%{_escape_like(search)}%"))
         stmt = stmt.order_by(Hashtag.text)
         return await pagination.get_page_async(db, stmt, page)
 
+    async def autocomplete(
+            self,
+            db: AsyncSession,
+            *,
+            prefix: str,
+            limit: int = 10
+    ) -> List[Hashtag]:
+        """Подсказки для ввода хештега: top-N без OFFSET и подсчёта общего количества.
+
+        Кандидаты - совпадения по префиксу (ix_hashtag_text_lower_pattern) и похожие
+        по триграммам (ix_hashtag_text_trgm). Сначала префиксные, затем по похожести
+        и количеству историй. prefix ожидается уже нормализованным.
+        """
+        is_prefix = func.lower(Hashtag.text).like(f"{_escape_like(prefix)}%")
+        stmt = (
+            select(Hashtag)
+            .where(or_(is_prefix, Hashtag.text.op('%')(prefix)))
+            .order_by(
+                desc(is_prefix),
+                desc(func.similarity(Hashtag.text, prefix)),
+                desc(Hashtag.stories_count),
+                Hashtag.text,
+            )
+            .limit(limit)
+        )
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
 
 hashtag = CRUDHashtag(Hashtag)
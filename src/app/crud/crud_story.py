@@ -1,37 +1,159 @@
 import datetime
 from typing import Any, Dict, Optional, Union, Type, List, Tuple
 
-from sqlalchemy import or_, not_, and_, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, not_, and_, desc, delete, func, update, exists
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.crud import AsyncCRUDBase
+from app.crud.crud_hashtag import hashtag as hashtag_crud
 from app.crud.crud_story_attachment import story_attachment as attachment_crud
+from app.crud.crud_story_stats import story_stats as story_stats_crud
 from app.models import Hug, Device, FirebaseToken, FavoriteStory, Subscription
 from app.models.story import Story
 from app.models.user import User
 from app.schemas.response import Paginator
 from app.schemas.story import CreatingStory, UpdatingStory
 from app.utils import pagination
-from ..models import Hashtag, StoryHashtag, StoryAttachment, View, StoryHiding, UserBlock, Reaction
+from ..models import (
+    Hashtag, StoryHashtag, StoryAttachment, View, StoryHiding, UserBlock, Reaction, StoryStats, Comment, StoryReport
+)
 from app.enums.reaction import ReactionType
+from app.enums.story_sort import StorySort
+from app.exceptions import EntityError
+from app.services.exclusion import Exclusions
+
+SEARCH_CONFIG = 'russian'
+SHORT_STORY_LIFETIME = datetime.timedelta(hours=24)
+SHORT_STORIES_PER_USER = 30
 
 
 class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
+    # Профили загружают ровно то, что читает getters.story.get_stories_batch;
+    # счётчики, отметки и хештеги он получает отдельными запросами на всю страницу
+    loader_profiles = {
+        'feed_item': (
+            joinedload(Story.user),
+            selectinload(Story.attachments),
+        ),
+        'story_detail': (
+            joinedload(Story.user),
+            joinedload(Story.attachments),
+        ),
+    }
 
     def __init__(self, model: Type[Story]):
         super().__init__(model=model)
 
+    async def _get_page(
+            self,
+            db: AsyncSession,
+            query,
+            page: Optional[int],
+            cursor: Optional[str],
+    ) -> Tuple[List[Story], Paginator]:
+        "cursor is not None -> keyset-пагинация по (created, id) без подсчёта, иначе постраничная"
+        if cursor is not None:
+            return await pagination.get_page_keyset_async(db, query, cursor, self._keyset_columns())
+        return await pagination.get_page_async(db, query, page)
+
+    def _exclusion_conditions(
+            self,
+            current_user: Optional[User],
+            exclusions: Optional[Exclusions],
+    ) -> list:
+        """Условия, убирающие скрытые зрителем истории и авторов, с которыми есть блокировка.
+
+        С exclusions из ExclusionService - NOT IN по готовым id, иначе анти-join в БД.
+        """
+        if exclusions is not None:
+            conditions = []
+            if exclusions.blocked_user_ids:
+                conditions.append(Story.user_id.not_in(exclusions.blocked_user_ids))
+            if exclusions.hidden_story_ids:
+                conditions.append(Story.id.not_in(exclusions.hidden_story_ids))
+            return conditions
+        if current_user is None:
+            return []
+        blocked = (
+            select(UserBlock.object_id).where(UserBlock.subject_id == current_user.id)
+            .union(select(UserBlock.subject_id).where(UserBlock.object_id == current_user.id))
+        )
+        return [
+            ~exists().where(StoryHiding.story_id == Story.id, StoryHiding.user_id == current_user.id),
+            Story.user_id.not_in(blocked),
+        ]
+
+    def _search(self, query, search: str, sort: StorySort):
+        "полнотекстовый фильтр; при sort=relevance сортирует по ts_rank_cd"
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search)
+        query = query.filter(Story.search_vector.op('@@')(ts_query))
+        if sort == StorySort.relevance:
+            query = query.order_by(desc(func.ts_rank_cd(Story.search_vector, ts_query)))
+        return query
+
+    async def refresh_search_vector(self, db: AsyncSession, *, story_ids: List[int]) -> None:
+        """Пересобирает search_vector из title, текстов хештегов и text.
+
+        Выполняется в текущей транзакции: вызывать после flush изменений хештегов.
+        """
+        hashtags_text = (
+            select(func.string_agg(Hashtag.text, ' '))
+            .join(StoryHashtag, StoryHashtag.hashtag_id == Hashtag.id)
+            .where(StoryHashtag.story_id == Story.id)
+            .scalar_subquery()
+        )
+
+        def weighted(column, weight: str):
+            return func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(column, '')), weight)
+
+        await db.execute(
+            update(Story)
+            .where(Story.id.in_(story_ids))
+            .values(
+                search_vector=(
+                    weighted(Story.title, 'A')
+                    .op('||')(weighted(hashtags_text, 'A'))
+                    .op('||')(weighted(Story.text, 'B'))
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _get_search_page(
+            self,
+            db: AsyncSession,
+            query,
+            search: Optional[str],
+            sort: StorySort,
+            page: Optional[int],
+            cursor: Optional[str],
+    ) -> Tuple[List[Story], Paginator]:
+        "ранжированная выдача поиска листается только постранично, cursor для неё - ошибка"
+        if search is not None:
+            query = self._search(query, search, sort)
+            if sort == StorySort.relevance:
+                if cursor is not None:
+                    raise EntityError(
+                        message="Сортировка по релевантности листается только постранично",
+                        path="$query.cursor",
+                    )
+                return await self._get_page(db, query.order_by(desc(Story.created)), page, None)
+        return await self._get_page(db, query.order_by(desc(Story.created)), page, cursor)
+
+    async def _get_hashtag_ids(self, db: AsyncSession, *, story_id: int) -> List[int]:
+        result = await db.execute(select(StoryHashtag.hashtag_id).where(StoryHashtag.story_id == story_id))
+        return result.scalars().all()
+
     async def create_story_by_user(self, db: AsyncSession, *, user: User, obj_in: CreatingStory):
         db_obj = Story()
-        db_obj.user = user
+        db_obj.user_id = user.id
         db_obj.text = obj_in.text
         db_obj.is_private = obj_in.is_private if obj_in.is_private is not None else None
         db_obj.is_short_story = obj_in.is_short_story
         db.add(db_obj)
-
-        db.add(user)
+        db.add(StoryStats(story=db_obj))
 
         attachments = []
 
@@ -44,7 +166,7 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
                 if attachment is None:
                     not_found.append(index)
                     continue
-                if attachment.story is not None:
+                if attachment.story_id is not None:
                     rebinding.append(index)
                     continue
                 attachments.append(attachment)
@@ -59,9 +181,9 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             attachment = await attachment_crud.get(db,id=obj_in.video)
             if attachment is None:
                 return None, -5, None
-            if attachment.user != user:
+            if attachment.user_id != user.id:
                 return None, -6, None
-            if attachment.story is not None:
+            if attachment.story_id is not None:
                 return None, -7, None
             attachments.append(attachment)
 
@@ -69,6 +191,7 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             attachment.story = db_obj
             db.add(attachment)
 
+        hashtags = []
         for hashtag_text in obj_in.hashtags:
             hashtag_query = select(Hashtag).where(Hashtag.text == hashtag_text)
             hashtag = await db.execute(hashtag_query)
@@ -81,11 +204,14 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             story_hashtag.story = db_obj
             story_hashtag.hashtag = hashtag
             db.add(story_hashtag)
+            hashtags.append(hashtag)
 
+        await db.flush()
+        await self.refresh_search_vector(db, story_ids=[db_obj.id])
+        await hashtag_crud.refresh_stats(db, hashtag_ids=[hashtag.id for hashtag in hashtags])
         await db.commit()
-        await db.refresh(db_obj)
 
-        return db_obj, 0, None
+        return await self.reload(db, db_obj, 'story_detail'), 0, None
 
 
     async def update(
@@ -101,6 +227,10 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
         else:
             update_data = obj_in.dict(exclude_unset=True)
 
+        # изменения хештегов и вложений меняют счётчики и обложки хештегов
+        refresh_hashtags = bool({'gallery', 'video', 'hashtags'} & update_data.keys())
+        old_hashtag_ids = await self._get_hashtag_ids(db, story_id=db_obj.id) if refresh_hashtags else []
+
         if 'text' in update_data:
             db_obj.text = obj_in.text
         if 'title' in update_data:
@@ -110,7 +240,7 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
         db.add(db_obj)
         if 'gallery' in update_data:
             new_ids_in_gallery = update_data['gallery'] or []
-            old_objs_in_gallery = db_obj.attachments.filter(StoryAttachment.is_image).all()
+            old_objs_in_gallery = [att for att in db_obj.attachments if att.is_image]
             old_ids_in_gallery = [item.id for item in old_objs_in_gallery]
 
             for_removing = []
@@ -127,7 +257,7 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
                     new_attachment = await attachment_crud.get(db,id=id_)
                     if new_attachment is None:
                         not_found.append(index)
-                    if new_attachment.story is not None:
+                    if new_attachment.story_id is not None:
                         rebinding.append(index)
                     new_attachment.story = db_obj
                     db.add(new_attachment)
@@ -143,17 +273,17 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
                 await db.delete(attachment)
 
         if 'video' in update_data:
-            old_video = db_obj.attachments.filter(not_(StoryAttachment.is_image)).first()
+            old_video = next((att for att in db_obj.attachments if not att.is_image), None)
             new_video_id = update_data['video']
             if old_video is not None and old_video.id != update_data['video']:
-                old_video.story = None
+                old_video.story_id = None
             if new_video_id is not None:
                 new_video = await attachment_crud.get(db,id=new_video_id)
                 if new_video is None:
                     return None, -5, None
-                if new_video.user != db_obj.user:
+                if new_video.user_id != db_obj.user_id:
                     return None, -6, None
-                if new_video.story is not None:
+                if new_video.story_id is not None:
                     return None, -7, None
                 new_attachments.append(new_video)
 
@@ -170,9 +300,13 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             }
             new_hashtags = update_data['hashtags']
 
-            for hashtag_text, story_hashtag in old_hashtags.items():
-                if hashtag_text not in new_hashtags:
-                    await db.delete(story_hashtag)
+            removed_ids = [
+                story_hashtag_id
+                for hashtag_text, story_hashtag_id in old_hashtags.items()
+                if hashtag_text not in new_hashtags
+            ]
+            if removed_ids:
+                await db.execute(delete(StoryHashtag).where(StoryHashtag.id.in_(removed_ids)))
             for hashtag_text in new_hashtags:
                 if hashtag_text not in old_hashtags:
                     result = await db.execute(select(Hashtag).where(Hashtag.text == hashtag_text))
@@ -182,13 +316,23 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
                         hashtag.text = hashtag_text
                         db.add(hashtag)
                     story_hashtag = StoryHashtag()
-                    story_hashtag.story = db_obj
+                    story_hashtag.story_id = db_obj.id
                     story_hashtag.hashtag = hashtag
                     db.add(story_hashtag)
 
+        if {'text', 'title', 'hashtags'} & update_data.keys():
+            await db.flush()
+            await self.refresh_search_vector(db, story_ids=[db_obj.id])
+
+        if refresh_hashtags:
+            await db.flush()
+            await hashtag_crud.refresh_stats(
+                db,
+                hashtag_ids=[*old_hashtag_ids, *await self._get_hashtag_ids(db, story_id=db_obj.id)]
+            )
+
         await db.commit()
-        await db.refresh(db_obj)
-        return db_obj, 0, None
+        return await self.reload(db, db_obj, 'story_detail'), 0, None
 
     async def get_stories_by_user(
         self,
@@ -200,36 +344,27 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
         is_hugged: Optional[bool] = None,
         is_favorite: Optional[bool] = None,
         is_short_story: bool = False,
+        cursor: Optional[str] = None,
+        exclusions: Optional[Exclusions] = None,
+        profile: str = 'feed_item',
     ) -> Tuple[List[Story], Paginator]:
         now = datetime.datetime.utcnow()
-        query = select(Story).filter(Story.user == user).order_by(desc(Story.created))
+        query = (
+            select(Story)
+            .options(*self._loader_options(profile))
+            .filter(Story.user_id == user.id)
+            .order_by(desc(Story.created))
+        )
 
         if is_short_story:
             query = query.filter(
                 Story.is_short_story == True,
-                Story.created >= now - datetime.timedelta(hours=24)
+                Story.created >= now - SHORT_STORY_LIFETIME
             )
         else:
             query = query.filter(Story.is_short_story == False)
 
-        if current_user is not None:
-            query = (
-                query
-                    .join(
-                        StoryHiding,
-                        and_(StoryHiding.story_id == Story.id, StoryHiding.user_id == current_user.id),
-                        isouter=True
-                    )
-                    .join(
-                        UserBlock,
-                        or_(
-                            and_(UserBlock.object_id == current_user.id, UserBlock.subject_id == Story.user_id),
-                            and_(UserBlock.subject_id == current_user.id, UserBlock.object_id == Story.user_id)
-                        ),
-                        isouter=True
-                    )
-                    .filter(StoryHiding.id == None, UserBlock.id == None)
-            )
+        query = query.filter(*self._exclusion_conditions(current_user, exclusions))
 
         if current_user is not None and is_hugged is not None:
             query = query.join(Hug, and_(Hug.story_id == Story.id, Hug.user_id == current_user.id),isouter=True)
@@ -246,7 +381,7 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             else:
                 query = query.filter(FavoriteStory.id == None)
 
-        return await pagination.get_page_async(db, query, page)
+        return await self._get_page(db, query, page, cursor)
 
 
     async def get_stories_from_subscriptions(
@@ -254,10 +389,12 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             db,
             *,
             search: Optional[str] = None,
+            sort: StorySort = StorySort.relevance,
             hashtag: Optional[Hashtag] = None,
             is_hugged: Optional[bool] = None,
             is_favorite: Optional[bool] = None,
             page: Optional[int] = None,
+            cursor: Optional[str] = None,
             is_short_story: bool = False,
             current_user: User = None,
             host: Optional[str] = None,
@@ -265,32 +402,21 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             accept_language: Optional[str] = None,
             user_agent: Optional[str] = None,
             x_firebase_token: Optional[str] = None,
+            exclusions: Optional[Exclusions] = None,
+            profile: str = 'feed_item',
     ) -> Tuple[List[Story], Paginator]:
 
-        query = select(Story)
+        query = select(Story).options(*self._loader_options(profile))
+        query = query.filter(*self._exclusion_conditions(current_user, exclusions))
         now = datetime.datetime.utcnow()
 
-        if search is not None:
-            query = query\
-                .join(StoryHashtag, isouter=True)\
-                .join(Hashtag, isouter=True)\
-                .filter(
-                    or_(
-                        Hashtag.text.ilike(f'%{search}%'),
-                        Story.text.ilike(f'%{search}%')
-                    )
-                )
-
-        result = await db.execute(
-            select(Subscription.object_id).where(Subscription.subject_id == current_user.id)
-        )
-        following_user_ids = [row[0] for row in result.all()]
-        query = query.filter(Story.user_id.in_(following_user_ids))
+        following = select(Subscription.object_id).where(Subscription.subject_id == current_user.id)
+        query = query.filter(Story.user_id.in_(following))
 
         if is_short_story:
             query = query.filter(
                 Story.is_short_story == True,
-                Story.created >= now - datetime.timedelta(hours=24)
+                Story.created >= now - SHORT_STORY_LIFETIME
             )
         else:
             query = query.filter(Story.is_short_story == False)
@@ -316,10 +442,21 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
         #     now - Story.created <= datetime.timedelta(days=90),
         # )
 
-        query = query.order_by(desc(Story.created)).distinct()
-
+        return await self._get_search_page(db, query, search, sort, page, cursor)
 
-        return await pagination.get_page_async(db, query, page)
+    async def get_by_ids_ordered(
+            self,
+            db: AsyncSession,
+            *,
+            ids: List[int],
+            profile: str = 'feed_item',
+    ) -> Tuple[List[Story], List[int]]:
+        "истории в порядке ids и список id, которых уже нет в БД"
+        stories_by_id = {story.id: story for story in await self.get_many(db, ids, profile=profile)}
+        return (
+            [stories_by_id[id_] for id_ in ids if id_ in stories_by_id],
+            [id_ for id_ in ids if id_ not in stories_by_id],
+        )
 
     async def mark_story_as_viewed(
             self,
@@ -329,15 +466,18 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             user: User
     ):
         result = await db.execute(
-            select(View).where(View.story == story, View.user == user)
+            select(View).where(View.story_id == story.id, View.user_id == user.id)
         )
         view = result.scalar_one_or_none()
         if view is None:
             view = View()
-            view.user = user
-            view.story = story
+            view.user_id = user.id
+            view.story_id = story.id
             db.add(view)
+            await story_stats_crud.apply_delta(db, story_id=story.id, views=1)
             await db.commit()
+            return True
+        return False
 
     async def hug_story(
             self,
@@ -348,20 +488,26 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
               hugs: bool
     ):
         result = await db.execute(
-            select(Hug).where(Hug.story == story, Hug.user == user)
+            select(Hug).where(Hug.story_id == story.id, Hug.user_id == user.id)
         )
         hug = result.scalar_one_or_none()
 
         if hug is None and hugs:
             hug = Hug()
-            hug.story = story
-            hug.user = user
+            hug.story_id = story.id
+            hug.user_id = user.id
             db.add(hug)
+            await story_stats_crud.apply_delta(db, story_id=story.id, hugs=1)
             await db.commit()
+            return True
 
-
+        elif hug is not None and not hugs:
             await db.delete(hug)
+            await story_stats_crud.apply_delta(db, story_id=story.id, hugs=-1)
             await db.commit()
+            return True
+
+        return False
 
     async def react_story(
             self,
@@ -374,27 +520,31 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
     ):
         result = await db.execute(
             select(Reaction).where(
-                Reaction.story == story,
-                Reaction.user == user,
+                Reaction.story_id == story.id,
+                Reaction.user_id == user.id,
                 Reaction.type_reaction == type_reaction
             )
         )
         reaction = result.scalar_one_or_none()
-        owner_story = story.user
 
         if reaction is None and set_reaction:
             reaction = Reaction()
-            reaction.story = story
-            reaction.user = user
+            reaction.story_id = story.id
+            reaction.user_id = user.id
             reaction.type_reaction = type_reaction
             db.add(reaction)
-
+            await story_stats_crud.apply_delta(db, story_id=story.id, reactions={type_reaction: 1})
             await db.commit()
+            return True
 
         if reaction is not None and not set_reaction:
 
             await db.delete(reaction)
+            await story_stats_crud.apply_delta(db, story_id=story.id, reactions={type_reaction: -1})
             await db.commit()
+            return True
+
+        return False
 
     async def favorite_story(
                 self,
@@ -405,19 +555,25 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
                 is_favorite: bool
     ):
         result = await db.execute(
-            select(FavoriteStory).where(FavoriteStory.story_id == story.id, FavoriteStory.user == user)
+            select(FavoriteStory).where(FavoriteStory.story_id == story.id, FavoriteStory.user_id == user.id)
         )
         fav = result.scalar_one_or_none()
         if fav is None and is_favorite:
             fav = FavoriteStory()
-            fav.story = story
-            fav.user = user
+            fav.story_id = story.id
+            fav.user_id = user.id
             db.add(fav)
+            await story_stats_crud.apply_delta(db, story_id=story.id, favorites=1)
             await db.commit()
+            return True
 
         elif fav is not None and not is_favorite:
             await db.delete(fav)
+            await story_stats_crud.apply_delta(db, story_id=story.id, favorites=-1)
             await db.commit()
+            return True
+
+        return False
 
     async def hide_story(
             self,
@@ -428,19 +584,23 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             hide: bool
     ):
         result = await db.execute(
-            select(StoryHiding).where(StoryHiding.story == story, StoryHiding.user == user)
+            select(StoryHiding).where(StoryHiding.story_id == story.id, StoryHiding.user_id == user.id)
         )
         hiding = result.scalar_one_or_none()
         if hiding is None and hide:
             hiding = StoryHiding()
-            hiding.story = story
-            hiding.user = user
+            hiding.story_id = story.id
+            hiding.user_id = user.id
             db.add(hiding)
             await db.commit()
+            return True
 
         elif hiding is not None and not hide:
             await db.delete(hiding)
             await db.commit()
+            return True
+
+        return False
 
     async def get_stories(
             self,
@@ -449,37 +609,31 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
             search: Optional[str],
             hashtag: Optional[Hashtag],
             user: Optional[User],
+            sort: StorySort = StorySort.relevance,
             is_hugged: Optional[bool] = None,
             is_favorite: Optional[bool] = None,
             is_short_story: bool = False,
             page: Optional[int] = None,
+            cursor: Optional[str] = None,
             current_user: Optional[User] = None,
+            exclusions: Optional[Exclusions] = None,
+            profile: str = 'feed_item',
     ) -> Tuple[List[Story], Paginator]:
 
-        query = select(Story)
+        query = select(Story).options(*self._loader_options(profile))
+        query = query.filter(*self._exclusion_conditions(current_user, exclusions))
         now = datetime.datetime.utcnow()
 
         if is_short_story:
             query = query.filter(
                 Story.is_short_story == True,
-                Story.created >= now - datetime.timedelta(hours=24)
+                Story.created >= now - SHORT_STORY_LIFETIME
             )
         else:
             query = query.filter(Story.is_short_story == False)
 
-        if search is not None:
-            query = query \
-                .join(StoryHashtag, isouter=True) \
-                .join(Hashtag, isouter=True) \
-                .filter(
-                or_(
-                    Hashtag.text.ilike(f'%{search}%'),
-                    Story.text.ilike(f'%{search}%')
-                )
-            )
-
         if user is not None:
-            query = query.filter(Story.user == user)
+            query = query.filter(Story.user_id == user.id)
         if hashtag is not None:
             query = query.join(StoryHashtag).filter(StoryHashtag.hashtag == hashtag)
 
@@ -501,148 +655,124 @@ class CRUDStory(AsyncCRUDBase[Story, CreatingStory, UpdatingStory]):
         # query = query.filter(
         #     now - Story.created <= datetime.timedelta(days=90),
         # )
-        query = query.order_by(desc(Story.created)).distinct()
-
-        return await pagination.get_page_async(db, query, page)
+        return await self._get_search_page(db, query, search, sort, page, cursor)
 
-    async def get_short_stories_from_subscriptions(
+    async def _get_short_story_rings(
             self,
-            db,
+            db: AsyncSession,
             *,
-            page: Optional[int] = None,
-            current_user: User = None,
-    ):
-
-        result = await db.execute(
-            select(Subscription.object_id).where(Subscription.subject_id == current_user.id)
+            conditions: list,
+            page: Optional[int],
+            cursor: Optional[str],
+            profile: str,
+    ) -> Tuple[List[List[Story]], Optional[Paginator]]:
+        """Кольца short-историй: авторы по убыванию времени последней истории, у каждого
+        не больше SHORT_STORIES_PER_USER историй.
+
+        Пагинация идёт по авторам (постранично или keyset по (latest_created, user_id)),
+        истории страницы выбираются одним запросом с row_number() по автору.
+        """
+        conditions = [
+            Story.is_short_story.is_(True),
+            Story.created >= datetime.datetime.utcnow() - SHORT_STORY_LIFETIME,
+            *conditions,
+        ]
+        rings = (
+            select(Story.user_id.label('user_id'), func.max(Story.created).label('latest_created'))
+            .where(*conditions)
+            .group_by(Story.user_id)
+            .subquery()
         )
-        following_user_ids = [row[0] for row in result.all()]
-
-        result = await db.execute(
-            select(Story.user_id)
-            .where(
-                Story.is_short_story.is_(True),
-                Story.created >= datetime.datetime.utcnow() - datetime.timedelta(hours=24),
-                Story.user_id.in_(following_user_ids)
+        users_query = select(rings.c.user_id, rings.c.latest_created)
+        if cursor is not None:
+            rows, paginator = await pagination.get_page_keyset_async(
+                db, users_query, cursor, (rings.c.latest_created, rings.c.user_id), scalars=False
             )
-            .order_by(Story.user_id, Story.created.desc())
-        )
-        user_ids_with_stories = result.all()
-        user_ids = [user_id for (user_id,) in user_ids_with_stories]
-
+        else:
+            rows, paginator = await pagination.get_page_async(
+                db,
+                users_query.order_by(desc(rings.c.latest_created), desc(rings.c.user_id)),
+                page,
+                scalars=False,
+            )
+        user_ids = [row.user_id for row in rows]
         if not user_ids:
-            return [], None
-
-        query = select(Story)
-        now = datetime.datetime.utcnow()
-        query = query.filter(
-            Story.is_short_story.is_(True),
-            Story.created >= now - datetime.timedelta(hours=24),
-            Story.user_id.in_(following_user_ids)
+            return [], paginator
+
+        numbered = (
+            select(
+                Story.id,
+                func.row_number().over(
+                    partition_by=Story.user_id,
+                    order_by=(desc(Story.created), desc(Story.id))
+                ).label('position')
+            )
+            .where(*conditions, Story.user_id.in_(user_ids))
+            .subquery()
+        )
+        result = await db.execute(
+            select(Story)
+            .options(*self._loader_options(profile))
+            .join(numbered, numbered.c.id == Story.id)
+            .where(numbered.c.position <= SHORT_STORIES_PER_USER)
+            .order_by(Story.user_id, desc(Story.created), desc(Story.id))
         )
-        result = await db.execute(query.order_by(Story.user_id, desc(Story.created)))
-        all_stories = result.scalars().all()
-
         stories_by_user: Dict[int, List[Story]] = {}
-        for story in all_stories:
-            if story.user_id not in stories_by_user:
-                stories_by_user[story.user_id] = []
-            stories_by_user[story.user_id].append(story)
-
-        grouped_stories = [
-            stories_by_user[user_id]
-            for user_id in user_ids
-            if user_id in stories_by_user
-        ]
+        for story in result.scalars().all():
+            stories_by_user.setdefault(story.user_id, []).append(story)
 
-        if page is not None:
-            items_per_page = 30
-            total_items = len(grouped_stories)
-            total_pages = (total_items + items_per_page - 1) // items_per_page  # Округление вверх
-
-            # Проверка на выход за границы
-            if page < 1 or (page > total_pages and total_pages > 0):
-                return [], None
-
-            start_idx = (page - 1) * items_per_page
-            end_idx = start_idx + items_per_page
-            paginated_items = grouped_stories[start_idx:end_idx]
-
-            paginator = Paginator(
-                page=page,
-                total=total_pages,
-                total_count=total_items,
-                has_prev=page > 1,
-                has_next=page < total_pages
-            )
-            return paginated_items, paginator
-        else:
-            return grouped_stories, None
+        return [stories_by_user[user_id] for user_id in user_ids if user_id in stories_by_user], paginator
+
+    async def get_short_stories_from_subscriptions(
+            self,
+            db,
+            *,
+            page: Optional[int] = None,
+            cursor: Optional[str] = None,
+            current_user: User = None,
+            exclusions: Optional[Exclusions] = None,
+            profile: str = 'feed_item',
+    ) -> Tuple[List[List[Story]], Optional[Paginator]]:
+        following = select(Subscription.object_id).where(Subscription.subject_id == current_user.id)
+        return await self._get_short_story_rings(
+            db,
+            conditions=[
+                Story.user_id.in_(following),
+                *self._exclusion_conditions(current_user, exclusions),
+            ],
+            page=page,
+            cursor=cursor,
+            profile=profile,
+        )
 
     async def get_short_stories(
             self,
             db,
             *,
             page: Optional[int] = None,
+            cursor: Optional[str] = None,
             current_user: Optional[User] = None,
-    ) -> Tuple[List[Story], Paginator]:
-
-        result = await db.execute(
-            select(Story.user_id)
-            .distinct()
-            .where(
-                Story.is_short_story.is_(True),
-                Story.created >= datetime.datetime.utcnow() - datetime.timedelta(hours=24)
-            )
-            .order_by(Story.user_id, Story.created.desc())
+            exclusions: Optional[Exclusions] = None,
+            profile: str = 'feed_item',
+    ) -> Tuple[List[List[Story]], Optional[Paginator]]:
+        return await self._get_short_story_rings(
+            db,
+            conditions=self._exclusion_conditions(current_user, exclusions),
+            page=page,
+            cursor=cursor,
+            profile=profile,
         )
-        user_ids_with_stories = result.all()
-        user_ids =[user_id for (user_id,) in user_ids_with_stories]
 
-        if not user_ids:
-            return [], None
-
-        query = select(Story)
-        now = datetime.datetime.utcnow()
-        query = query.filter(
-            Story.is_short_story.is_(True),
-            Story.created >= now - datetime.timedelta(hours=24)
-        )
-        result = await db.execute(query.order_by(Story.user_id, desc(Story.created)))
-        all_stories = result.scalars().all()
-        stories_by_user: Dict[int, List[Story]] = {}
-        for story in all_stories:
-            if story.user_id not in stories_by_user:
-                stories_by_user[story.user_id] = []
-            stories_by_user[story.user_id].append(story)
-
-        grouped_stories = [
-            stories_by_user[user_id]
-            for user_id in user_ids
-            if user_id in stories_by_user
-        ]
-        if page is not None:
-            items_per_page = 30
-            total_items = len(grouped_stories)
-            total_pages = (total_items + items_per_page - 1) // items_per_page  # Округление вверх
-
-            # Проверка на выход за границы
-            if page < 1 or (page > total_pages and total_pages > 0):
-                return [], None
-
-            start_idx = (page - 1) * items_per_page
-            end_idx = start_idx + items_per_page
-            paginated_items = grouped_stories[start_idx:end_idx]
-
-            paginator = Paginator(
-                page=page,
-                total=total_pages,
-                total_count=total_items,
-                has_prev=page > 1,
-                has_next=page < total_pages
-            )
-            return paginated_items, paginator
-        else:
-            return grouped_stories, None
+    async def remove(self, db: AsyncSession, *, id: int) -> None:
+        "удаляет историю и зависимые записи пакетными DELETE, не загружая связи"
+        hashtag_ids = await self._get_hashtag_ids(db, story_id=id)
+        for model in (View, Hug, FavoriteStory, Comment, Reaction, StoryHiding, StoryHashtag):
+            await db.execute(delete(model).where(model.story_id == id))
+        await db.execute(delete(StoryReport).where(StoryReport.object_id == id))
+        await db.execute(delete(StoryAttachment).where(StoryAttachment.story_id == id))
+        await db.execute(delete(StoryStats).where(StoryStats.story_id == id))
+        await db.execute(delete(Story).where(Story.id == id))
+        await hashtag_crud.refresh_stats(db, hashtag_ids=hashtag_ids)
+        await db.commit()
 
 story = CRUDStory(Story)
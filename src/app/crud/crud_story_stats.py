@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import AsyncCRUDBase
+from app.enums.reaction import ReactionType
+from ..models import Story, StoryStats, View, Hug, Comment, FavoriteStory, Reaction
+
+
+class CRUDStoryStats(AsyncCRUDBase[StoryStats, BaseModel, BaseModel]):
+
+    async def apply_delta(
+            self,
+            db: AsyncSession,
+            *,
+            story_id: int,
+            views: int = 0,
+            hugs: int = 0,
+            comments: int = 0,
+            favorites: int = 0,
+            reactions: Optional[Dict[ReactionType, int]] = None,
+    ) -> None:
+        """Атомарно прибавляет приращения к счётчикам истории.
+
+        Выполняется в текущей транзакции, коммит остаётся за вызывающим кодом,
+        чтобы счётчик менялся вместе с самой записью просмотра, объятия и т.п.
+        """
+        deltas = {
+            'views_count': views,
+            'hugs_count': hugs,
+            'comments_count': comments,
+            'favorites_count': favorites,
+        }
+        for type_reaction, delta in (reactions or {}).items():
+            deltas[StoryStats.reaction_column(type_reaction)] = delta
+        deltas = {column: delta for column, delta in deltas.items() if delta != 0}
+        if not deltas:
+            return
+
+        table = StoryStats.__table__
+        stmt = insert(table).values(
+            story_id=story_id,
+            **{column: max(delta, 0) for column, delta in deltas.items()}
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.story_id],
+            set_={
+                column: func.greatest(table.c[column] + delta, 0)
+                for column, delta in deltas.items()
+            }
+        )
+        await db.execute(stmt)
+
+    async def get_by_story_ids(self, db: AsyncSession, *, story_ids: List[int]) -> Dict[int, StoryStats]:
+        if not story_ids:
+            return {}
+        result = await db.execute(select(StoryStats).where(StoryStats.story_id.in_(story_ids)))
+        return {stats.story_id: stats for stats in result.scalars().all()}
+
+    async def reconcile(self, db: AsyncSession, *, story_ids: Optional[List[int]] = None) -> int:
+        """Пересчитывает счётчики по исходным таблицам (бэкфилл и сверка).
+
+        Без story_ids пересчитывает все истории. Коммит остаётся за вызывающим кодом.
+        """
+        def count_of(model):
+            return (
+                select(func.count(model.id))
+                .where(model.story_id == Story.id)
+                .scalar_subquery()
+            )
+
+        columns = {
+            'views_count': count_of(View),
+            'hugs_count': count_of(Hug),
+            'comments_count': count_of(Comment),
+            'favorites_count': count_of(FavoriteStory),
+        }
+        for type_reaction in ReactionType:
+            columns[StoryStats.reaction_column(type_reaction)] = (
+                select(func.count(Reaction.id))
+                .where(Reaction.story_id == Story.id, Reaction.type_reaction == type_reaction)
+                .scalar_subquery()
+            )
+
+        source = select(Story.id, *columns.values())
+        if story_ids is not None:
+            source = source.where(Story.id.in_(story_ids))
+
+        table = StoryStats.__table__
+        stmt = insert(table).from_select(['story_id', *columns.keys()], source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.story_id],
+            set_={column: stmt.excluded[column] for column in columns}
+        )
+        result = await db.execute(stmt)
+        return result.rowcount
+
+
+story_stats = CRUDStoryStats(StoryStats)
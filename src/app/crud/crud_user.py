@@ -1,7 +1,8 @@
+from datetime import datetime
 from typing import Any, Dict, List
 import logging
 
-from sqlalchemy import select, func, and_, or_, cast, text, Select, desc, delete
+from sqlalchemy import select, func, and_, or_, cast, text, Select, desc, delete, update, values, column, Integer, DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 from user_agents import parse
 
@@ -9,6 +10,7 @@ from app import models, schemas
 from app.crud.async_base import AsyncCRUDBase
 from app.models import User, Device, FirebaseToken
 from app.utils import pagination, security
+from app.utils.counting import CountStrategy
 from app.utils.security import get_password_hash, verify_password
 from app.utils.datetime import to_unix_timestamp, from_unix_timestamp
 from app.exceptions import InaccessibleEntity
@@ -75,7 +77,7 @@ class CRUDUser(AsyncCRUDBase[User, schemas.CreatingUser, schemas.UpdatingUser]):
 
         if device is None:
             device = Device(
-                user=owner,
+                user_id=owner.id,
                 ip_address=host,
                 x_real_ip=x_real_ip,
                 accept_language=accept_language,
@@ -225,6 +227,7 @@ class CRUDUser(AsyncCRUDBase[User, schemas.CreatingUser, schemas.UpdatingUser]):
         page: int | None = None,
         is_active: bool = True,
         size: int = 30,
+        counter: CountStrategy | None = None,
         **kwargs,
     ):
         stmt = (select(self.model)
@@ -245,7 +248,7 @@ class CRUDUser(AsyncCRUDBase[User, schemas.CreatingUser, schemas.UpdatingUser]):
             )
 
         stmt = self._orders(stmt, order_by)
-        return await pagination.get_page_async(db, stmt, page, size)
+        return await pagination.get_page_async(db, stmt, page, size, counter=counter)
 
     async def update(
         self,
@@ -261,13 +264,48 @@ class CRUDUser(AsyncCRUDBase[User, schemas.CreatingUser, schemas.UpdatingUser]):
         await db.refresh(db_obj)
         return db_obj
 
+    async def update_last_visited(self, db: AsyncSession, *, visits: Dict[int, datetime]) -> None:
+        "одним UPDATE ... FROM (VALUES ...); более раннее время не затирает более позднее. без коммита"
+        if not visits:
+            return
+        rows = values(
+            column("id", Integer), column("last_visited", DateTime(timezone=True)), name="visits"
+        ).data(list(visits.items()))
+        await db.execute(
+            update(User)
+            .where(User.id == rows.c.id)
+            .values(last_visited=func.greatest(User.last_visited, rows.c.last_visited))
+            .execution_options(synchronize_session=False)
+        )
+
     async def get_ids_active(self, db: AsyncSession) -> list[int]:
         stmt = select(User.id).filter(User.is_active)
         user_ids = (await db.execute(stmt)).scalars().all()
         return user_ids
 
     async def get_token(self, user: User):
-        return security.create_token(subject=user.id)
+        "флаги и версия в claims позволяют проверять доступ без загрузки пользователя"
+        return security.create_token(
+            subject=user.id,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            is_premium=user.is_premium,
+            tv=user.token_version,
+        )
+
+    async def get_token_version(self, db: AsyncSession, user_id: int) -> int | None:
+        return (await db.execute(select(User.token_version).where(User.id == user_id))).scalar_one_or_none()
+
+    async def bump_token_version(self, db: AsyncSession, user_ids: List[int]) -> Dict[int, int]:
+        "новые версии по id, удалённых пользователей в результате нет"
+        result = await db.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(token_version=User.token_version + 1)
+            .returning(User.id, User.token_version)
+        )
+        await db.commit()
+        return dict(result.all())
 
     async def is_active(self, user: User) -> bool:
         return user.is_active
@@ -16,9 +16,21 @@ from redis.backoff import ExponentialBackoff
 
 from app import crud, models, schemas, enums
 from app.config import settings
+from app.services.exclusion import ExclusionService
+from app.services.principal import Principal, PrincipalService
+from app.services.story_entity import StoryEntityService
+from app.services.viewer_state import ViewerStateService
+from app.services.visit_tracker import VisitTracker
+from app.services.timeline import TimelineService
+from app.services.token_version import TokenVersionService
+from app.services.trending import TrendingService
 from app.utils import security
 from app.utils.cache import Cache, RedisCache, redis_prefix
-from app.utils.datetime import utcnow
+from app.utils.cache_metrics import CacheMetrics
+from app.utils.circuit_breaker import RedisCircuitBreaker
+from app.utils.codec import Codec, CodecFormat, Compression
+from app.utils.local_cache import InvalidationBus, LocalCache
+from app.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -35,13 +47,6 @@ optional_reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 
-async def update_visit_date(db: AsyncSession, user: models.User):
-    user.last_visited = utcnow().replace(tzinfo=None)
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
-
-
 engine_async = create_async_engine(
     settings.SQLALCHEMY_ASYNC_DATABASE_URI,
     pool_pre_ping=True,
@@ -107,6 +112,41 @@ settings.REDIS_URL,
     health_check_interval=30,   # Проверка здоровья соединения
 )
 
+local_cache = LocalCache(
+    size=settings.L1_CACHE_SIZE,
+    ttl=settings.L1_CACHE_TTL,
+    limits=settings.L1_CACHE_LIMITS,
+)
+
+invalidation_bus = InvalidationBus(redis_client, local_cache, settings.CACHE_INVALIDATION_CHANNEL)
+
+cache_codec = Codec(
+    format=CodecFormat[settings.CACHE_CODEC],
+    compression=Compression[settings.CACHE_COMPRESSION] if settings.CACHE_COMPRESSION else None,
+    threshold=settings.CACHE_COMPRESS_THRESHOLD,
+)
+
+single_flight = SingleFlight(redis_client, lock_ttl=settings.CACHE_LOCK_TTL, wait_timeout=settings.CACHE_LOCK_WAIT)
+
+cache_metrics = CacheMetrics(redis_client, interval=settings.CACHE_METRICS_FLUSH_INTERVAL)
+
+redis_breaker = RedisCircuitBreaker(
+    redis_client,
+    interval=settings.REDIS_HEALTH_INTERVAL,
+    ping_timeout=settings.REDIS_PING_TIMEOUT,
+    failure_threshold=settings.REDIS_FAILURE_THRESHOLD,
+    reset_timeout=settings.REDIS_RESET_TIMEOUT,
+    probe_successes=settings.REDIS_PROBE_SUCCESSES,
+    metrics=cache_metrics,
+)
+
+visit_tracker = VisitTracker(redis_client, async_session, breaker=redis_breaker)
+
+
+async def update_visit_date(db: AsyncSession, user: models.User):
+    "last_visited пишется отложенно через visit_tracker"
+    await visit_tracker.record(user.id)
+
 redis_sync = RedisSync.from_url(
 settings.REDIS_URL,
     socket_timeout=10,          # Таймаут одной операции
@@ -115,22 +155,8 @@ settings.REDIS_URL,
 
 
 async def get_redis() -> AsyncGenerator[Redis, None]:
-    async def test_redis(connection: Redis) -> bool:
-        try:
-            await connection.ping()
-            return True
-        except Exception as e:
-            logging.error(f"Redis connection test failed: {str(e)}")
-            return False
-
-    if await test_redis(redis_client):
-        # try:
-        yield redis_client
-        # finally:
-        #     await redis_client.close()
-    else:
-        await redis_client.close()
-        raise HTTPException(status_code=503, detail="Redis unavailable")
+    "доступность проверяет redis_breaker в фоне; кеш при недоступном Redis работает как сквозной"
+    yield redis_client
 
 
 RedisDependency = Annotated[Redis, Depends(get_redis)]
@@ -161,70 +187,258 @@ async def get_redis_cache(
     redis: RedisDependency,
 ) -> RedisCache | None:
     if redis is not None:
-        return RedisCache(redis)
+        return RedisCache(
+            redis, local=local_cache, bus=invalidation_bus, flight=single_flight, codec=cache_codec,
+            metrics=cache_metrics, breaker=redis_breaker,
+        )
 
 
 RedisCacheDependency = Annotated[RedisCache, Depends(get_redis_cache)]
 
 
 async def get_cache(redis: RedisDependency):
-    return Cache(redis=redis, ttl=settings.CACHE_TTL)
+    return Cache(
+        redis=redis,
+        ttl=settings.CACHE_TTL,
+        local=local_cache,
+        bus=invalidation_bus,
+        flight=single_flight,
+        session_factory=async_session,
+        codec=cache_codec,
+        metrics=cache_metrics,
+        breaker=redis_breaker,
+    )
 
 
 CacheDependency = Annotated[Cache, Depends(get_cache)]
 
 
+async def get_cache_metrics() -> CacheMetrics:
+    return cache_metrics
+
+
+CacheMetricsDependency = Annotated[CacheMetrics, Depends(get_cache_metrics)]
+
+
+async def get_viewer_state(redis: RedisDependency) -> ViewerStateService:
+    return ViewerStateService(redis, breaker=redis_breaker)
+
+
+ViewerStateDependency = Annotated[ViewerStateService, Depends(get_viewer_state)]
+
+
+async def get_story_entity(cache: CacheDependency, viewer_state: ViewerStateDependency) -> StoryEntityService:
+    return StoryEntityService(cache, viewer_state)
+
+
+StoryEntityDependency = Annotated[StoryEntityService, Depends(get_story_entity)]
+
+
+async def get_timeline(redis: RedisDependency) -> TimelineService:
+    return TimelineService(redis, breaker=redis_breaker)
+
+
+TimelineDependency = Annotated[TimelineService, Depends(get_timeline)]
+
+
+async def get_exclusion(redis: RedisDependency) -> ExclusionService:
+    return ExclusionService(redis, breaker=redis_breaker)
+
+
+ExclusionDependency = Annotated[ExclusionService, Depends(get_exclusion)]
+
+
+async def get_trending(redis: RedisDependency) -> TrendingService:
+    return TrendingService(redis, breaker=redis_breaker)
+
+
+TrendingDependency = Annotated[TrendingService, Depends(get_trending)]
+
+
 async def get_cache_wo_depends():
-    return Cache(redis=redis_client, ttl=settings.CACHE_TTL)
+    return Cache(
+        redis=redis_client,
+        ttl=settings.CACHE_TTL,
+        local=local_cache,
+        bus=invalidation_bus,
+        flight=single_flight,
+        session_factory=async_session,
+        codec=cache_codec,
+        metrics=cache_metrics,
+        breaker=redis_breaker,
+    )
 
 
-async def get_current_user_or_none(
-    db: DbDependency,
-    redis_cache: RedisCacheDependency,
-    token: Annotated[str | None, Depends(optional_reusable_oauth2)] = None,
-) -> models.User | None:
-    """
+async def flush_cache_after_outage() -> None:
+    """пока Redis был недоступен, сбросы кеша пропускались: после восстановления
+    сбрасываются все версионированные пространства, принципалы, наборы отметок
+    и исключений, кеш версий токенов; ленты и outbox-ы собираются заново"""
+    cache = await get_cache_wo_depends()
+    namespaces = await redis_client.hkeys(Cache.versions_key)
+    await cache.invalidate(*[namespace.decode() for namespace in namespaces])
+    await cache.delete_by_pattern(redis_prefix.user.format("*"))
+    await cache.delete_by_pattern(f"{ViewerStateService.prefix}:*")
+    await cache.delete_by_pattern(f"{TokenVersionService.prefix}:*")
+    await cache.delete_by_pattern(f"{ExclusionService.prefix}:*")
+    await cache.delete_by_pattern(f"{TimelineService.prefix}:*:ready")
+    await cache.delete_by_pattern(f"{TimelineService.prefix}:outbox:*")
+    local_cache.clear()
 
-    Функция нужна для ендпоинтов на которых отображается добавлено ли объявление в избранное.
-    Если пользователь залогинен - мы ему отображаем добавлен ли объект в избранное или нет, иначе возвращаем False
 
-    """
+redis_breaker.on_recover(flush_cache_after_outage)
+
+
+async def get_token_versions(redis: RedisDependency) -> TokenVersionService:
+    return TokenVersionService(redis, breaker=redis_breaker)
 
-    if not token:
-        return None
 
+TokenVersionsDependency = Annotated[TokenVersionService, Depends(get_token_versions)]
+
+
+def decode_token(token: str) -> schemas.TokenPayload:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = schemas.TokenPayload(**payload)
-
+        return schemas.TokenPayload(**payload)
     except (jwt.JWTError, ValidationError) as e:
         logger.error(f"jwt.JWTError: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Не удалось проверить доступ",
         )
-    user_id = token_data.sub
-    user = await redis_cache.try_cache_object_pickle(
-        name=redis_prefix.user.format(user_id),
-        func=crud.user.get,
-        db=db,
-        id=user_id,
-    )
-    if not user:
+
+
+async def get_principals(redis_cache: RedisCacheDependency) -> PrincipalService:
+    return PrincipalService(redis_cache)
+
+
+PrincipalsDependency = Annotated[PrincipalService, Depends(get_principals)]
+
+
+async def authorize(
+    db: AsyncSession,
+    principals: PrincipalService,
+    token_versions: TokenVersionService,
+    token: str,
+) -> Principal | None:
+    """Principal из claims токена без обращения к БД и кешу пользователя.
+
+    Токен без флагов или с версией, отличной от users.token_version, проверяется по колонкам users,
+    None - пользователь не найден"""
+    claims = decode_token(token)
+    if claims.has_claims and not await token_versions.is_stale(db, claims.sub, claims.tv):
+        principal = Principal.from_claims(claims)
+    else:
+        principal = await principals.get(db, claims.sub)
+        if principal is None:
+            return None
+    await visit_tracker.record(principal.id)
+    return principal
+
+
+async def get_current_principal(
+    db: DbDependency,
+    principals: PrincipalsDependency,
+    token_versions: TokenVersionsDependency,
+    token: Annotated[str, Depends(reusable_oauth2)],
+) -> Principal:
+    principal = await authorize(db, principals, token_versions, token)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+    return principal
+
+
+async def get_current_principal_or_none(
+    db: DbDependency,
+    principals: PrincipalsDependency,
+    token_versions: TokenVersionsDependency,
+    token: Annotated[str | None, Depends(optional_reusable_oauth2)] = None,
+) -> Principal | None:
+    """
+
+    Для ендпоинтов, доступных и без входа: залогиненному пользователю отображаются его отметки.
+
+    """
+    if not token:
         return None
-    user.jwt_payload = payload
-    await update_visit_date(db=db, user=user)
+    return await authorize(db, principals, token_versions, token)
+
+
+async def get_current_active_principal(
+    principal: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not principal.is_active:
+        raise HTTPException(status_code=403, detail="Аккаунт заблокирован или удален")
+    return principal
+
+
+CurrentActivePrincipalDependency = Annotated[Principal, Depends(get_current_active_principal)]
+
+
+async def get_current_active_principal_or_none(
+    principal: Principal | None = Depends(get_current_principal_or_none),
+) -> Principal | None:
+    if principal and not principal.is_active:
+        raise HTTPException(status_code=403, detail="Аккаунт заблокирован или удален")
+    return principal
+
+
+CurrentActivePrincipalOrNoneDependency = Annotated[
+    Principal | None, Depends(get_current_active_principal_or_none)
+]
+
+
+async def get_current_active_su_principal(
+    principal: Principal = Depends(get_current_active_principal),
+) -> Principal:
+    if not principal.is_superuser:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return principal
+
+
+CurrentActiveSuperUserDependency = Annotated[
+    Principal, Depends(get_current_active_su_principal)
+]
+
+
+# Зависимости ниже возвращают объект User. Строка users читается один раз и сама
+# служит источником флагов: ни кеш Principal, ни версия токена для них не нужны.
+
+async def authorize_user(db: AsyncSession, token: str) -> models.User | None:
+    "None - пользователь не найден"
+    claims = decode_token(token)
+    user = await crud.user.get(db, id=claims.sub)
+    if user is not None:
+        await visit_tracker.record(user.id)
+    return user
+
+
+def ensure_active(user: models.User) -> models.User:
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="Аккаунт заблокирован или удален")
+    return user
+
+
+def ensure_superuser(user: models.User) -> models.User:
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
     return user
 
 
+async def get_current_user_or_none(
+    db: DbDependency,
+    token: Annotated[str | None, Depends(optional_reusable_oauth2)] = None,
+) -> models.User | None:
+    if not token:
+        return None
+    return await authorize_user(db, token)
+
+
 async def get_current_active_user_or_none(
     current_user: models.User | None = Depends(get_current_user_or_none),
 ) -> models.User | None:
-    if current_user and not current_user.is_active:
-        raise HTTPException(status_code=403, detail="Аккаунт заблокирован или удален")
-    return current_user
+    return ensure_active(current_user) if current_user is not None else None
 
 
 CurrentActiveUserOrNoneDependency = Annotated[models.User | None, Depends(get_current_active_user_or_none)]
@@ -232,65 +446,24 @@ CurrentActiveUserOrNoneDependency = Annotated[models.User | None, Depends(get_cu
 
 async def get_current_user(
     db: DbDependency,
-    redis_cache: RedisCacheDependency,
     token: Annotated[str, Depends(reusable_oauth2)],
 ) -> models.User:
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = schemas.TokenPayload(**payload)
-    except (jwt.JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Не удалось проверить доступ",
-        )
-    user_id = token_data.sub
-    user = await redis_cache.try_cache_object_pickle(
-        name=redis_prefix.user.format(user_id),
-        func=crud.user.get,
-        db=db,
-        id=user_id,
-    )
+    user = await authorize_user(db, token)
     if not user:
         raise HTTPException(status_code=401, detail="Пользователь не найден")
-    user.jwt_payload = payload
-    await update_visit_date(db=db, user=user)
     return user
 
 
 async def get_current_user_for_open_api(
     db: DbDependency,
-    redis_cache: RedisCacheDependency,
     token: Annotated[str | None, Depends(reusable_oauth2_open)],
 ) -> models.User | None:
     if not token:
         return None
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = schemas.TokenPayload(**payload)
-    except (jwt.JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Не удалось проверить доступ",
-        )
-    user_id = token_data.sub
-    if redis_cache:
-        redis_name = redis_prefix.user.format(user_id)
-        user = await crud.user.get_try_cache(
-            db, redis_cache=redis_cache, redis_name=redis_name, id=user_id
-        )
-    else:
-        user = await crud.user.get(db, id=user_id)
+    user = await authorize_user(db, token)
     if not user:
         raise HTTPException(status_code=401, detail="Пользователь не найден")
-    user.jwt_payload = payload
-    if not user.is_active:
-        raise HTTPException(status_code=403, detail="Аккаунт заблокирован или удален")
-    await update_visit_date(db=db, user=user)
-    return user
+    return ensure_active(user)
 
 CurrentActiveUserDependencyForOpenApi = Annotated[models.User | None, Depends(get_current_user_for_open_api)]
 
@@ -298,9 +471,7 @@ CurrentActiveUserDependencyForOpenApi = Annotated[models.User | None, Depends(ge
 async def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
-    if not current_user.is_active:
-        raise HTTPException(status_code=403, detail="Аккаунт заблокирован или удален")
-    return current_user
+    return ensure_active(current_user)
 
 
 CurrentActiveUserDependency = Annotated[models.User, Depends(get_current_active_user)]
@@ -308,24 +479,11 @@ CurrentActiveUserDependency = Annotated[models.User, Depends(get_current_active_
 
 async def get_current_su(
     current_user: models.User = Depends(get_current_user),
-):
-    if not current_user.is_superuser:
-        raise HTTPException(status_code=403, detail="Недостаточно прав")
-    return current_user
+) -> models.User:
+    return ensure_superuser(current_user)
 
 
 async def get_current_active_su(
     current_user: models.User = Depends(get_current_active_user),
 ) -> models.User:
-    if not current_user.is_superuser:
-        raise HTTPException(status_code=403, detail="Недостаточно прав")
-    return current_user
-
-
-CurrentActiveSuperUserDependency = Annotated[
-    models.User, Depends(get_current_active_su)
-]
-
-
-
-
+    return ensure_superuser(current_user)
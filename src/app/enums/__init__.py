@@ -1,2 +1,3 @@
 from .gender import Gender
-from .type_answer import TypeAnswer
\ No newline at end of file
+from .type_answer import TypeAnswer
+from .story_sort import StorySort
\ No newline at end of file
@@ -0,0 +1,5 @@
+import enum
+
+class StorySort(enum.Enum):
+    relevance = "relevance"
+    recent = "recent"
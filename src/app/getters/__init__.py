@@ -3,8 +3,8 @@ from .lesson import get_lesson
 from .stage import get_stage
 from .task import get_task
 from .comment import get_comment
-from .hashtag import get_hashtag
-from .story import get_story
+from .hashtag import get_hashtag, get_hashtags_batch
+from .story import get_story, get_stories_batch, get_story_bodies, get_viewer_overlay, get_grouped_short_stories
 from .story_attachment import get_story_attachment
 from .story_report import get_story_report
 from .settings import get_settings
\ No newline at end of file
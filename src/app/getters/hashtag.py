@@ -1,25 +1,40 @@
 import logging
+from typing import Dict, List, Sequence
 
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from ..models import Hashtag, Story, StoryAttachment, StoryHashtag
+from ..models import Hashtag, StoryAttachment
 from ..schemas import GettingHashtag
 from sqlalchemy.ext.asyncio import AsyncSession
 
 async def get_hashtag(db: AsyncSession, db_obj: Hashtag) -> GettingHashtag:
-    await db.refresh(db_obj, ["hashtag_stories"])
-    return GettingHashtag(
-        id=db_obj.id,
-        text=db_obj.text,
-        stories_count=len(db_obj.hashtag_stories),
-        cover=(
-            await db.execute(
-                select(StoryAttachment.main_link)
-                .join(Story)
-                .join(StoryHashtag)
-                .where(StoryHashtag.hashtag_id == db_obj.id)
-                .limit(1)
-            )
-        ).scalar_one_or_none()
-    )
+    return (await get_hashtags_batch(db, [db_obj]))[0]
+
+
+async def get_hashtags_batch(db: AsyncSession, hashtags: Sequence[Hashtag]) -> List[GettingHashtag]:
+    """Собирает GettingHashtag для набора хештегов.
+
+    Количество историй хранится в hashtag.stories_count, ссылки обложек
+    загружаются одним запросом по hashtag.cover_attachment_id.
+    """
+    if len(hashtags) == 0:
+        return []
+
+    cover_ids = list({hashtag.cover_attachment_id for hashtag in hashtags} - {None})
+    covers: Dict[int, str] = {}
+    if cover_ids:
+        result = await db.execute(
+            select(StoryAttachment.id, StoryAttachment.main_link).where(StoryAttachment.id.in_(cover_ids))
+        )
+        covers = {attachment_id: main_link for attachment_id, main_link in result.all()}
+
+    return [
+        GettingHashtag(
+            id=hashtag.id,
+            text=hashtag.text,
+            stories_count=hashtag.stories_count or 0,
+            cover=covers.get(hashtag.cover_attachment_id),
+        )
+        for hashtag in hashtags
+    ]
@@ -1,18 +1,19 @@
 import logging
 import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Set
 
 from app.models import User
-from sqlalchemy import not_, func
+from sqlalchemy import not_, func, literal, union_all
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .hashtag import get_hashtag
+from .hashtag import get_hashtags_batch
 from .users import get_user_short_info
 from .story_attachment import get_story_attachment
 from .timestamp import to_timestamp
 from ..enums.reaction import ReactionType
-from ..models import Story, StoryAttachment, Reaction
+from ..crud.crud_story_stats import story_stats as story_stats_crud
+from ..models import Story, StoryAttachment, Reaction, StoryHashtag, Hashtag, FavoriteStory, Comment, StoryStats
 from ..models.view import View
 from ..models.hug import Hug
 from ..schemas import GettingStory, GettingUserStories
@@ -20,66 +21,143 @@ from sqlalchemy import select
 
 
 async def get_story(db: AsyncSession, db_obj: Story, db_user: Optional[User] = None) -> GettingStory:
-    videos = [att for att in db_obj.attachments if not att.is_image]
-    video = videos[0] if len(videos) > 0 else  None
-    images = [att for att in sorted(db_obj.attachments, key=lambda x: x.id) if att.is_image]
-    is_comment = any(comment.user == db_user for comment in db_obj.comments) if db_user is not None else None
+    return (await get_stories_batch(db, [db_obj], db_user))[0]
+
+
+async def get_stories_batch(
+        db: AsyncSession,
+        stories: List[Story],
+        viewer: Optional[User] = None
+) -> List[GettingStory]:
+    """Собирает GettingStory для страницы историй фиксированным числом запросов.
+
+    Счётчики берутся из story_stats, а отметки текущего пользователя, хештеги
+    и их обложки загружаются одним запросом на всю страницу, а не отдельно
+    для каждой истории.
+    """
+    bodies = await get_story_bodies(db, stories)
+    overlay = await get_viewer_overlay(db, [story.id for story in stories], viewer)
+    return [body.model_copy(update=overlay[body.id]) for body in bodies]
+
+
+async def get_story_bodies(db: AsyncSession, stories: List[Story]) -> List[GettingStory]:
+    "общая для всех пользователей часть GettingStory, без отметок текущего пользователя"
+    if len(stories) == 0:
+        return []
+
+    story_ids = [story.id for story in stories]
+    stats = await story_stats_crud.get_by_story_ids(db, story_ids=story_ids)
+
     result = await db.execute(
-        select(
-            Reaction.type_reaction,
-            func.count(Reaction.id).label("total_count"),
-            func.count(Reaction.id)
-            .filter(Reaction.user_id == db_user.id)
-            .label("user_count"),
-        )
-        .where(Reaction.story_id == db_obj.id)
-        .group_by(Reaction.type_reaction)
-    )
-    rows_for_reaction = result.all()
-    reactions_count = {}
-    reacted = {}
-    for reaction_type, total_count, user_count in rows_for_reaction:
-        reactions_count[reaction_type.value] = total_count
-        reacted[reaction_type.value] = user_count > 0
-    for rt in ReactionType:
-        reactions_count.setdefault(rt.value, 0)
-        reacted.setdefault(rt.value, False)
-
-    result = GettingStory(
-        id=db_obj.id,
-        created=to_timestamp(db_obj.created),
-        user=await get_user_short_info(db, db_obj.user),
-        text=db_obj.text,
-        title=db_obj.title,
-        video=await get_story_attachment(video) if video is not None else None,
-        gallery=[await get_story_attachment(item) for item in images],
-        is_private=db_obj.is_private,
-        is_short_story=db_obj.is_short_story,
-        hashtags=[
-            await get_hashtag(db, story_hashtag.hashtag) for story_hashtag in db_obj.story_hashtags
-        ],
-        views_count=len(db_obj.views),
-        viewed=len([view for view in db_obj.views if view.user == db_user]) > 0 if db_user is not None else None,
-        hugs_count=len(db_obj.hugs),
-        hugged=len([hug for hug in db_obj.hugs if hug.user == db_user]) > 0 if db_user is not None else None,
-        reactions_count = reactions_count,
-        reacted = reacted,
-        comments_count=len(db_obj.comments),
-        is_favorite=len([fav for fav in db_obj.favorite_stories if fav.user == db_user]) > 0 if db_user is not None else None,
-        is_comment=is_comment
+        select(StoryHashtag.story_id, Hashtag)
+        .join(Hashtag, Hashtag.id == StoryHashtag.hashtag_id)
+        .where(StoryHashtag.story_id.in_(story_ids))
+        .order_by(StoryHashtag.id)
     )
+    story_hashtag_rows = result.all()
+    hashtags = {
+        hashtag.id: hashtag
+        for hashtag in await get_hashtags_batch(db, [hashtag for _, hashtag in story_hashtag_rows])
+    }
+    hashtags_by_story: Dict[int, list] = {story_id: [] for story_id in story_ids}
+    for story_id, hashtag in story_hashtag_rows:
+        hashtags_by_story[story_id].append(hashtags[hashtag.id])
 
+    empty_stats = StoryStats()
+
+    data = []
+    for db_obj in stories:
+        videos = [att for att in db_obj.attachments if not att.is_image]
+        video = videos[0] if len(videos) > 0 else None
+        images = [att for att in sorted(db_obj.attachments, key=lambda x: x.id) if att.is_image]
+        story_stats = stats.get(db_obj.id, empty_stats)
+
+        data.append(
+            GettingStory(
+                id=db_obj.id,
+                created=to_timestamp(db_obj.created),
+                user=await get_user_short_info(db, db_obj.user),
+                text=db_obj.text,
+                title=db_obj.title,
+                video=await get_story_attachment(video) if video is not None else None,
+                gallery=[await get_story_attachment(item) for item in images],
+                is_private=db_obj.is_private,
+                is_short_story=db_obj.is_short_story,
+                hashtags=hashtags_by_story[db_obj.id],
+                views_count=story_stats.views_count or 0,
+                hugs_count=story_stats.hugs_count or 0,
+                reactions_count=story_stats.reactions_count(),
+                comments_count=story_stats.comments_count or 0,
+            )
+        )
 
-    return result
+    return data
+
+
+async def get_viewer_overlay(
+        db: AsyncSession,
+        story_ids: List[int],
+        viewer: Optional[User] = None
+) -> Dict[int, dict]:
+    "отметки пользователя (viewed, hugged, is_favorite, is_comment, reacted) по историям страницы"
+    viewer_id = viewer.id if viewer is not None else None
+
+    reacted: Dict[int, Dict[str, bool]] = {
+        story_id: {rt.value: False for rt in ReactionType} for story_id in story_ids
+    }
+    viewer_flags: Dict[int, Set[str]] = {story_id: set() for story_id in story_ids}
+    if viewer_id is not None and story_ids:
+        result = await db.execute(
+            select(Reaction.story_id, Reaction.type_reaction)
+            .where(Reaction.user_id == viewer_id, Reaction.story_id.in_(story_ids))
+        )
+        for story_id, reaction_type in result.all():
+            reacted[story_id][reaction_type.value] = True
+
+        result = await db.execute(
+            union_all(
+                select(View.story_id, literal('viewed'))
+                .where(View.user_id == viewer_id, View.story_id.in_(story_ids)),
+                select(Hug.story_id, literal('hugged'))
+                .where(Hug.user_id == viewer_id, Hug.story_id.in_(story_ids)),
+                select(FavoriteStory.story_id, literal('is_favorite'))
+                .where(FavoriteStory.user_id == viewer_id, FavoriteStory.story_id.in_(story_ids)),
+                select(Comment.story_id, literal('is_comment'))
+                .where(Comment.user_id == viewer_id, Comment.story_id.in_(story_ids)),
+            )
+        )
+        for story_id, flag in result.all():
+            viewer_flags[story_id].add(flag)
+
+    def flag(story_id: int, name: str) -> Optional[bool]:
+        return name in viewer_flags[story_id] if viewer_id is not None else None
+
+    return {
+        story_id: {
+            'viewed': flag(story_id, 'viewed'),
+            'hugged': flag(story_id, 'hugged'),
+            'is_favorite': flag(story_id, 'is_favorite'),
+            'is_comment': flag(story_id, 'is_comment'),
+            'reacted': reacted[story_id],
+        }
+        for story_id in story_ids
+    }
 
 async def get_grouped_short_story(db: AsyncSession, stories: List[Story], db_user: User):
-    stories_list = [
-        GettingStory(
-            **(await get_story(db=db, db_obj=story).dict())
+    return (await get_grouped_short_stories(db, [stories], db_user))[0]
+
+
+async def get_grouped_short_stories(
+        db: AsyncSession,
+        rings: List[List[Story]],
+        viewer: Optional[User] = None
+) -> List[GettingUserStories]:
+    "кольца short-историй одной гидрацией на всю страницу"
+    items = iter(await get_stories_batch(db, [story for stories in rings for story in stories], viewer))
+    return [
+        GettingUserStories(
+            user=await get_user_short_info(db, stories[0].user),
+            stories=[next(items) for _ in stories]
         )
-        for story in stories
+        for stories in rings
     ]
-    return GettingUserStories(
-        user=await get_user_short_info(stories[0].user),
-        stories=stories_list
-    )
@@ -1,5 +1,6 @@
 import logging
 import os
+from contextlib import asynccontextmanager
 
 
 from fastapi import FastAPI
@@ -7,6 +8,7 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api import api_router
 from app.config import settings
+from app.deps import cache_metrics, invalidation_bus, redis_breaker, visit_tracker
 from logs.config import setup_logging, logger
 
 ENV = os.getenv("ENVIRONMENT", "development")
@@ -16,9 +18,23 @@ setup_logging(ENV)
 logger.info("Starting application initialization")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await redis_breaker.start()
+    await invalidation_bus.start()
+    await cache_metrics.start()
+    await visit_tracker.start()
+    yield
+    await visit_tracker.stop()
+    await cache_metrics.stop()
+    await invalidation_bus.stop()
+    await redis_breaker.stop()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 BACKEND_CORS_ORIGINS = ["*"]
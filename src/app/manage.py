@@ -0,0 +1,163 @@
+"""Служебные команды обслуживания.
+
+Запуск: python -m app.manage <команда> [аргументы]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import pickle
+import time
+from typing import List
+
+from sqlalchemy import select
+
+from app import crud, schemas
+from app.config import settings
+from app.deps import async_session, redis_client
+from app.enums.reaction import ReactionType
+from app.models import Subscription
+from app.services.timeline import TimelineService
+from app.services.trending import TrendingService, TrendingWindow
+from app.utils.cache import Cache
+from app.utils.codec import Codec, CodecFormat, Compression, installed_compressions, msgpack
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_story_stats(args: argparse.Namespace) -> None:
+    """Пересчитывает story_stats по исходным таблицам"""
+    async with async_session() as db:
+        count = await crud.story_stats.reconcile(db, story_ids=args.story_id or None)
+        await db.commit()
+    logger.info("story_stats reconciled for %s stories", count)
+
+
+async def rebuild_timelines(args: argparse.Namespace) -> None:
+    """Пересобирает ленты подписок в Redis из БД"""
+    timeline = TimelineService(redis_client)
+    async with async_session() as db:
+        pull_authors = await timeline.refresh_pull_authors(db)
+        for author_id in pull_authors:
+            await timeline.rebuild_outbox(db, author_id)
+
+        user_ids = args.user_id
+        if not user_ids:
+            result = await db.execute(
+                select(Subscription.subject_id).where(Subscription.subject_id != None).distinct()
+            )
+            user_ids = result.scalars().all()
+        for user_id in user_ids:
+            await timeline.rebuild(db, user_id)
+    logger.info("timelines rebuilt for %s users, %s pull authors", len(user_ids), len(pull_authors))
+
+
+async def refresh_trending(args: argparse.Namespace) -> None:
+    """Пересчитывает популярные хештеги (для запуска по расписанию)"""
+    trending = TrendingService(redis_client)
+    async with async_session() as db:
+        for window in TrendingWindow:
+            data = await trending.refresh(db, window)
+            logger.info("trending %s refreshed: %s hashtags", window.value, len(data))
+
+
+async def sweep_cache(args: argparse.Namespace) -> None:
+    """Удаляет из Redis ключи кеша устаревших версий (для запуска по расписанию)"""
+    deleted = await Cache(redis_client, ttl=settings.CACHE_TTL).sweep(batch=args.batch)
+    logger.info("cache sweep: %s stale keys deleted", deleted)
+
+
+def _story_page(size: int) -> dict:
+    user = schemas.GettingUserShortInfo(
+        id=1, first_name="Анна", last_name="Иванова", patronymic=None, gender=None,
+        email="anna@example.com", phone="+79990000000", is_superuser=False, is_premium=True,
+    )
+    attachment = schemas.GettingStoryAttachment(
+        id=1, main_link="https://cdn.example.com/story/1/main.jpg",
+        cover_link="https://cdn.example.com/story/1/cover.jpg", is_image=True, created=1700000000,
+    )
+    stories = [
+        schemas.GettingStory(
+            id=i, created=1700000000 + i, user=user, title=f"История {i}",
+            text="Текст истории о самочувствии и психосоматике. " * 8,
+            video=None, gallery=[attachment] * 3, is_private=False, is_short_story=False,
+            hashtags=[schemas.GettingHashtag(id=h, text=f"тема{h}", stories_count=h * 10) for h in range(3)],
+            views_count=i * 7, hugs_count=i,
+            reactions_count={rt.value: (i + n) % 5 for n, rt in enumerate(ReactionType)},
+            reacted={rt.value: rt == ReactionType.FIRE for rt in ReactionType},
+        )
+        for i in range(size)
+    ]
+    page = schemas.Response[List[schemas.GettingStory]](
+        data=stories,
+        paginator=schemas.Paginator(page=1, total=size * 10, has_prev=False, has_next=True),
+    )
+    return page.model_dump(mode="json")
+
+
+async def benchmark_codecs(args: argparse.Namespace) -> None:
+    """Сравнивает кодеки кеша на странице Response[List[GettingStory]]: размер и время"""
+    page = _story_page(args.stories)
+    # как кеш кодировал значения до Codec: Cache - json.dumps, RedisCache - pickle.dumps
+    variants = [
+        ("baseline-json", lambda value: json.dumps(value).encode(), lambda data: json.loads(data.decode())),
+        ("baseline-pickle", pickle.dumps, pickle.loads),
+    ]
+    formats = [CodecFormat.json] + ([CodecFormat.msgpack] if msgpack is not None else [])
+    for format in formats:
+        codec = Codec(format, Compression.none)
+        variants.append((format.name, codec.encode, codec.decode))
+        for compression in installed_compressions():
+            codec = Codec(format, compression, threshold=0)
+            variants.append((f"{format.name}+{compression.name}", codec.encode, codec.decode))
+
+    for name, encode, decode in variants:
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            data = encode(page)
+        encoded = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            decode(data)
+        decoded = time.perf_counter() - started
+        logger.info(
+            "%-16s %8d bytes  encode %7.1f us  decode %7.1f us",
+            name, len(data), encoded / args.rounds * 1e6, decoded / args.rounds * 1e6,
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("reconcile-story-stats", help=reconcile_story_stats.__doc__)
+    command.add_argument("--story-id", type=int, action="append", help="Пересчитать только указанные истории")
+    command.set_defaults(handler=reconcile_story_stats)
+
+    command = commands.add_parser("rebuild-timelines", help=rebuild_timelines.__doc__)
+    command.add_argument("--user-id", type=int, action="append", help="Пересобрать только указанные ленты")
+    command.set_defaults(handler=rebuild_timelines)
+
+    command = commands.add_parser("refresh-trending", help=refresh_trending.__doc__)
+    command.set_defaults(handler=refresh_trending)
+
+    command = commands.add_parser("sweep-cache", help=sweep_cache.__doc__)
+    command.add_argument("--batch", type=int, default=500, help="Размер пачки SCAN/UNLINK")
+    command.set_defaults(handler=sweep_cache)
+
+    command = commands.add_parser("benchmark-codecs", help=benchmark_codecs.__doc__)
+    command.add_argument("--stories", type=int, default=30, help="Историй на странице")
+    command.add_argument("--rounds", type=int, default=200, help="Повторов на кодек")
+    command.set_defaults(handler=benchmark_codecs)
+
+    return parser
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    args = build_parser().parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
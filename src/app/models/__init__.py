@@ -15,6 +15,7 @@ from .story import Story
 from .story_attachment import StoryAttachment
 from .story_hashtag import StoryHashtag
 from .story_hiding import StoryHiding
+from .story_stats import StoryStats
 from .story_report import StoryReport
 from .view import View
 from .subscription import Subscription
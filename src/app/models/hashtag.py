@@ -1,19 +1,34 @@
 from typing import TYPE_CHECKING
 
 from app.models import User
-from sqlalchemy import Boolean, Column, Integer, String, Enum, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, Enum, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 
 from app.models.base_model import Base
 
 
 class Hashtag(Base):
+    __table_args__ = (
+        Index('ix_hashtag_text_trgm', 'text', postgresql_using='gin', postgresql_ops={'text': 'gin_trgm_ops'}),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String, nullable=False, unique=True, index=True)
+    # поддерживаются CRUDHashtag.refresh_stats при создании, изменении и удалении историй
+    stories_count = Column(Integer, nullable=False, default=0, server_default='0')
+    cover_attachment_id = Column(Integer, ForeignKey('storyattachment.id', ondelete='SET NULL'), nullable=True)
 
     hashtag_stories = relationship(
         "StoryHashtag",
         cascade="all, delete-orphan",
         back_populates="hashtag",
-        lazy='selectin'
+        lazy='raise'
     )
+
+
+# префиксный поиск автодополнения: lower(text) LIKE 'prefix%'
+Index(
+    'ix_hashtag_text_lower_pattern',
+    func.lower(Hashtag.text).label('text_lower'),
+    postgresql_ops={'text_lower': 'text_pattern_ops'},
+)
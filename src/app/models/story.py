@@ -2,13 +2,20 @@ import datetime
 from typing import TYPE_CHECKING
 
 from app.models import User
-from sqlalchemy import Boolean, Column, Integer, String, Enum, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Integer, String, Enum, ForeignKey, DateTime, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 
 from app.models.base_model import Base
 
 
 class Story(Base):
+    __table_args__ = (
+        Index('ix_story_created_id', 'created', 'id'),
+        Index('ix_story_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_story_short_created_user', 'is_short_story', 'created', 'user_id'),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     created = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
     text = Column(String, nullable=True)
@@ -16,15 +23,20 @@ class Story(Base):
     user_id = Column(Integer, ForeignKey(User.id), nullable=False, index=True)
     is_private = Column(Boolean, nullable=False, default=False)
     is_short_story = Column(Boolean, nullable=False, default=False, index=True, server_default='false')
+    # title + text + тексты хештегов, поддерживается CRUDStory.refresh_search_vector
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
 
-    user = relationship(User, back_populates='stories', lazy='joined')
-    attachments = relationship("StoryAttachment", cascade="all, delete-orphan", back_populates="story", lazy='joined', order_by="StoryAttachment.num")
-    story_hashtags = relationship("StoryHashtag", cascade="all, delete-orphan", back_populates="story",lazy='selectin')
-    views = relationship("View", cascade="all, delete-orphan", back_populates="story", lazy='joined')
-    hugs = relationship("Hug", cascade="all, delete-orphan", back_populates="story", lazy='joined')
-    favorite_stories = relationship("FavoriteStory", cascade="all, delete-orphan", back_populates="story", lazy='joined')
-    comments = relationship("Comment", cascade="all, delete-orphan", back_populates="story", lazy='selectin')
-    reactions = relationship("Reaction", cascade="all, delete-orphan", back_populates="story", lazy='selectin')
+    # Связи по умолчанию не загружаются: нужные подгружаются профилями CRUDStory.loader_profiles
+    user = relationship(User, back_populates='stories', lazy='raise')
+    attachments = relationship("StoryAttachment", cascade="all, delete-orphan", back_populates="story", lazy='raise', order_by="StoryAttachment.num")
+    story_hashtags = relationship("StoryHashtag", cascade="all, delete-orphan", back_populates="story", lazy='raise')
+    views = relationship("View", cascade="all, delete-orphan", back_populates="story", lazy='raise')
+    hugs = relationship("Hug", cascade="all, delete-orphan", back_populates="story", lazy='raise')
+    favorite_stories = relationship("FavoriteStory", cascade="all, delete-orphan", back_populates="story", lazy='raise')
+    comments = relationship("Comment", cascade="all, delete-orphan", back_populates="story", lazy='raise')
+    reactions = relationship("Reaction", cascade="all, delete-orphan", back_populates="story", lazy='raise')
     object_story_reports = relationship('StoryReport', cascade="all, delete-orphan", back_populates="object_",
-                                       lazy="selectin")
-    story_hidings = relationship('StoryHiding', cascade="all, delete-orphan", back_populates="story", lazy="selectin")
+                                       lazy="raise")
+    story_hidings = relationship('StoryHiding', cascade="all, delete-orphan", back_populates="story", lazy="raise")
+    stats = relationship('StoryStats', uselist=False, cascade="all, delete-orphan", back_populates="story",
+                         lazy="noload", passive_deletes=True)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy.orm import relationship
+
+from app.models.base_model import Base
+from app.enums.reaction import ReactionType
+from .story import Story
+
+
+class StoryStats(Base):
+    __tablename__ = 'story_stats'
+
+    id = Column(Integer, primary_key=True, index=True)
+    story_id = Column(Integer, ForeignKey(Story.id, ondelete='CASCADE'), nullable=False, unique=True, index=True)
+    views_count = Column(Integer, nullable=False, default=0, server_default='0')
+    hugs_count = Column(Integer, nullable=False, default=0, server_default='0')
+    comments_count = Column(Integer, nullable=False, default=0, server_default='0')
+    favorites_count = Column(Integer, nullable=False, default=0, server_default='0')
+    laugh_count = Column(Integer, nullable=False, default=0, server_default='0')
+    fire_count = Column(Integer, nullable=False, default=0, server_default='0')
+    angry_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    story = relationship(Story, back_populates='stats')
+
+    @staticmethod
+    def reaction_column(type_reaction: ReactionType) -> str:
+        return f'{type_reaction.value}_count'
+
+    def reactions_count(self) -> dict[str, int]:
+        return {rt.value: getattr(self, self.reaction_column(rt)) or 0 for rt in ReactionType}
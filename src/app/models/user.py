@@ -29,6 +29,8 @@ class User(Base):
         index=True
     )
     is_premium: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default="false")
+    # Увеличивается при смене is_active, is_superuser, is_premium: см. TokenVersionService
+    token_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     devices = relationship(
         "Device",
@@ -45,13 +47,14 @@ class User(Base):
     reactions = relationship("Reaction", cascade="all, delete-orphan", back_populates="user")
     favorite_stories = relationship("FavoriteStory", cascade="all, delete-orphan", back_populates="user")
     comments = relationship("Comment", cascade="all, delete-orphan", back_populates="user", lazy='dynamic')
+    # Жалобы, подписки и блокировки не загружаются вместе с пользователем: читаются отдельными запросами
     subject_story_reports = relationship('StoryReport', cascade="all, delete-orphan", back_populates="subject",
-                                         lazy="selectin")
+                                         lazy="raise")
     subject_subscriptions = relationship('Subscription', cascade="all, delete-orphan", back_populates="subject",
-                                         foreign_keys='Subscription.subject_id', lazy='selectin')
+                                         foreign_keys='Subscription.subject_id', lazy='raise')
     object_subscriptions = relationship('Subscription', cascade="all, delete-orphan", back_populates="object_",
-                                        lazy="joined", foreign_keys='Subscription.object_id')
+                                        lazy="raise", foreign_keys='Subscription.object_id')
     subject_user_blocks = relationship('UserBlock', cascade="all, delete-orphan", back_populates="subject",
-                                       lazy="selectin", foreign_keys='UserBlock.subject_id')
+                                       lazy="raise", foreign_keys='UserBlock.subject_id')
     object_user_blocks = relationship('UserBlock', cascade="all, delete-orphan", back_populates="object_",
-                                      lazy="selectin", foreign_keys='UserBlock.object_id')
\ No newline at end of file
+                                      lazy="raise", foreign_keys='UserBlock.object_id')
\ No newline at end of file
@@ -6,8 +6,10 @@ from .lesson import *
 from .stage import *
 from .task import *
 from .story import *
+from .hashtag import *
 from .story_attachment import *
 from .story_report import *
 from .comment import *
 from .payment import *
 from .settings import *
+from .cache import *
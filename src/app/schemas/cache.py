@@ -0,0 +1,37 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class GettingCacheNamespace(BaseModel):
+    namespace: str
+    hits: int = Field(0, title="Попадания")
+    misses: int = Field(0, title="Промахи")
+    hit_ratio: Optional[float] = Field(None)
+    fills: int = Field(0, title="Заполнения после промаха")
+    fill_ms_avg: Optional[float] = Field(None, title="Среднее время заполнения, мс")
+    fill_ms: Dict[str, int] = Field({}, title="Гистограмма времени заполнения, мс")
+    writes: int = Field(0, title="Записи")
+    size_avg: Optional[float] = Field(None, title="Средний размер значения, байт")
+    size: Dict[str, int] = Field({}, title="Гистограмма размера значения, байт")
+    invalidations: int = Field(0, title="Сбросы пространства")
+    invalidated_keys: int = Field(0, title="Удалённые ключи")
+    sampled_keys: int = Field(0, title="Ключей в выборке SCAN")
+    estimated_keys: int = Field(0, title="Оценка числа ключей")
+    estimated_memory: int = Field(0, title="Оценка памяти, байт")
+    l1: Optional[Dict[str, int]] = Field(None, title="L1 текущего воркера")
+
+
+class GettingCacheReport(BaseModel):
+    total_keys: int = Field(0, title="Ключей в Redis")
+    used_memory: Optional[int] = Field(None, title="Память Redis, байт")
+    namespaces: List[GettingCacheNamespace] = Field([])
+    circuit_state: Optional[str] = Field(None, title="Состояние автомата доступности Redis в воркере")
+    circuit_transitions: Dict[str, int] = Field({}, title="Переходы автомата по всем воркерам")
+
+
+class GettingCacheFlush(BaseModel):
+    namespace: Optional[str] = Field(None)
+    tag: Optional[str] = Field(None)
+    deleted_keys: int = Field(0, title="Удалено ключей")
+    version: Optional[int] = Field(None, title="Новая версия пространства")
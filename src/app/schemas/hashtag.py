@@ -14,6 +14,10 @@ class GettingHashtag(BaseHashtag):
     stories_count: int = Field(0, title="Количество историй")
     cover: Optional[str] = Field(None)
 
+class GettingTrendingHashtag(GettingHashtag):
+    score: float = Field(0, title="Вес в окне с учётом затухания")
+
+
 class CreatingHashtag(BaseHashtag):
     pass
 
@@ -8,6 +8,8 @@ class Paginator(BaseModel):
     total: int | None = Field(1, ge=0)
     has_prev: bool
     has_next: bool | None
+    next_cursor: str | None = Field(None, title="Курсор следующей страницы")
+    is_total_exact: bool = Field(True, title="total посчитан точно, а не оценён")
 
 
 class Error(BaseModel):
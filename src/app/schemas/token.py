@@ -8,3 +8,13 @@ class TokenSchema(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: int | None = None
+    is_active: bool | None = None
+    is_superuser: bool | None = None
+    is_premium: bool | None = None
+    # users.token_version; claim ver из версий в Redis не принимается
+    tv: int | None = None
+
+    @property
+    def has_claims(self) -> bool:
+        "токен выпущен с флагами пользователя, а не только с sub"
+        return self.tv is not None and self.is_active is not None
@@ -0,0 +1 @@
+from .exclusion import Exclusions, ExclusionService
@@ -0,0 +1,154 @@
+"""Наборы исключений для ленты зрителя в Redis.
+
+:exclusion:{user_id}:blocked: SET id пользователей, заблокированных зрителем или заблокировавших его
+:exclusion:{user_id}:hidden: SET id историй, скрытых зрителем
+
+В каждом загруженном наборе лежит служебный элемент 0: набор без него считается
+незагруженным (истёк или создан частично) и перечитывается из БД.
+
+:{key}:gen: поколение набора, сдвигается каждым изменением после коммита.
+Загрузка запоминает поколение до чтения БД и записывает набор под WATCH только
+если оно не сдвинулось - иначе загрузка, прочитавшая БД до коммита, затёрла бы
+изменение на весь TTL.
+
+Пока redis_breaker не closed, get возвращает None и исключения проверяет анти-join
+в БД, изменения наборов пропускаются: после восстановления наборы сбрасываются.
+"""
+from dataclasses import dataclass, field
+from typing import FrozenSet, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import StoryHiding, UserBlock
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+SENTINEL = 0
+
+
+@dataclass(frozen=True)
+class Exclusions:
+    blocked_user_ids: FrozenSet[int] = field(default_factory=frozenset)
+    hidden_story_ids: FrozenSet[int] = field(default_factory=frozenset)
+
+
+class ExclusionService:
+    prefix = "exclusion"
+
+    def __init__(self, redis: Redis, ttl: Optional[int] = None, breaker: Optional[RedisCircuitBreaker] = None):
+        self.redis = redis
+        self.ttl = ttl or settings.EXCLUSION_TTL
+        self.breaker = breaker
+
+    @property
+    def available(self) -> bool:
+        return self.breaker is None or self.breaker.closed
+
+    def _blocked_key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}:blocked"
+
+    def _hidden_key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}:hidden"
+
+    @staticmethod
+    def _gen_key(key: str) -> str:
+        return f"{key}:gen"
+
+    async def _generation(self, key: str) -> int:
+        return int(await self.redis.get(self._gen_key(key)) or 0)
+
+    async def _bump(self, *keys: str) -> None:
+        "сдвигает поколение наборов; вызывать после коммита изменения"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.incr(self._gen_key(key))
+                pipe.expire(self._gen_key(key), self.ttl)
+            await pipe.execute()
+
+    async def _store(self, key: str, ids, generation: int) -> None:
+        "записывает набор, если с чтения БД его поколение не сдвинулось"
+        gen_key = self._gen_key(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(gen_key)
+                if int(await pipe.get(gen_key) or 0) != generation:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.sadd(key, SENTINEL, *ids)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+            except WatchError:
+                pass
+
+    async def _load_blocked(self, db: AsyncSession, user_id: int) -> FrozenSet[int]:
+        key = self._blocked_key(user_id)
+        generation = await self._generation(key)
+        # два запроса по индексам subject_id и object_id вместо OR
+        result = await db.execute(
+            select(UserBlock.object_id).where(UserBlock.subject_id == user_id)
+            .union(select(UserBlock.subject_id).where(UserBlock.object_id == user_id))
+        )
+        blocked = frozenset(id_ for id_ in result.scalars().all() if id_ is not None)
+        await self._store(key, blocked, generation)
+        return blocked
+
+    async def _load_hidden(self, db: AsyncSession, user_id: int) -> FrozenSet[int]:
+        key = self._hidden_key(user_id)
+        generation = await self._generation(key)
+        result = await db.execute(select(StoryHiding.story_id).where(StoryHiding.user_id == user_id))
+        hidden = frozenset(id_ for id_ in result.scalars().all() if id_ is not None)
+        await self._store(key, hidden, generation)
+        return hidden
+
+    @staticmethod
+    def _parse(members) -> Optional[FrozenSet[int]]:
+        ids = {int(member) for member in members}
+        if SENTINEL not in ids:
+            return None
+        ids.discard(SENTINEL)
+        return frozenset(ids)
+
+    async def get(self, db: AsyncSession, user_id: int) -> Optional[Exclusions]:
+        "None - Redis недоступен, crud подставит анти-join по StoryHiding и UserBlock"
+        if not self.available:
+            return None
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.smembers(self._blocked_key(user_id))
+            pipe.smembers(self._hidden_key(user_id))
+            blocked, hidden = await pipe.execute()
+
+        blocked = self._parse(blocked)
+        if blocked is None:
+            blocked = await self._load_blocked(db, user_id)
+        hidden = self._parse(hidden)
+        if hidden is None:
+            hidden = await self._load_hidden(db, user_id)
+        return Exclusions(blocked_user_ids=blocked, hidden_story_ids=hidden)
+
+    async def set_hidden(self, user_id: int, story_id: int, hidden: bool) -> None:
+        "вызывать после коммита StoryHiding; незагруженный набор не трогаем"
+        if not self.available:
+            self.breaker.skipped()
+            return
+        key = self._hidden_key(user_id)
+        await self._bump(key)
+        if not await self.redis.sismember(key, SENTINEL):
+            return
+        if hidden:
+            await self.redis.sadd(key, story_id)
+        else:
+            await self.redis.srem(key, story_id)
+
+    async def invalidate_blocks(self, *user_ids: int) -> None:
+        "вызывать после изменения UserBlock для обеих сторон блокировки"
+        if not self.available:
+            self.breaker.skipped()
+            return
+        if user_ids:
+            keys = [self._blocked_key(user_id) for user_id in user_ids]
+            await self._bump(*keys)
+            await self.redis.delete(*keys)
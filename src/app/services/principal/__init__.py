@@ -0,0 +1 @@
+from .principal import Principal, PrincipalService
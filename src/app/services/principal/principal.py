@@ -0,0 +1,72 @@
+"""Принципал запроса - то, что нужно для авторизации, без объекта User.
+
+:user:{id}:object: компактный dict полей Principal (кодек кеша), а не pickle User
+    со всеми selectin-связями
+
+При доверенных claims токена Principal собирается из них без обращения к Redis,
+иначе - одним SELECT по колонкам users через кеш. User загружается только
+эндпоинтами, которым он действительно нужен.
+"""
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import User
+from app.schemas import TokenPayload
+from app.utils.cache import RedisCache, redis_prefix
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    is_active: bool
+    is_superuser: bool
+    is_premium: bool
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+    @classmethod
+    def from_claims(cls, claims: TokenPayload) -> "Principal":
+        return cls(
+            id=claims.sub,
+            is_active=claims.is_active,
+            is_superuser=claims.is_superuser,
+            is_premium=claims.is_premium,
+        )
+
+
+class PrincipalService:
+
+    def __init__(self, redis_cache: RedisCache, ttl: Optional[int] = None):
+        self.redis_cache = redis_cache
+        self.ttl = ttl or settings.PRINCIPAL_TTL
+
+    @staticmethod
+    async def _load(db: AsyncSession, user_id: int) -> Optional[dict]:
+        result = await db.execute(
+            select(
+                User.id, User.is_active, User.is_superuser, User.is_premium, User.first_name, User.last_name
+            ).where(User.id == user_id)
+        )
+        row = result.one_or_none()
+        return asdict(Principal(**row._mapping)) if row is not None else None
+
+    async def get(self, db: AsyncSession, user_id: int) -> Optional[Principal]:
+        data = await self.redis_cache.try_cache_dict(
+            name=redis_prefix.user.format(user_id),
+            func=self._load,
+            ex=self.ttl,
+            db=db,
+            user_id=user_id,
+        )
+        if data is not None and not isinstance(data, dict):
+            # pickle User, записанный до перехода на Principal
+            await self.forget(user_id)
+            return await self.get(db, user_id)
+        return Principal(**data) if data else None
+
+    async def forget(self, user_id: int) -> None:
+        await self.redis_cache.delete(redis_prefix.user.format(user_id))
@@ -0,0 +1 @@
+from .story_entity import StoryEntityService, id_page, ring_page
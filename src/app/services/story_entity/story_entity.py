@@ -0,0 +1,97 @@
+"""Общий кеш тел историй и сборка страниц лент.
+
+Ленты кешируют только упорядоченные id (id_page / ring_page), тела GettingStory
+без отметок зрителя лежат по одному ключу на историю (story_entity:v<N>:<id>).
+Страница собирается одним MGET, промахи догружаются из БД одной пачкой,
+отметки зрителя накладываются при каждом ответе из его наборов ViewerStateService.
+"""
+from typing import Any, Iterable, List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, getters
+from app.config import settings
+from app.models import Story, User
+from app.services.viewer_state import ViewerStateService
+from app.utils.cache import Cache, cache_tag
+
+
+def _paginator(paginator: Any) -> Optional[dict]:
+    return paginator.model_dump(mode="json") if isinstance(paginator, BaseModel) else paginator
+
+
+def id_page(stories: List[Story], paginator: Any) -> dict:
+    "кешируемая страница ленты: только id историй"
+    return {"ids": [story.id for story in stories], "paginator": _paginator(paginator)}
+
+
+def ring_page(rings: List[List[Story]], paginator: Any) -> dict:
+    "кешируемая страница колец short-историй"
+    return {"rings": [[story.id for story in stories] for stories in rings], "paginator": _paginator(paginator)}
+
+
+class StoryEntityService:
+    namespace = "story_entity"
+
+    def __init__(self, cache: Cache, viewer_state: ViewerStateService, ttl: Optional[int] = None):
+        self.cache = cache
+        self.viewer_state = viewer_state
+        self.ttl = ttl or settings.STORY_ENTITY_TTL
+
+    def _key(self, story_id: int) -> tuple:
+        return self.namespace, story_id
+
+    async def get_bodies(self, db: AsyncSession, story_ids: Iterable[int]) -> dict[int, dict]:
+        "тела историй по id; удалённые истории в результат не попадают"
+        story_ids = list(dict.fromkeys(story_ids))
+        cached = await self.cache.get_many([self._key(story_id) for story_id in story_ids])
+        bodies = {story_id: body for story_id, body in zip(story_ids, cached) if body is not None}
+
+        missing = [story_id for story_id in story_ids if story_id not in bodies]
+        if missing:
+            stories = await crud.story.get_many(db, missing, profile='feed_item')
+            fresh = [body.model_dump(mode="json") for body in await getters.get_story_bodies(db, stories)]
+            await self.cache.set_many(
+                [
+                    (self._key(body["id"]), body, [cache_tag.author.format(body["user"]["id"])])
+                    for body in fresh
+                ],
+                self.ttl,
+            )
+            bodies.update((body["id"], body) for body in fresh)
+        return bodies
+
+    async def render(self, db: AsyncSession, story_ids: List[int], viewer: Optional[User] = None) -> List[dict]:
+        bodies = await self.get_bodies(db, story_ids)
+        present = [story_id for story_id in story_ids if story_id in bodies]
+        if self.viewer_state.available:
+            overlay = await self.viewer_state.overlay(db, viewer.id if viewer is not None else None, present)
+        else:
+            overlay = await getters.get_viewer_overlay(db, present, viewer)
+        return [{**bodies[story_id], **overlay[story_id]} for story_id in present]
+
+    async def render_page(self, db: AsyncSession, page: dict, viewer: Optional[User] = None) -> dict:
+        "Response из id_page"
+        return {"data": await self.render(db, page["ids"], viewer), "paginator": page["paginator"]}
+
+    async def render_ring_page(self, db: AsyncSession, page: dict, viewer: Optional[User] = None) -> dict:
+        "Response из ring_page: GettingUserStories на каждое кольцо"
+        stories = {
+            story["id"]: story
+            for story in await self.render(db, [story_id for ring in page["rings"] for story_id in ring], viewer)
+        }
+        data = []
+        for ring in page["rings"]:
+            ring_stories = [stories[story_id] for story_id in ring if story_id in stories]
+            if ring_stories:
+                data.append({"user": ring_stories[0]["user"], "stories": ring_stories})
+        return {"data": data, "paginator": page["paginator"]}
+
+    async def forget(self, *story_ids: int) -> None:
+        "сбрасывает тела историй после изменения счётчиков или содержимого"
+        await self.cache.delete_many([self._key(story_id) for story_id in story_ids])
+
+    async def forget_author(self, user_id: int) -> None:
+        "сбрасывает тела историй автора после изменения его профиля"
+        await self.cache.invalidate_tags(cache_tag.author.format(user_id))
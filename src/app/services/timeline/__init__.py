@@ -0,0 +1 @@
+from .timeline import TimelineService
@@ -0,0 +1,331 @@
+"""Ленты подписок в Redis: push-модель с pull для авторов с большим числом подписчиков.
+
+:timeline:{user_id}: ZSET id историй подписок, score - created (unix time)
+:timeline:{user_id}:ready: лента собрана из БД и дальше поддерживается push-ем
+:timeline:outbox:{author_id}: ZSET последних историй автора
+:timeline:pull_authors: SET авторов, истории которых не рассылаются подписчикам,
+    а подмешиваются из outbox при чтении ленты
+
+Удалённые истории из лент не вычищаются сразу: их id отбрасываются при гидрации
+и удаляются из ленты через forget. Скрытые зрителем истории и истории
+заблокированных авторов отфильтровываются в get_page до подсчёта total.
+
+Когда автор выходит из pull-режима, истории из его outbox дописываются в ленты
+подписчиков (backfill) - иначе опубликованное в pull-режиме из лент пропадёт.
+
+Пока redis_breaker не closed, рассылка и очистка лент пропускаются, а лента
+читается из БД (crud.story.get_stories_from_subscriptions); после восстановления
+ленты и outbox-ы собираются заново. Курсор - [created, id], как у keyset-пагинации
+в БД, поэтому листание переживает переключение между источниками.
+"""
+import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from redis.asyncio import Redis
+from sqlalchemy import select, func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.exceptions import UnprocessableEntity
+from app.models import Story, Subscription
+from app.schemas.response import Paginator
+from app.services.exclusion import Exclusions
+from app.utils import pagination
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+
+def to_score(created: datetime.datetime) -> float:
+    "created хранится в UTC без таймзоны"
+    return created.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def from_score(score: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(score, datetime.timezone.utc).replace(tzinfo=None)
+
+
+class TimelineService:
+    prefix = "timeline"
+    merged_ttl = 30
+    # запас на истории с одинаковым created на границе страницы
+    tie_slack = 10
+
+    def __init__(
+            self,
+            redis: Redis,
+            max_length: Optional[int] = None,
+            fanout_limit: Optional[int] = None,
+            ttl: Optional[int] = None,
+            breaker: Optional[RedisCircuitBreaker] = None,
+    ):
+        self.redis = redis
+        self.max_length = max_length or settings.TIMELINE_MAX_LENGTH
+        self.fanout_limit = fanout_limit or settings.TIMELINE_FANOUT_LIMIT
+        self.ttl = ttl or settings.TIMELINE_TTL
+        self.breaker = breaker
+
+    @property
+    def available(self) -> bool:
+        return self.breaker is None or self.breaker.closed
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def _ready_key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}:ready"
+
+    def _outbox_key(self, author_id: int) -> str:
+        return f"{self.prefix}:outbox:{author_id}"
+
+    @property
+    def _pull_authors_key(self) -> str:
+        return f"{self.prefix}:pull_authors"
+
+    def _add(self, pipe, key: str, entries: dict) -> None:
+        pipe.zadd(key, entries)
+        pipe.zremrangebyrank(key, 0, -self.max_length - 1)
+        pipe.expire(key, self.ttl)
+
+    async def push_story(self, db: AsyncSession, story: Story) -> None:
+        "рассылает новую историю в ленты подписчиков; вызывать после коммита истории"
+        if story.is_short_story:
+            return
+        if not self.available:
+            self.breaker.skipped()
+            return
+        entry = {story.id: to_score(story.created)}
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self._add(pipe, self._outbox_key(story.user_id), entry)
+            await pipe.execute()
+
+        followers_count = (await db.execute(
+            select(func.count(Subscription.id)).where(Subscription.object_id == story.user_id)
+        )).scalar_one()
+        if followers_count >= self.fanout_limit:
+            await self.redis.sadd(self._pull_authors_key, story.user_id)
+            return
+        if await self.redis.srem(self._pull_authors_key, story.user_id):
+            await self.backfill(db, story.user_id)
+            return
+        await self._fan_out(db, story.user_id, entry)
+
+    async def _fan_out(self, db: AsyncSession, author_id: int, entries: dict) -> None:
+        result = await db.execute(
+            select(Subscription.subject_id).where(Subscription.object_id == author_id).distinct()
+        )
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for follower_id in result.scalars().all():
+                self._add(pipe, self._key(follower_id), entries)
+            await pipe.execute()
+
+    async def backfill(self, db: AsyncSession, author_id: int) -> int:
+        "дописывает outbox автора, вышедшего из pull-режима, в ленты его подписчиков"
+        await self.rebuild_outbox(db, author_id)
+        entries = {
+            int(story_id): score
+            for story_id, score in await self.redis.zrange(self._outbox_key(author_id), 0, -1, withscores=True)
+        }
+        if entries:
+            await self._fan_out(db, author_id, entries)
+        return len(entries)
+
+    async def remove_story(self, story_id: int, author_id: int) -> None:
+        "ленты подписчиков очищаются лениво, при чтении"
+        if not self.available:
+            self.breaker.skipped()
+            return
+        await self.redis.zrem(self._outbox_key(author_id), story_id)
+
+    async def forget(self, user_id: int, story_ids: Sequence[int]) -> None:
+        "убирает из ленты истории, которых больше нет в БД"
+        if story_ids and self.available:
+            await self.redis.zrem(self._key(user_id), *story_ids)
+
+    async def _replace(self, key: str, rows: Sequence[Tuple[int, datetime.datetime]]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if rows:
+                pipe.zadd(key, {story_id: to_score(created) for story_id, created in rows})
+                pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def rebuild(self, db: AsyncSession, user_id: int) -> int:
+        "собирает ленту пользователя из БД"
+        result = await db.execute(
+            select(Story.id, Story.created)
+            .join(Subscription, Subscription.object_id == Story.user_id)
+            .where(Subscription.subject_id == user_id, Story.is_short_story == False)
+            .order_by(desc(Story.created), desc(Story.id))
+            .limit(self.max_length)
+        )
+        rows = result.all()
+        await self._replace(self._key(user_id), rows)
+        await self.redis.set(self._ready_key(user_id), 1, ex=self.ttl)
+        return len(rows)
+
+    async def rebuild_outbox(self, db: AsyncSession, author_id: int) -> int:
+        result = await db.execute(
+            select(Story.id, Story.created)
+            .where(Story.user_id == author_id, Story.is_short_story == False)
+            .order_by(desc(Story.created), desc(Story.id))
+            .limit(self.max_length)
+        )
+        rows = result.all()
+        await self._replace(self._outbox_key(author_id), rows)
+        return len(rows)
+
+    async def refresh_pull_authors(self, db: AsyncSession) -> List[int]:
+        "пересчитывает список авторов, чьи истории не рассылаются, а подмешиваются при чтении"
+        result = await db.execute(
+            select(Subscription.object_id)
+            .group_by(Subscription.object_id)
+            .having(func.count(Subscription.id) >= self.fanout_limit)
+        )
+        author_ids = [author_id for author_id in result.scalars().all() if author_id is not None]
+        previous = {int(author_id) for author_id in await self.redis.smembers(self._pull_authors_key)}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._pull_authors_key)
+            if author_ids:
+                pipe.sadd(self._pull_authors_key, *author_ids)
+            await pipe.execute()
+        for author_id in previous - set(author_ids):
+            await self.backfill(db, author_id)
+        return author_ids
+
+    async def _followed_pull_authors(self, db: AsyncSession, user_id: int) -> List[int]:
+        pull_authors = await self.redis.smembers(self._pull_authors_key)
+        if not pull_authors:
+            return []
+        result = await db.execute(
+            select(Subscription.object_id)
+            .where(
+                Subscription.subject_id == user_id,
+                Subscription.object_id.in_([int(author_id) for author_id in pull_authors])
+            )
+            .distinct()
+        )
+        return result.scalars().all()
+
+    async def _source_key(self, db: AsyncSession, user_id: int) -> str:
+        "ключ ZSET, из которого читается страница: лента, при необходимости объединённая с outbox"
+        key = self._key(user_id)
+        if not await self.redis.exists(self._ready_key(user_id)):
+            await self.rebuild(db, user_id)
+        else:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.expire(key, self.ttl)
+                pipe.expire(self._ready_key(user_id), self.ttl)
+                await pipe.execute()
+
+        author_ids = await self._followed_pull_authors(db, user_id)
+        if not author_ids:
+            return key
+
+        for author_id in author_ids:
+            if not await self.redis.exists(self._outbox_key(author_id)):
+                await self.rebuild_outbox(db, author_id)
+
+        merged_key = f"{key}:merged"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(
+                merged_key,
+                [key, *(self._outbox_key(author_id) for author_id in author_ids)],
+                aggregate="MAX"
+            )
+            pipe.expire(merged_key, self.merged_ttl)
+            await pipe.execute()
+        return merged_key
+
+    async def _visible(
+            self,
+            db: AsyncSession,
+            story_ids: List[int],
+            exclusions: Optional[Exclusions],
+    ) -> List[int]:
+        "story_ids без скрытых зрителем историй и историй заблокированных авторов, порядок сохраняется"
+        if exclusions is None:
+            return story_ids
+        story_ids = [story_id for story_id in story_ids if story_id not in exclusions.hidden_story_ids]
+        if exclusions.blocked_user_ids and story_ids:
+            # автора в ленте нет, блокировки проверяются одним запросом по первичному ключу
+            result = await db.execute(
+                select(Story.id).where(Story.id.in_(story_ids), Story.user_id.in_(exclusions.blocked_user_ids))
+            )
+            blocked = set(result.scalars().all())
+            story_ids = [story_id for story_id in story_ids if story_id not in blocked]
+        return story_ids
+
+    async def get_page(
+            self,
+            db: AsyncSession,
+            *,
+            user_id: int,
+            page: Optional[int] = None,
+            cursor: Optional[str] = None,
+            size: int = 30,
+            exclusions: Optional[Exclusions] = None,
+    ) -> Tuple[List[int], Paginator]:
+        """Страница id историй ленты без исключённых зрителем.
+
+        cursor is not None -> курсор [created, id] последнего элемента, как у keyset-пагинации,
+        ZSET дочитывается порциями, пока страница не заполнится. Иначе постраничная выдача:
+        лента (не длиннее max_length и outbox-ов pull-авторов) фильтруется целиком,
+        поэтому total точный.
+        """
+        key = await self._source_key(db, user_id)
+
+        if cursor is None:
+            page = page or 1
+            story_ids = await self._visible(
+                db, [int(story_id) for story_id in await self.redis.zrevrange(key, 0, -1)], exclusions
+            )
+            page_count = ((len(story_ids) - 1) // size) + 1
+            return story_ids[(page - 1) * size:page * size], Paginator(
+                page=page,
+                total=page_count,
+                has_prev=page > 1,
+                has_next=page < page_count,
+            )
+
+        values = pagination.decode_cursor(cursor)
+        last_score, last_id = "+inf", None
+        if values is not None:
+            if len(values) != 2:
+                raise UnprocessableEntity(message="Некорректный курсор", path="$query.cursor")
+            last_score, last_id = values
+            if isinstance(last_score, datetime.datetime):
+                last_score = to_score(last_score)
+
+        chunk = size + 1 + self.tie_slack
+        offset = 0
+        entries = []
+        while len(entries) <= size:
+            batch = await self.redis.zrevrangebyscore(
+                key, last_score, "-inf", start=offset, num=chunk, withscores=True
+            )
+            offset += len(batch)
+            exhausted = len(batch) < chunk
+            batch = [
+                (int(story_id), score) for story_id, score in batch
+                if last_id is None or score < last_score or int(story_id) < last_id
+            ]
+            visible = set(await self._visible(db, [story_id for story_id, _ in batch], exclusions))
+            entries.extend(entry for entry in batch if entry[0] in visible)
+            if exhausted:
+                break
+        # Redis упорядочивает равные score лексикографически, а курсору нужен порядок по id
+        entries = sorted(entries, key=lambda entry: (entry[1], entry[0]), reverse=True)
+
+        has_next = len(entries) > size
+        entries = entries[:size]
+        next_cursor = None
+        if has_next:
+            story_id, score = entries[-1]
+            next_cursor = pagination.encode_cursor([from_score(score), story_id])
+        return [story_id for story_id, _ in entries], Paginator(
+            page=1,
+            total=None,
+            has_prev=values is not None,
+            has_next=has_next,
+            next_cursor=next_cursor,
+        )
@@ -0,0 +1 @@
+from .token_version import TokenVersionService
@@ -0,0 +1,90 @@
+"""Версии токенов доступа.
+
+Источник истины - колонка users.token_version: bump увеличивает её после смены
+is_active, is_superuser или is_premium и удаления пользователя.
+:auth:token_version:{user_id}: кеш колонки с TTL
+
+Токен несёт эти флаги и версию в claims. Claims принимаются, только если версия
+совпадает с текущей (один GET, при промахе - SELECT по первичному ключу).
+Токен старой версии не отзывается, а проходит через загрузку пользователя, поэтому
+смена флагов применяется сразу и без повторного входа. Потеря кеша не возвращает
+доверие старым токенам: версия перечитывается из БД.
+"""
+import logging
+from typing import Iterable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.config import settings
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# версии только растут: запись загрузчика, прочитавшего БД до bump, не откатывает кеш
+SET_MAX = """
+local current = redis.call("get", KEYS[1])
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call("set", KEYS[1], ARGV[1], "EX", ARGV[2])
+return 1
+"""
+
+
+class TokenVersionService:
+    prefix = "auth:token_version"
+
+    def __init__(self, redis: Redis, ttl: Optional[int] = None, breaker: Optional[RedisCircuitBreaker] = None):
+        self.redis = redis
+        self.ttl = ttl or settings.TOKEN_VERSION_TTL
+        self.breaker = breaker
+        self._set_max = redis.register_script(SET_MAX)
+
+    @property
+    def available(self) -> bool:
+        return self.breaker is None or self.breaker.closed
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def current(self, db: AsyncSession, user_id: int) -> Optional[int]:
+        "None - пользователя нет; без Redis версия читается из БД"
+        if self.available:
+            cached = await self.redis.get(self._key(user_id))
+            if cached is not None:
+                return int(cached)
+        version = await crud.user.get_token_version(db, user_id)
+        if version is not None and self.available:
+            await self._set_max(keys=[self._key(user_id)], args=[version, self.ttl])
+        return version
+
+    async def is_stale(self, db: AsyncSession, user_id: int, version: int) -> bool:
+        return version != await self.current(db, user_id)
+
+    async def bump(self, db: AsyncSession, user_ids: Iterable[int]) -> None:
+        "вызывать после коммита изменения флагов пользователя"
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        versions = await crud.user.bump_token_version(db, user_ids)
+        if not self.available:
+            # кеш версий сбрасывается после восстановления Redis
+            self.breaker.skipped()
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    if user_id in versions:
+                        await self._set_max(keys=[self._key(user_id)], args=[versions[user_id], self.ttl], client=pipe)
+                    else:
+                        pipe.delete(self._key(user_id))
+                await pipe.execute()
+        except RedisError as e:
+            # версия в БД уже сдвинута; кеш старой версии сбросится после восстановления или по TTL
+            logger.exception("Token version cache update failed for %s", user_ids)
+            if self.breaker is not None:
+                self.breaker.failure(e)
+                self.breaker.skipped()
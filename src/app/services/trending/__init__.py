@@ -0,0 +1 @@
+from .trending import TrendingService, TrendingWeight, TrendingWindow
@@ -0,0 +1,155 @@
+"""Популярные хештеги по часовым счётчикам в Redis.
+
+:trending:bucket:{YYYYMMDDHH}: ZSET hashtag_id -> вес событий за час (UTC)
+:trending:result:{window}: готовый top-N окна (JSON), отдаётся эндпоинтом как есть
+:trending:lock:{window}: блокировка пересчёта окна
+
+Окно собирается ZUNIONSTORE часовых корзин с весами 0.5 ** (возраст / период полураспада).
+Пересчёт запускается командой refresh-trending или лениво при чтении устаревшего результата.
+Пока redis_breaker не closed, события не засчитываются, а get отдаёт пустой список.
+"""
+import datetime
+import enum
+import json
+import logging
+import time
+from typing import Iterable, List, Optional
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.getters.hashtag import get_hashtags_batch
+from app.models import Hashtag, StoryHashtag
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingWeight:
+    "вклад событий в счётчик хештега"
+    usage = 5.0
+    view = 1.0
+    hug = 2.0
+    reaction = 2.0
+
+
+class TrendingWindow(enum.Enum):
+    day = "24h"
+    week = "7d"
+
+
+# окно -> (длина в часах, период полураспада в часах)
+WINDOWS = {
+    TrendingWindow.day: (24, 6),
+    TrendingWindow.week: (7 * 24, 48),
+}
+
+
+class TrendingService:
+    prefix = "trending"
+    lock_ttl = 60
+
+    def __init__(
+            self,
+            redis: Redis,
+            size: Optional[int] = None,
+            refresh_interval: Optional[int] = None,
+            breaker: Optional[RedisCircuitBreaker] = None,
+    ):
+        self.redis = redis
+        self.size = size or settings.TRENDING_SIZE
+        self.refresh_interval = refresh_interval or settings.TRENDING_REFRESH_INTERVAL
+        self.breaker = breaker
+
+    @property
+    def available(self) -> bool:
+        return self.breaker is None or self.breaker.closed
+
+    def _bucket_key(self, hour: datetime.datetime) -> str:
+        return f"{self.prefix}:bucket:{hour:%Y%m%d%H}"
+
+    def _result_key(self, window: TrendingWindow) -> str:
+        return f"{self.prefix}:result:{window.value}"
+
+    def _lock_key(self, window: TrendingWindow) -> str:
+        return f"{self.prefix}:lock:{window.value}"
+
+    @staticmethod
+    def _current_hour() -> datetime.datetime:
+        return datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+    async def record(self, hashtag_ids: Iterable[int], weight: float) -> None:
+        hashtag_ids = set(hashtag_ids)
+        if not hashtag_ids:
+            return
+        key = self._bucket_key(self._current_hour())
+        bucket_ttl = (max(hours for hours, _ in WINDOWS.values()) + 1) * 3600
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for hashtag_id in hashtag_ids:
+                pipe.zincrby(key, weight, hashtag_id)
+            pipe.expire(key, bucket_ttl)
+            await pipe.execute()
+
+    async def record_story(self, db: AsyncSession, story_id: int, weight: float) -> None:
+        "событие по истории засчитывается всем её хештегам"
+        if not self.available:
+            self.breaker.skipped()
+            return
+        result = await db.execute(select(StoryHashtag.hashtag_id).where(StoryHashtag.story_id == story_id))
+        await self.record(result.scalars().all(), weight)
+
+    async def refresh(self, db: AsyncSession, window: TrendingWindow) -> List[dict]:
+        "пересчитывает top-N окна и сохраняет готовый результат"
+        hours, half_life = WINDOWS[window]
+        now = self._current_hour()
+        weights = {
+            self._bucket_key(now - datetime.timedelta(hours=age)): 0.5 ** (age / half_life)
+            for age in range(hours)
+        }
+        union_key = f"{self.prefix}:union:{window.value}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(union_key, weights, aggregate="SUM")
+            pipe.zrevrange(union_key, 0, self.size - 1, withscores=True)
+            pipe.delete(union_key)
+            _, top, _ = await pipe.execute()
+
+        scores = {int(hashtag_id): score for hashtag_id, score in top}
+        hashtags = []
+        if scores:
+            result = await db.execute(select(Hashtag).where(Hashtag.id.in_(scores.keys())))
+            hashtags = sorted(result.scalars().all(), key=lambda hashtag: scores[hashtag.id], reverse=True)
+
+        data = [
+            {**item.model_dump(), "score": round(scores[item.id], 3)}
+            for item in await get_hashtags_batch(db, hashtags)
+        ]
+        await self.redis.set(
+            self._result_key(window),
+            json.dumps({"refreshed": time.time(), "data": data}),
+        )
+        return data
+
+    async def get(self, db: AsyncSession, window: TrendingWindow) -> List[dict]:
+        """Готовый результат окна.
+
+        Устаревший результат пересчитывает один запрос, взявший блокировку,
+        остальные в это время получают прежний.
+        """
+        if not self.available:
+            return []
+        raw = await self.redis.get(self._result_key(window))
+        cached = json.loads(raw) if raw is not None else None
+        if cached is not None and time.time() - cached["refreshed"] < self.refresh_interval:
+            return cached["data"]
+
+        if not await self.redis.set(self._lock_key(window), 1, nx=True, ex=self.lock_ttl):
+            return cached["data"] if cached is not None else []
+        try:
+            return await self.refresh(db, window)
+        except Exception as e:
+            logger.error(f"Trending refresh failed for {window.value}: {e}")
+            return cached["data"] if cached is not None else []
+        finally:
+            await self.redis.delete(self._lock_key(window))
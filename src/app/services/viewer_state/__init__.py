@@ -0,0 +1 @@
+from .viewer_state import ViewerFlag, ViewerStateService
@@ -0,0 +1,149 @@
+"""Отметки зрителя по историям в Redis.
+
+:viewer_state:{user_id}:{flag}: SET id историй, где flag - viewed, hugged,
+    is_favorite, is_comment или reacted:{тип реакции}
+
+Как и в ExclusionService, служебный элемент 0 отмечает загруженный набор:
+набор без него перечитывается из БД целиком. Оверлей страницы - один
+pipeline из SMISMEMBER по всем наборам.
+
+:viewer_state:{user_id}:{flag}:gen: поколение набора, как в ExclusionService:
+mark сдвигает его после коммита, а загрузка, прочитавшая БД раньше, набор не записывает.
+"""
+from typing import Dict, List, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.enums.reaction import ReactionType
+from app.models import Comment, FavoriteStory, Hug, Reaction, View
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+SENTINEL = 0
+
+
+class ViewerFlag:
+    viewed = "viewed"
+    hugged = "hugged"
+    is_favorite = "is_favorite"
+    is_comment = "is_comment"
+
+    @staticmethod
+    def reacted(type_reaction: ReactionType) -> str:
+        return f"reacted:{type_reaction.value}"
+
+
+FLAGS = [ViewerFlag.viewed, ViewerFlag.hugged, ViewerFlag.is_favorite, ViewerFlag.is_comment]
+
+
+def _source(flag: str, user_id: int):
+    if flag == ViewerFlag.viewed:
+        return select(View.story_id).where(View.user_id == user_id)
+    if flag == ViewerFlag.hugged:
+        return select(Hug.story_id).where(Hug.user_id == user_id)
+    if flag == ViewerFlag.is_favorite:
+        return select(FavoriteStory.story_id).where(FavoriteStory.user_id == user_id)
+    if flag == ViewerFlag.is_comment:
+        return select(Comment.story_id).where(Comment.user_id == user_id)
+    type_reaction = ReactionType(flag.split(":", 1)[1])
+    return select(Reaction.story_id).where(Reaction.user_id == user_id, Reaction.type_reaction == type_reaction)
+
+
+class ViewerStateService:
+    prefix = "viewer_state"
+
+    def __init__(self, redis: Redis, ttl: Optional[int] = None, breaker: Optional[RedisCircuitBreaker] = None):
+        self.redis = redis
+        self.ttl = ttl or settings.VIEWER_STATE_TTL
+        self.breaker = breaker
+
+    @property
+    def available(self) -> bool:
+        "при недоступном Redis отметки берутся из БД (getters.get_viewer_overlay)"
+        return self.breaker is None or self.breaker.closed
+
+    def _key(self, user_id: int, flag: str) -> str:
+        return f"{self.prefix}:{user_id}:{flag}"
+
+    @staticmethod
+    def _flags() -> List[str]:
+        return FLAGS + [ViewerFlag.reacted(type_reaction) for type_reaction in ReactionType]
+
+    async def _load(self, db: AsyncSession, user_id: int, flag: str) -> set:
+        key = self._key(user_id, flag)
+        gen_key = f"{key}:gen"
+        generation = int(await self.redis.get(gen_key) or 0)
+        result = await db.execute(_source(flag, user_id))
+        ids = {id_ for id_ in result.scalars().all() if id_ is not None}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(gen_key)
+                if int(await pipe.get(gen_key) or 0) != generation:
+                    return ids
+                pipe.multi()
+                pipe.delete(key)
+                pipe.sadd(key, SENTINEL, *ids)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+            except WatchError:
+                pass
+        return ids
+
+    async def overlay(self, db: AsyncSession, user_id: Optional[int], story_ids: List[int]) -> Dict[int, dict]:
+        "отметки зрителя по историям в формате полей GettingStory"
+        reacted_types = list(ReactionType)
+        if user_id is None:
+            return {
+                story_id: {
+                    'viewed': None, 'hugged': None, 'is_favorite': None, 'is_comment': None,
+                    'reacted': {rt.value: False for rt in reacted_types},
+                }
+                for story_id in story_ids
+            }
+
+        flags = self._flags()
+        members: Dict[str, List[bool]] = {}
+        if story_ids:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for flag in flags:
+                    pipe.smismember(self._key(user_id, flag), [SENTINEL, *story_ids])
+                results = await pipe.execute()
+
+            for flag, result in zip(flags, results):
+                if result[0]:
+                    members[flag] = [bool(value) for value in result[1:]]
+                else:
+                    loaded = await self._load(db, user_id, flag)
+                    members[flag] = [story_id in loaded for story_id in story_ids]
+
+        return {
+            story_id: {
+                'viewed': members[ViewerFlag.viewed][i],
+                'hugged': members[ViewerFlag.hugged][i],
+                'is_favorite': members[ViewerFlag.is_favorite][i],
+                'is_comment': members[ViewerFlag.is_comment][i],
+                'reacted': {rt.value: members[ViewerFlag.reacted(rt)][i] for rt in reacted_types},
+            }
+            for i, story_id in enumerate(story_ids)
+        }
+
+    async def mark(self, user_id: int, flag: str, story_id: int, value: bool) -> None:
+        "вызывать после коммита; незагруженный набор не трогаем"
+        if not self.available:
+            # набор разошёлся бы с БД, после восстановления наборы сбрасываются
+            self.breaker.skipped()
+            return
+        key = self._key(user_id, flag)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(f"{key}:gen")
+            pipe.expire(f"{key}:gen", self.ttl)
+            await pipe.execute()
+        if not await self.redis.sismember(key, SENTINEL):
+            return
+        if value:
+            await self.redis.sadd(key, story_id)
+        else:
+            await self.redis.srem(key, story_id)
@@ -0,0 +1 @@
+from .visit_tracker import VisitTracker
@@ -0,0 +1,113 @@
+"""Отложенная запись last_visited.
+
+:visits:pending: HASH user_id -> unix-время последнего визита
+
+Авторизация не пишет в БД: record кладёт время визита в хеш не чаще раза
+в record_interval на пользователя в пределах воркера. Фоновый flush раз в
+flush_interval забирает хеш через RENAMENX в visits:flushing и применяет его
+одним UPDATE ... FROM (VALUES ...) на пачку. Если применение упало, ключ
+visits:flushing остаётся и разбирается следующим flush, запись идемпотентна.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app import crud
+from app.config import settings
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class VisitTracker:
+    pending_key = "visits:pending"
+    flushing_key = "visits:flushing"
+
+    def __init__(
+            self,
+            redis: Redis,
+            session_factory,
+            record_interval: Optional[int] = None,
+            flush_interval: Optional[float] = None,
+            batch: int = 1000,
+            breaker: Optional[RedisCircuitBreaker] = None,
+    ):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.record_interval = record_interval or settings.VISIT_RECORD_INTERVAL
+        self.flush_interval = flush_interval or settings.VISIT_FLUSH_INTERVAL
+        self.batch = batch
+        self.breaker = breaker
+        self._recorded: dict[int, float] = {}
+        self._task: asyncio.Task | None = None
+
+    async def record(self, user_id: int) -> None:
+        if self.breaker is not None and not self.breaker.closed:
+            return
+        now = time.monotonic()
+        if now - self._recorded.get(user_id, -self.record_interval) < self.record_interval:
+            return
+        try:
+            await self.redis.hset(self.pending_key, str(user_id), str(time.time()))
+        except Exception as e:
+            logger.error(f"Visit record failed: {e}")
+            return
+        # только после записи: при ошибке следующий запрос повторит её
+        self._recorded[user_id] = now
+
+    async def flush(self) -> int:
+        "применяет накопленные визиты; возвращает число пользователей"
+        now = time.monotonic()
+        self._recorded = {
+            user_id: recorded for user_id, recorded in self._recorded.items()
+            if now - recorded < self.record_interval
+        }
+
+        if not await self.redis.exists(self.flushing_key):
+            try:
+                await self.redis.renamenx(self.pending_key, self.flushing_key)
+            except ResponseError:
+                # visits:pending нет - нечего применять
+                return 0
+
+        visits = {
+            int(user_id): datetime.fromtimestamp(float(stamp), timezone.utc)
+            for user_id, stamp in (await self.redis.hgetall(self.flushing_key)).items()
+        }
+        items = list(visits.items())
+        async with self.session_factory() as db:
+            for start in range(0, len(items), self.batch):
+                await crud.user.update_last_visited(db, visits=dict(items[start:start + self.batch]))
+            await db.commit()
+        await self.redis.delete(self.flushing_key)
+        return len(items)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Visit flush failed: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Visit flush failed: {e}")
@@ -1,14 +1,23 @@
 import json
 import logging
+import math
 import pickle
-from typing import Any, Coroutine, Type
+import random
+import time
+from typing import Any, Coroutine, Iterable, Type
 from datetime import datetime, date
 
 from pydantic import BaseModel
 from app.utils.datetime import to_unix_timestamp
 
 from app.models.base_model import Base
+from app.utils.cache_metrics import CacheMetrics
+from app.utils.circuit_breaker import RedisCircuitBreaker
+from app.utils.codec import Codec, CodecFormat
+from app.utils.local_cache import InvalidationBus, LocalCache
+from app.utils.single_flight import SingleFlight
 from redis.asyncio import Redis
+from redis.exceptions import RedisError
 
 
 class RedisPrefix:
@@ -17,6 +26,41 @@ class RedisPrefix:
 redis_prefix = RedisPrefix()
 
 
+class CacheTag:
+    author = "author:{0}"
+    viewer = "viewer:{0}"
+    search = "search"
+
+cache_tag = CacheTag()
+
+
+class FeedNamespace:
+    # общие ленты и ленты подписок меняет любая новая или удалённая история:
+    # они сбрасываются версией пространства (один HINCRBY), а не тегом на все страницы
+    stories = "feed_story_ids"
+    short_stories = "feed_short_story_ids"
+    subscriptions = "subscription_story_ids"
+    short_subscriptions = "subscription_short_story_ids"
+
+    def of(self, is_short_story: bool) -> tuple[str, str]:
+        "пространства лент, которые меняет история"
+        if is_short_story:
+            return self.short_stories, self.short_subscriptions
+        return self.stories, self.subscriptions
+
+feed_namespace = FeedNamespace()
+
+
+def _timed(metrics: CacheMetrics, key: bytes | str, compute):
+    "compute с записью времени заполнения в метрики"
+    async def timed(*args, **kwargs):
+        started = time.monotonic()
+        result = await compute(*args, **kwargs)
+        metrics.fill(key, time.monotonic() - started)
+        return result
+    return timed
+
+
 class RedisCache:
     """Класс содержит методы для кеширования объектов в Redis.
 
@@ -26,10 +70,109 @@ class RedisCache:
     :try_cache_object_pickle: кеширует SQLAlchemy объект используя pickle. объект не теряет метаданные.
     для использования из кеша в контексте сессии его нужно добавить в сессию session.add(object)
     :try_cache_object_list_pickle: то же что и try_cache_object_pickle, только для списка объектов
+
+    При переданном local значения (кроме списков) дополнительно держатся в L1 процесса,
+    delete рассылает вытеснение остальным воркерам через bus.
+    С flight одновременные промахи по одному ключу вычисляются один раз.
+    В metrics пишутся попадания, промахи, время заполнения, размер и удаления.
+    Пока breaker не closed, Redis не используется: значения вычисляются функцией,
+    запись пропускается, удаление вытесняет ключ только из L1 процесса.
+    Ошибка Redis до открытия breaker передаётся ему (failure), а вызов считается сквозным.
     """
 
-    def __init__(self, redis: Redis):
+    def __init__(
+            self,
+            redis: Redis,
+            local: LocalCache | None = None,
+            bus: InvalidationBus | None = None,
+            flight: SingleFlight | None = None,
+            codec: Codec | None = None,
+            metrics: CacheMetrics | None = None,
+            breaker: RedisCircuitBreaker | None = None,
+    ):
         self.redis = redis
+        self.local = local
+        self.bus = bus
+        self.flight = flight
+        self.codec = codec or Codec()
+        self.metrics = metrics
+        self.breaker = breaker
+
+    @property
+    def bypass(self) -> bool:
+        "Redis недоступен, кеш работает как сквозной"
+        return self.breaker is not None and not self.breaker.closed
+
+    def _failed(self, error: RedisError) -> None:
+        "ошибка Redis, которую breaker ещё не заметил: вызов обрабатывается как сквозной"
+        if self.breaker is not None:
+            self.breaker.failure(error)
+        else:
+            logging.warning("Redis call failed: %s", error)
+
+    async def _get(self, name: str) -> bytes | None:
+        data = self.local.get(name) if self.local is not None else None
+        if data is not None or self.bypass:
+            return data
+        try:
+            data = await self.redis.get(name)
+        except RedisError as e:
+            self._failed(e)
+            return None
+        if self.local is None:
+            return data
+        self.local.record(name, "l2_hits" if data is not None else "l2_misses")
+        if data is not None:
+            self.local.set(name, data)
+        return data
+
+    async def _set(self, name: str, data: bytes | str, ex: int | None) -> None:
+        if self.bypass:
+            return
+        try:
+            await self.redis.set(name, data, ex=ex)
+        except RedisError as e:
+            self._failed(e)
+            return
+        if self.local is not None:
+            self.local.set(name, data if isinstance(data, bytes) else data.encode(), ex)
+        if self.metrics is not None:
+            self.metrics.size(name, len(data))
+
+    def _skip_invalidation(self, keys=()) -> None:
+        if self.local is not None:
+            self.local.evict(keys)
+        if self.breaker is not None:
+            self.breaker.skipped()
+
+    async def delete(self, name: str) -> None:
+        if self.bypass:
+            self._skip_invalidation([name])
+            return
+        try:
+            await self.redis.delete(name)
+        except RedisError as e:
+            self._failed(e)
+            self._skip_invalidation([name])
+            return
+        if self.bus is not None:
+            await self.bus.publish([name])
+        if self.metrics is not None:
+            self.metrics.invalidation([name])
+
+    async def _behind(self, name: str, load, compute) -> tuple[Any, bool]:
+        value = await load()
+        if value is not None:
+            if self.metrics is not None:
+                self.metrics.hit(name)
+            return value, True
+
+        if self.metrics is not None:
+            self.metrics.miss(name)
+            compute = _timed(self.metrics, name, compute)
+        if self.flight is None or self.bypass:
+            return await compute(), False
+        return await self.flight.run(name, load, compute)
 
     @staticmethod
     def _serialize_object(obj):
@@ -56,56 +199,67 @@ class RedisCache:
         """кэширует SQLAlchemy object в JSON формате. пробует найти в кэше. при неудаче использует функцию c kwargs.
 
         теряет метаданные объекта, то есть объект создается заново при восстановлении из кеша и не связан с БД"""
-        object_json = await self.redis.get(name)
-        if object_json:
-            msg = "from_cache"
-            object_db = self._deserialize_object(object_json, model)
-        else:
-            msg = "from_db"
+        async def load():
+            object_json = await self._get(name)
+            return self._deserialize_object(object_json, model) if object_json else None
+
+        async def compute():
             object_db = await func(**kwargs)
             if object_db:
-                object_json = self._serialize_object(object_db)
-                await self.redis.set(name, object_json, ex=ex)
-        logging.info("%s %s:\n\t%s", name, msg, object_db)
+                await self._set(name, self._serialize_object(object_db), ex)
+            return object_db
+
+        object_db, from_cache = await self._behind(name, load, compute)
+        logging.info("%s %s:\n\t%s", name, "from_cache" if from_cache else "from_db", object_db)
         return object_db
 
     async def try_cache_dict(
         self, name: str, func: Coroutine, ex: int | None = 30, **kwargs
     ) -> dict:
         "кэширует dict. пробует найти в кэше. при неудаче использует функцию c kwargs"
-        result = await self.redis.get(name)
-        if result:
-            msg = "from_cache"
-            result = json.loads(result)
-        else:
-            msg = "from_db"
+        async def load():
+            result = await self._get(name)
+            return self.codec.decode(result) if result else None
+
+        async def compute():
             result = await func(**kwargs)
-            await self.redis.set(name, json.dumps(result), ex=ex)
-        logging.info("%s %s:\n\t%s", name, msg, result)
+            if result is not None:
+                await self._set(name, self.codec.encode(result), ex)
+            return result
+
+        result, from_cache = await self._behind(name, load, compute)
+        logging.info("%s %s:\n\t%s", name, "from_cache" if from_cache else "from_db", result)
         return result
 
     async def try_cache_object_pickle(
         self, name: str, func: Coroutine, ex: int | None = 30, **kwargs
     ):
         "кэширует SQLAlchemy object. пробует найти в кэше. при неудаче использует функцию c kwargs"
-        object_pickle = await self.redis.get(name)
-        if object_pickle:
-            msg = "from_cache"
-            object = pickle.loads(object_pickle)
-        else:
-            msg = "from_db"
+        async def load():
+            object_pickle = await self._get(name)
+            return self.codec.decode(object_pickle) if object_pickle else None
+
+        async def compute():
             object = await func(**kwargs)
             if object:
-                object_pickle = pickle.dumps(object)
-                await self.redis.set(name, object_pickle, ex=ex)
-        logging.info("%s %s:\n\t%s", name, msg, object)
+                await self._set(name, self.codec.encode(object, CodecFormat.pickle), ex)
+            return object
+
+        object, from_cache = await self._behind(name, load, compute)
+        logging.info("%s %s:\n\t%s", name, "from_cache" if from_cache else "from_db", object)
         return object
 
     async def try_cache_object_list_pickle(
         self, name: str, func: Coroutine, ex: int | None = 30, **kwargs
     ) -> list:
         "кэширует SQLAlchemy objects list. пробует найти в кэше. при неудаче использует функцию c kwargs"
-        ls_pickle = await self.redis.lrange(name, 0, -1)
+        if self.bypass:
+            return await func(**kwargs)
+        try:
+            ls_pickle = await self.redis.lrange(name, 0, -1)
+        except RedisError as e:
+            self._failed(e)
+            return await func(**kwargs)
         if ls_pickle:
             msg = "from_cache"
             db_ls = [pickle.loads(object_pickle) for object_pickle in ls_pickle]
@@ -114,8 +268,11 @@ class RedisCache:
             db_ls = await func(**kwargs)
             if db_ls:
                 ls_pickle = [pickle.dumps(object_db) for object_db in db_ls]
-                await self.redis.lpush(name, *ls_pickle)
-                await self.redis.expire(name, ex)
+                try:
+                    await self.redis.lpush(name, *ls_pickle)
+                    await self.redis.expire(name, ex)
+                except RedisError as e:
+                    self._failed(e)
         logging.info("%s %s:\n\t%s", name, msg, db_ls)
         return db_ls
 
@@ -128,48 +285,211 @@ class RedisCache:
     ) -> tuple[list, Any]:
         """Кэширует данные с пагинацией.
         Возвращает кортеж (данные, пагинатор)"""
-        cached_data = await self.redis.get(name)
-        if cached_data:
-            msg = "from_cache"
-            data, paginator = pickle.loads(cached_data)
-        else:
-            msg = "from_db"
+        async def load():
+            cached_data = await self._get(name)
+            return self.codec.decode(cached_data) if cached_data else None
+
+        async def compute():
             data, paginator = await func(**kwargs)
             if data:
-                await self.redis.set(name, pickle.dumps((data, paginator)), ex=ex)
-        logging.info("%s %s", name, msg)
+                await self._set(name, self.codec.encode((data, paginator), CodecFormat.pickle), ex)
+            return data, paginator
+
+        (data, paginator), from_cache = await self._behind(name, load, compute)
+        logging.info("%s %s", name, "from_cache" if from_cache else "from_db")
         return data, paginator
 
 
 class Cache:
-    def __init__(self, redis: Redis, ttl):
+    """JSON-кеш ответов.
+
+    Первый элемент key_tuple - пространство имён. В ключ встраивается текущая
+    версия пространства (хеш cache:versions), поэтому сброс - один HINCRBY
+    через invalidate, а устаревшие ключи истекают по TTL или удаляются sweep.
+
+    Точечный сброс - теги: при записи ключ добавляется в множества cache:tag:<тег>
+    (обратный индекс), invalidate_tags удаляет только ключи с этими тегами.
+
+    С переданным local чтения сначала идут в L1 процесса (включая версии пространств),
+    удаления и сбросы рассылаются остальным воркерам через bus.
+    С flight behind_cache объединяет одновременные промахи по ключу.
+
+    behind_cache с soft_ttl хранит конверт {"body", "soft", "delta"}: после soft
+    (или раньше, по XFetch с учётом длительности пересчёта delta) отдаётся
+    устаревшее значение, а пересчёт идёт в фоне в собственной сессии session_factory.
+
+    С metrics считаются попадания и промахи behind_cache и get_many, время
+    заполнения, размер записанных значений и сбросы.
+
+    Пока breaker не closed, Cache сквозной: чтения из Redis - промахи (L1 процесса
+    продолжает отвечать), запись пропускается, сбросы вытесняют только L1 и
+    отмечаются в breaker, чтобы сбросить кеш целиком после восстановления.
+    Ошибка Redis до открытия breaker передаётся ему (failure), а вызов обрабатывается
+    так же, как при открытом breaker.
+    """
+    versions_key = b"cache:versions"
+    tag_prefix = "cache:tag"
+
+    def __init__(
+            self,
+            redis: Redis,
+            ttl,
+            local: LocalCache | None = None,
+            bus: InvalidationBus | None = None,
+            flight: SingleFlight | None = None,
+            session_factory=None,
+            codec: Codec | None = None,
+            metrics: CacheMetrics | None = None,
+            breaker: RedisCircuitBreaker | None = None,
+    ):
         self.redis = redis
         self.ttl = ttl
+        self.local = local
+        self.bus = bus
+        self.flight = flight
+        self.session_factory = session_factory
+        self.codec = codec or Codec()
+        self.metrics = metrics
+        self.breaker = breaker
+        self._versions: dict[str, int] = {}
+
+    @property
+    def bypass(self) -> bool:
+        "Redis недоступен, кеш работает как сквозной"
+        return self.breaker is not None and not self.breaker.closed
+
+    def _failed(self, error: RedisError) -> None:
+        "ошибка Redis, которую breaker ещё не заметил: вызов обрабатывается как сквозной"
+        if self.breaker is not None:
+            self.breaker.failure(error)
+        else:
+            logging.warning("Redis call failed: %s", error)
+
+    def _skip_invalidation(self, keys=()) -> None:
+        if self.local is not None:
+            self.local.evict(keys)
+        if self.breaker is not None:
+            self.breaker.skipped()
 
     @staticmethod
     def format_key(key_tuple: tuple) -> bytes:
         return (":".join(str(item) for item in key_tuple)).encode()
 
-    @staticmethod
-    def encode_body(body: BaseModel):
-        return json.dumps(body).encode()
+    def encode_body(self, body: Any) -> bytes:
+        return self.codec.encode(body)
+
+    def decode_body(self, body: bytes):
+        return self.codec.decode(body)
+
+    async def _evict(self, keys) -> None:
+        if self.bus is not None:
+            await self.bus.publish(keys)
+        if self.metrics is not None:
+            self.metrics.invalidation(keys)
 
     @staticmethod
-    def decode_body(body: bytes):
-        return json.loads(body.decode())
+    def _version_key(namespace: str) -> bytes:
+        return f"cache:versions:{namespace}".encode()
+
+    async def version(self, namespace: str) -> int:
+        "версия пространства имён; в пределах экземпляра (запроса) читается один раз"
+        if namespace not in self._versions:
+            version = self.local.get(self._version_key(namespace)) if self.local is not None else None
+            if version is None:
+                if self.bypass:
+                    return 0
+                try:
+                    version = await self.redis.hget(self.versions_key, namespace) or b"0"
+                except RedisError as e:
+                    self._failed(e)
+                    return 0
+                if self.local is not None:
+                    self.local.set(self._version_key(namespace), version)
+            self._versions[namespace] = int(version)
+        return self._versions[namespace]
+
+    async def make_key(self, key_tuple: tuple) -> bytes:
+        namespace, *rest = key_tuple
+        version = await self.version(str(namespace))
+        return self.format_key((namespace, f"v{version}", *rest))
+
+    async def invalidate(self, *namespaces: str) -> None:
+        "сбрасывает пространства имён за один round-trip"
+        if not namespaces:
+            return
+        if self.bypass:
+            self._skip_invalidation([self._version_key(namespace) for namespace in namespaces])
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for namespace in namespaces:
+                    pipe.hincrby(self.versions_key, namespace, 1)
+                versions = await pipe.execute()
+        except RedisError as e:
+            self._failed(e)
+            self._skip_invalidation([self._version_key(namespace) for namespace in namespaces])
+            return
+        self._versions.update(zip(namespaces, versions))
+        if self.bus is not None:
+            await self.bus.publish([self._version_key(namespace) for namespace in namespaces])
+        if self.metrics is not None:
+            for namespace in namespaces:
+                self.metrics.invalidation(namespace=namespace)
+
+    async def _get(self, key: bytes) -> bytes | None:
+        data = self.local.get(key) if self.local is not None else None
+        if data is not None or self.bypass:
+            return data
+        try:
+            data = await self.redis.get(key)
+        except RedisError as e:
+            self._failed(e)
+            return None
+        if self.local is None:
+            return data
+        self.local.record(key, "l2_hits" if data is not None else "l2_misses")
+        if data is not None:
+            self.local.set(key, data)
+        return data
 
     async def get_raw(self, key_tuple: tuple):
-        key = self.format_key(key_tuple)
-        data = await self.redis.get(key)
+        key = await self.make_key(key_tuple)
+        data = await self._get(key)
         if data is None:
             return None
 
         return self.decode_body(data)
 
-    async def set_raw(self, key_tuple: tuple, body: Any, ttl=None):
-        key = self.format_key(key_tuple)
+    def _tag(self, pipe, key: bytes, tags: Iterable[str], ttl: int) -> None:
+        # множество тега живёт не меньше самого долгого из его ключей
+        for tag in tags:
+            tag_key = self.format_key((self.tag_prefix, tag))
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, ttl, nx=True)
+            pipe.expire(tag_key, ttl, gt=True)
+
+    async def set_raw(self, key_tuple: tuple, body: Any, ttl=None, tags: Iterable[str] = ()):
+        if self.bypass:
+            return
+        key = await self.make_key(key_tuple)
         data = self.encode_body(body)
-        await self.redis.set(key, data, ex=self.ttl if ttl is None else ttl)
+        ttl = self.ttl if ttl is None else ttl
+        tags = set(tags)
+        if self.local is not None:
+            self.local.set(key, data, ttl)
+        if self.metrics is not None:
+            self.metrics.size(key, len(data))
+        try:
+            if not tags:
+                await self.redis.set(key, data, ex=ttl)
+                return
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, data, ex=ttl)
+                self._tag(pipe, key, tags, ttl)
+                await pipe.execute()
+        except RedisError as e:
+            self._failed(e)
 
     async def get(self, key_tuple: tuple):
         data = await self.get_raw(key_tuple)
@@ -178,34 +498,225 @@ class Cache:
 
         return data
 
-    async def set(self, key_tuple: tuple, body: BaseModel | dict, ttl=None):
+    async def get_many(self, key_tuples: list[tuple]) -> list:
+        "значения по списку ключей: L1, остальное одним MGET; None - промах"
+        keys = [await self.make_key(key_tuple) for key_tuple in key_tuples]
+        found: list[bytes | None] = [self.local.get(key) if self.local is not None else None for key in keys]
+        missing = [i for i, data in enumerate(found) if data is None]
+        fetched = []
+        if missing and not self.bypass:
+            try:
+                fetched = await self.redis.mget([keys[i] for i in missing])
+            except RedisError as e:
+                self._failed(e)
+        if fetched:
+            for i, data in zip(missing, fetched):
+                if self.local is not None:
+                    self.local.record(keys[i], "l2_hits" if data is not None else "l2_misses")
+                    if data is not None:
+                        self.local.set(keys[i], data)
+                found[i] = data
+        if self.metrics is not None:
+            for key, data in zip(keys, found):
+                (self.metrics.hit if data is not None else self.metrics.miss)(key)
+        return [self.decode_body(data) if data is not None else None for data in found]
+
+    async def set_many(self, items: list[tuple[tuple, Any, Iterable[str]]], ttl=None) -> None:
+        "записывает (key_tuple, body, tags) одним pipeline"
+        if self.bypass:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key_tuple, body, tags in items:
+                    key = await self.make_key(key_tuple)
+                    data = self.encode_body(body)
+                    if self.local is not None:
+                        self.local.set(key, data, ttl)
+                    if self.metrics is not None:
+                        self.metrics.size(key, len(data))
+                    pipe.set(key, data, ex=ttl)
+                    self._tag(pipe, key, set(tags), ttl)
+                await pipe.execute()
+        except RedisError as e:
+            self._failed(e)
+
+    async def set(self, key_tuple: tuple, body: BaseModel | dict, ttl=None, tags: Iterable[str] = ()):
         if body is not None and isinstance(body, BaseModel):
-            body = body.model_dump()
-        await self.set_raw(key_tuple, body if body is not None else None, ttl)
+            body = body.model_dump(mode="json")
+        await self.set_raw(key_tuple, body if body is not None else None, ttl, tags)
 
     async def delete(self, key_tuple: tuple):
-        key = self.format_key(key_tuple)
-        await self.redis.delete(key)
-
-    async def delete_by_prefix(self, prefix: str):
-        for key in await self.redis.keys(prefix + "*"):
+        key = await self.make_key(key_tuple)
+        if self.bypass:
+            self._skip_invalidation([key])
+            return
+        try:
             await self.redis.delete(key)
-
-    async def behind_cache(self, key_tuple, func, ttl=None, **kwargs):
-        "data.data: from db -> PydanticModel, from cache -> dict"
-
+        except RedisError as e:
+            self._failed(e)
+            self._skip_invalidation([key])
+            return
+        await self._evict([key])
+
+    async def delete_many(self, key_tuples: list[tuple]) -> None:
+        keys = [await self.make_key(key_tuple) for key_tuple in key_tuples]
+        if keys and self.bypass:
+            self._skip_invalidation(keys)
+        elif keys:
+            try:
+                await self.redis.delete(*keys)
+            except RedisError as e:
+                self._failed(e)
+                self._skip_invalidation(keys)
+                return
+            await self._evict(keys)
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        "удаляет записи, помеченные любым из тегов, вместе с множествами тегов"
+        tag_keys = [self.format_key((self.tag_prefix, tag)) for tag in set(tags)]
+        if not tag_keys:
+            return 0
+        if not self.bypass:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for tag_key in tag_keys:
+                        pipe.smembers(tag_key)
+                    members = await pipe.execute()
+                keys = set().union(*members)
+                await self.redis.unlink(*keys, *tag_keys)
+            except RedisError as e:
+                self._failed(e)
+            else:
+                await self._evict(keys)
+                return len(keys)
+        # без Redis ключи тегов неизвестны, поэтому L1 процесса очищается целиком
+        if self.local is not None:
+            self.local.clear()
+        self._skip_invalidation()
+        return 0
+
+    async def delete_by_prefix(self, prefix: str, batch: int = 500) -> int:
+        "удаляет ключи по префиксу через SCAN; для обслуживания, не для горячего пути"
+        return await self.delete_by_pattern(prefix + "*", batch)
+
+    async def delete_by_pattern(self, match: str, batch: int = 500) -> int:
+        "удаляет ключи по glob-шаблону через SCAN; для обслуживания, не для горячего пути"
+        deleted = 0
+        keys = []
+        async for key in self.redis.scan_iter(match=match, count=batch):
+            keys.append(key)
+            if len(keys) >= batch:
+                deleted += await self.redis.unlink(*keys)
+                await self._evict(keys)
+                keys = []
+        if keys:
+            deleted += await self.redis.unlink(*keys)
+            await self._evict(keys)
+        return deleted
+
+    async def sweep(self, batch: int = 500) -> int:
+        "удаляет ключи устаревших версий всех сброшенных пространств имён"
+        if self.bypass:
+            return 0
+        deleted = 0
+        versions = await self.redis.hgetall(self.versions_key)
+        for namespace, current in versions.items():
+            namespace = namespace.decode() if isinstance(namespace, bytes) else namespace
+            prefix = f"{namespace}:v"
+            keys = []
+            async for key in self.redis.scan_iter(match=prefix + "*", count=batch):
+                version = (key.decode() if isinstance(key, bytes) else key)[len(prefix):].split(":", 1)[0]
+                if version.isdigit() and int(version) < int(current):
+                    keys.append(key)
+                if len(keys) >= batch:
+                    deleted += await self.redis.unlink(*keys)
+                    keys = []
+            if keys:
+                deleted += await self.redis.unlink(*keys)
+        return deleted
+
+    async def behind_cache(self, key_tuple, func, ttl=None, tags=(), soft_ttl=None, beta=1.0, db=None, **kwargs):
+        """data.data: from db -> PydanticModel, from cache -> dict
+
+        tags - список тегов или функция, получающая свежие данные и возвращающая теги.
+        soft_ttl - включает stale-while-revalidate, func тогда принимает сессию аргументом db"""
+        if soft_ttl is not None:
+            return await self._behind_cache_swr(key_tuple, func, ttl, tags, soft_ttl, beta, db, kwargs)
+
+        key = await self.make_key(key_tuple)
         data = await self.get(key_tuple)
         if data is not None:
             logging.info("from cache =>")
+            if self.metrics is not None:
+                self.metrics.hit(key)
             return data, True
 
-        logging.info("from db =>")
-        data = await func(**kwargs)
-        await self.set(key_tuple, data, ttl)
-        return data, False
+        async def compute():
+            logging.info("from db =>")
+            data = await func(**kwargs)
+            await self.set(key_tuple, data, ttl, tags(data) if callable(tags) else tags)
+            return data
+
+        if self.metrics is not None:
+            self.metrics.miss(key)
+            compute = _timed(self.metrics, key, compute)
+        if self.flight is None or self.bypass:
+            return await compute(), False
+        return await self.flight.run(key, lambda: self.get(key_tuple), compute)
+
+    async def _behind_cache_swr(self, key_tuple, func, ttl, tags, soft_ttl, beta, db, kwargs):
+
+        key = await self.make_key(key_tuple)
+
+        async def compute(session=db):
+            logging.info("from db =>")
+            started = time.monotonic()
+            data = await func(db=session, **kwargs)
+            delta = time.monotonic() - started
+            body = data.model_dump(mode="json") if isinstance(data, BaseModel) else data
+            envelope = {"body": body, "soft": time.time() + soft_ttl, "delta": delta}
+            await self.set_raw(key_tuple, envelope, ttl, tags(data) if callable(tags) else tags)
+            if self.metrics is not None:
+                self.metrics.fill(key, delta)
+            return data
+
+        async def refresh():
+            async with self.session_factory() as session:
+                await compute(session)
+
+        async def load():
+            envelope = await self.get_raw(key_tuple)
+            return envelope["body"] if envelope is not None else None
+
+        envelope = await self.get_raw(key_tuple)
+        if self.metrics is not None:
+            (self.metrics.hit if envelope is not None else self.metrics.miss)(key)
+        if envelope is None:
+            if self.flight is None or self.bypass:
+                return await compute(), False
+            return await self.flight.run(key, load, compute)
+
+        # XFetch: -log(U) > 0, чем дольше пересчёт, тем раньше возможное обновление
+        early = envelope["delta"] * beta * -math.log(1.0 - random.random())
+        if time.time() + early >= envelope["soft"]:
+            logging.info("stale, refreshing =>")
+            if self.flight is not None and self.session_factory is not None and not self.bypass:
+                self.flight.spawn(key, refresh)
+            else:
+                return await compute(), False
+
+        logging.info("from cache =>")
+        return envelope["body"], True
 
     async def get_keys(self, prefix: str):
-        return await self.redis.keys(prefix)
+        if self.bypass:
+            return []
+        try:
+            return [key async for key in self.redis.scan_iter(match=prefix)]
+        except RedisError as e:
+            self._failed(e)
+            return []
 
     async def behind_cache_raw(self, key_tuple, func, ttl=None):
         data = await self.get_raw(key_tuple)
@@ -216,6 +727,13 @@ class Cache:
         await self.set(key_tuple, data, ttl)
         return data, False
 
-    async def incr(self, key_tuple: tuple) -> int:
-        key = self.format_key(key_tuple)
-        return await self.redis.incr(key)
+    async def incr(self, key_tuple: tuple) -> int | None:
+        "None - Redis недоступен, счётчик не увеличен"
+        if self.bypass:
+            return None
+        key = await self.make_key(key_tuple)
+        try:
+            return await self.redis.incr(key)
+        except RedisError as e:
+            self._failed(e)
+            return None
@@ -0,0 +1,219 @@
+"""Метрики кеша по пространствам имён.
+
+Пространство ключа - metric_namespace: для Cache это первый элемент key_tuple
+(stories_by_user, story_ids, ...), для остальных ключей числовые части
+заменяются на {id} (user:{id}:object).
+
+Счётчики (hits, misses, fills, invalidations), суммы и бакеты гистограмм
+времени заполнения и размера закодированного значения копятся в памяти
+воркера и раз в interval сбрасываются одним pipeline из HINCRBY в хеши
+cache:metrics:<пространство>, поэтому в Redis лежит сумма по всем воркерам.
+Переходы автомата доступности Redis копятся так же в cache:metrics:circuit.
+Неудачный сброс (Redis недоступен) возвращает счётчики в буфер.
+"""
+import asyncio
+import logging
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+FILL_BUCKETS = (0.005, 0.025, 0.1, 0.5, 2.5)
+SIZE_BUCKETS = (256, 1024, 8192, 65536, 524288)
+
+_VERSION = re.compile(r"v\d+")
+
+
+def metric_namespace(key: bytes | str) -> str:
+    if isinstance(key, bytes):
+        key = key.decode()
+    parts = ["{id}" if part.isdigit() else part for part in key.split(":")]
+    # у версионированных ключей Cache всё после версии - аргументы запроса
+    for i, part in enumerate(parts[1:], 1):
+        if _VERSION.fullmatch(part):
+            return ":".join(parts[:i])
+    return ":".join(parts)
+
+
+def _bucket(value: float, buckets: tuple) -> str:
+    for bound in buckets:
+        if value <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+class CacheMetrics:
+    prefix = "cache:metrics"
+    namespaces_key = "cache:metrics:namespaces"
+    circuit_key = "cache:metrics:circuit"
+
+    def __init__(self, redis: Redis, interval: float = 10):
+        self.redis = redis
+        self.interval = interval
+        self._pending: dict[str, Counter] = defaultdict(Counter)
+        self._transitions: Counter = Counter()
+        self._task: asyncio.Task | None = None
+
+    def _key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}"
+
+    def hit(self, key: bytes | str, count: int = 1) -> None:
+        self._pending[metric_namespace(key)]["hits"] += count
+
+    def miss(self, key: bytes | str, count: int = 1) -> None:
+        self._pending[metric_namespace(key)]["misses"] += count
+
+    def fill(self, key: bytes | str, seconds: float) -> None:
+        "время вычисления значения при промахе"
+        pending = self._pending[metric_namespace(key)]
+        pending["fills"] += 1
+        pending["fill_ms_sum"] += round(seconds * 1000)
+        pending[f"fill_{_bucket(seconds, FILL_BUCKETS)}"] += 1
+
+    def size(self, key: bytes | str, size: int) -> None:
+        "размер закодированного значения при записи"
+        pending = self._pending[metric_namespace(key)]
+        pending["writes"] += 1
+        pending["size_sum"] += size
+        pending[f"size_{_bucket(size, SIZE_BUCKETS)}"] += 1
+
+    def invalidation(self, keys: Iterable[bytes | str] = (), namespace: str | None = None) -> None:
+        "сброс ключей или целого пространства"
+        if namespace is not None:
+            self._pending[namespace]["invalidations"] += 1
+        for key in keys:
+            self._pending[metric_namespace(key)]["invalidated_keys"] += 1
+
+    def transition(self, previous: str, state: str) -> None:
+        self._transitions[f"{previous}->{state}"] += 1
+
+    async def flush(self) -> None:
+        if not self._pending and not self._transitions:
+            return
+        pending, self._pending = self._pending, defaultdict(Counter)
+        transitions, self._transitions = self._transitions, Counter()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if pending:
+                    pipe.sadd(self.namespaces_key, *pending)
+                for namespace, counters in pending.items():
+                    for field, value in counters.items():
+                        pipe.hincrby(self._key(namespace), field, value)
+                for field, value in transitions.items():
+                    pipe.hincrby(self.circuit_key, field, value)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache metrics flush failed: {e}")
+            for namespace, counters in pending.items():
+                self._pending[namespace].update(counters)
+            self._transitions.update(transitions)
+
+    async def circuit(self) -> dict[str, int]:
+        "переходы автомата доступности Redis по всем воркерам"
+        return {
+            (field.decode() if isinstance(field, bytes) else field): int(value)
+            for field, value in (await self.redis.hgetall(self.circuit_key)).items()
+        }
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def report(self) -> dict[str, dict]:
+        "сводка по всем воркерам; hit_ratio, средние и гистограммы считаются из сумм"
+        namespaces = sorted(
+            namespace.decode() if isinstance(namespace, bytes) else namespace
+            for namespace in await self.redis.smembers(self.namespaces_key)
+        )
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for namespace in namespaces:
+                pipe.hgetall(self._key(namespace))
+            rows = await pipe.execute()
+
+        report = {}
+        for namespace, row in zip(namespaces, rows):
+            counters = {
+                (field.decode() if isinstance(field, bytes) else field): int(value)
+                for field, value in row.items()
+            }
+            hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+            fills, writes = counters.get("fills", 0), counters.get("writes", 0)
+            report[namespace] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": hits / (hits + misses) if hits + misses else None,
+                "fills": fills,
+                "fill_ms_avg": counters.get("fill_ms_sum", 0) / fills if fills else None,
+                "fill_ms": {
+                    f"le_{bound * 1000:g}": counters.get(f"fill_le_{bound}", 0) for bound in FILL_BUCKETS
+                } | {"le_inf": counters.get("fill_le_inf", 0)},
+                "writes": writes,
+                "size_avg": counters.get("size_sum", 0) / writes if writes else None,
+                "size": {
+                    f"le_{bound}": counters.get(f"size_le_{bound}", 0) for bound in SIZE_BUCKETS
+                } | {"le_inf": counters.get("size_le_inf", 0)},
+                "invalidations": counters.get("invalidations", 0),
+                "invalidated_keys": counters.get("invalidated_keys", 0),
+            }
+        return report
+
+    async def reset(self, *namespaces: str) -> None:
+        if not namespaces:
+            namespaces = [
+                namespace.decode() if isinstance(namespace, bytes) else namespace
+                for namespace in await self.redis.smembers(self.namespaces_key)
+            ]
+        if namespaces:
+            await self.redis.delete(*[self._key(namespace) for namespace in namespaces])
+            await self.redis.srem(self.namespaces_key, *namespaces)
+
+    async def sample_keyspace(self, sample: int = 2000, batch: int = 500) -> dict[str, dict]:
+        """оценка числа ключей и памяти по пространствам: SCAN первых sample ключей,
+        MEMORY USAGE по каждому, пропорция переносится на DBSIZE"""
+        total = await self.redis.dbsize()
+        keys = []
+        async for key in self.redis.scan_iter(count=batch):
+            if metric_namespace(key).startswith(self.prefix):
+                continue
+            keys.append(key)
+            if len(keys) >= sample:
+                break
+        if not keys:
+            return {}
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.memory_usage(key)
+            usage = await pipe.execute()
+
+        sampled: dict[str, list[int]] = defaultdict(list)
+        for key, memory in zip(keys, usage):
+            sampled[metric_namespace(key)].append(memory or 0)
+
+        scale = max(total, len(keys)) / len(keys)
+        return {
+            namespace: {
+                "sampled_keys": len(memory),
+                "estimated_keys": round(len(memory) * scale),
+                "estimated_memory": round(sum(memory) * scale),
+            }
+            for namespace, memory in sampled.items()
+        }
@@ -0,0 +1,155 @@
+"""Автомат доступности Redis (circuit breaker).
+
+Вместо PING на каждый запрос фоновая задача воркера пингует Redis раз в interval:
+
+:closed: Redis доступен, кеш работает как обычно
+:open: failure_threshold неудачных пингов подряд; Cache и RedisCache работают
+    как сквозные (чтение - промах, запись и сброс пропускаются), запросы идут в БД
+:half_open: через reset_timeout после открытия пинги становятся пробными,
+    probe_successes успешных подряд закрывают автомат, любая неудача - снова open
+
+Ошибки Redis в самих запросах (failure) считаются так же, как неудачные пинги:
+автомат открывается, не дожидаясь failure_threshold фоновых проверок.
+
+Пропущенный за время open сброс (skipped) нельзя повторить точно, поэтому при
+закрытии автомата вызываются on_recover - они сбрасывают кеш целиком.
+"""
+import asyncio
+import enum
+import logging
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from app.utils.cache_metrics import CacheMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, enum.Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class RedisCircuitBreaker:
+
+    def __init__(
+            self,
+            redis: Redis,
+            interval: float = 1,
+            ping_timeout: float = 0.5,
+            failure_threshold: int = 3,
+            reset_timeout: float = 5,
+            probe_successes: int = 2,
+            metrics: CacheMetrics | None = None,
+    ):
+        self.redis = redis
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_successes = probe_successes
+        self.metrics = metrics
+        self.state = CircuitState.closed
+        self.transitions: Counter = Counter()
+        self._failures = 0
+        self._successes = 0
+        self._opened_at = 0.0
+        self._skipped = False
+        self._on_recover: list[Callable[[], Awaitable[None]]] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CircuitState.closed
+
+    def on_recover(self, callback: Callable[[], Awaitable[None]]) -> None:
+        self._on_recover.append(callback)
+
+    def skipped(self) -> None:
+        "сброс или запись в Redis пропущены, пока автомат не closed"
+        self._skipped = True
+
+    def failure(self, error: Exception) -> None:
+        "ошибка Redis в запросе, пока автомат ещё closed или half_open"
+        logger.warning(f"Redis call failed: {error}")
+        if self.state == CircuitState.open:
+            return
+        self._failures += 1
+        if self.state == CircuitState.half_open or self._failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._transition(CircuitState.open)
+
+    def _transition(self, state: CircuitState) -> None:
+        previous, self.state = self.state, state
+        self.transitions[f"{previous.value}->{state.value}"] += 1
+        if self.metrics is not None:
+            self.metrics.transition(previous.value, state.value)
+        log = logger.info if state == CircuitState.closed else logger.warning
+        log(f"Redis circuit {previous.value} -> {state.value}")
+
+    async def _ping(self) -> bool:
+        try:
+            return bool(await asyncio.wait_for(self.redis.ping(), self.ping_timeout))
+        except Exception as e:
+            logger.debug(f"Redis ping failed: {e}")
+            return False
+
+    async def check(self) -> None:
+        "один шаг автомата; вызывается фоновой задачей"
+        if self.state == CircuitState.open:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return
+            self._successes = 0
+            self._transition(CircuitState.half_open)
+
+        if await self._ping():
+            self._failures = 0
+            if self.state == CircuitState.half_open:
+                self._successes += 1
+                if self._successes >= self.probe_successes:
+                    self._transition(CircuitState.closed)
+                    await self._recover()
+            return
+
+        self._failures += 1
+        if self.state == CircuitState.half_open or self._failures >= self.failure_threshold:
+            self._open()
+
+    async def _recover(self) -> None:
+        if not self._skipped:
+            return
+        self._skipped = False
+        for callback in self._on_recover:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Redis recovery callback failed: {e}")
+                self._skipped = True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Redis circuit check failed: {e}")
@@ -0,0 +1,142 @@
+"""Кодеки значений кеша.
+
+Первый байт значения - заголовок 0b11FFFCCC: FFF - формат, CCC - сжатие.
+Старые значения без заголовка (json начинается с ASCII, pickle - с 0x80)
+читаются как раньше, поэтому смена кодека не требует сброса Redis.
+
+Форматы: json (orjson, если установлен), msgpack, pickle (только для объектов SQLAlchemy).
+Сжатие выше порога: zstd, lz4 или zlib - по умолчанию первое установленное.
+Явно выбранные msgpack, zstd или lz4 без установленной библиотеки - ошибка
+конфигурации при создании Codec, а не при первой записи.
+"""
+import enum
+import json
+import pickle
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+
+class CodecFormat(enum.IntEnum):
+    json = 0
+    msgpack = 1
+    pickle = 2
+
+
+class Compression(enum.IntEnum):
+    none = 0
+    zlib = 1
+    zstd = 2
+    lz4 = 3
+
+
+HEADER_MARK = 0b11000000
+
+
+def installed_compressions() -> list[Compression]:
+    "установленные алгоритмы сжатия в порядке предпочтения"
+    installed = []
+    if zstandard is not None:
+        installed.append(Compression.zstd)
+    if lz4_frame is not None:
+        installed.append(Compression.lz4)
+    return installed + [Compression.zlib]
+
+
+def _msgpack_default(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+
+class Codec:
+
+    def __init__(
+            self,
+            format: CodecFormat = CodecFormat.json,
+            compression: Compression | None = None,
+            threshold: int = 1024,
+    ):
+        if format == CodecFormat.msgpack and msgpack is None:
+            raise ValueError("CACHE_CODEC=msgpack, но пакет msgpack не установлен")
+        if compression is not None and compression not in installed_compressions() + [Compression.none]:
+            raise ValueError(f"CACHE_COMPRESSION={compression.name}, но библиотека сжатия не установлена")
+        self.format = format
+        self.compression = installed_compressions()[0] if compression is None else compression
+        self.threshold = threshold
+        self._zstd_compressor = zstandard.ZstdCompressor() if zstandard is not None else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    @staticmethod
+    def _dumps(value: Any, format: CodecFormat) -> bytes:
+        if format == CodecFormat.json:
+            if orjson is not None:
+                return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+            return json.dumps(value).encode()
+        if format == CodecFormat.msgpack:
+            return msgpack.packb(value, use_bin_type=True, default=_msgpack_default)
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(data: bytes, format: CodecFormat) -> Any:
+        if format == CodecFormat.json:
+            return orjson.loads(data) if orjson is not None else json.loads(data)
+        if format == CodecFormat.msgpack:
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return pickle.loads(data)
+
+    def _compress(self, data: bytes, compression: Compression) -> bytes:
+        if compression == Compression.zstd:
+            return self._zstd_compressor.compress(data)
+        if compression == Compression.lz4:
+            return lz4_frame.compress(data)
+        return zlib.compress(data, 6)
+
+    def _decompress(self, data: bytes, compression: Compression) -> bytes:
+        if compression == Compression.zstd:
+            return self._zstd_decompressor.decompress(data)
+        if compression == Compression.lz4:
+            return lz4_frame.decompress(data)
+        return zlib.decompress(data)
+
+    def encode(self, value: Any, format: CodecFormat | None = None) -> bytes:
+        format = self.format if format is None else format
+        data = self._dumps(value, format)
+        compression = Compression.none
+        if self.compression != Compression.none and len(data) > self.threshold:
+            compressed = self._compress(data, self.compression)
+            if len(compressed) < len(data):
+                data, compression = compressed, self.compression
+        return bytes([HEADER_MARK | format << 3 | compression]) + data
+
+    def decode(self, data: bytes) -> Any:
+        header = data[0]
+        if header & HEADER_MARK != HEADER_MARK:
+            # значение, записанное до введения кодеков
+            return pickle.loads(data) if header == 0x80 else json.loads(data)
+
+        format = CodecFormat(header >> 3 & 0b111)
+        compression = Compression(header & 0b111)
+        data = data[1:]
+        if compression != Compression.none:
+            data = self._decompress(data, compression)
+        return self._loads(data, format)
@@ -0,0 +1,129 @@
+"""Стратегии подсчёта общего количества элементов для Paginator.total.
+
+:ExactCount: точный count(*) по подзапросу, как раньше.
+:CachedCount: точный count(*), закешированный в Redis по нормализованному запросу.
+    Кеш сбрасывается через invalidate_counts (версия пространства имён) при изменениях таблицы.
+:EstimatedCount: оценка планировщика (pg_class.reltuples или EXPLAIN),
+    для небольших результатов подставляется точное значение.
+:CappedCount: считает не дальше cap + 1 строки.
+"""
+import hashlib
+import json
+import logging
+from typing import Any
+
+from sqlalchemy import Select, func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(select_stmt: Select) -> str:
+    "SQL запроса с подставленными значениями; служит нормализованным ключом фильтров"
+    return str(
+        select_stmt.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={"literal_binds": True},
+        )
+    )
+
+
+async def _exact_count(db: AsyncSession, select_stmt: Select) -> int:
+    count_stmt = select(func.count()).select_from(select_stmt.order_by(None).subquery())
+    return (await db.scalars(count_stmt)).one()
+
+
+class CountStrategy:
+    "returns (count, is_exact)"
+
+    async def count(self, db: AsyncSession, select_stmt: Select) -> tuple[int, bool]:
+        raise NotImplementedError
+
+
+class ExactCount(CountStrategy):
+
+    async def count(self, db: AsyncSession, select_stmt: Select) -> tuple[int, bool]:
+        return await _exact_count(db, select_stmt), True
+
+
+class CachedCount(CountStrategy):
+    prefix = "count"
+
+    def __init__(self, cache: Cache, namespace: str, ttl: int | None = None):
+        self.cache = cache
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def key_tuple(self, select_stmt: Select) -> tuple:
+        try:
+            normalized = _compile(select_stmt.order_by(None))
+        except Exception:
+            compiled = select_stmt.order_by(None).compile(dialect=postgresql.dialect())
+            normalized = str(compiled) + json.dumps(compiled.params, sort_keys=True, default=str)
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        return f"{self.prefix}:{self.namespace}", digest
+
+    async def count(self, db: AsyncSession, select_stmt: Select) -> tuple[int, bool]:
+        key_tuple = self.key_tuple(select_stmt)
+        item_count = await self.cache.get_raw(key_tuple)
+        if item_count is None:
+            item_count = await _exact_count(db, select_stmt)
+            await self.cache.set_raw(key_tuple, item_count, self.ttl)
+        return item_count, True
+
+
+class EstimatedCount(CountStrategy):
+
+    def __init__(self, exact_below: int = 10000):
+        self.exact_below = exact_below
+
+    async def _reltuples(self, db: AsyncSession, table_name: str) -> int | None:
+        result = await db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+            {"name": f'public."{table_name}"'},
+        )
+        estimate = result.scalar_one_or_none()
+        return estimate if estimate is not None and estimate >= 0 else None
+
+    async def _explain(self, db: AsyncSession, select_stmt: Select) -> int | None:
+        try:
+            sql = _compile(select_stmt.order_by(None))
+        except Exception as e:
+            logger.warning(f"EstimatedCount: cannot compile statement: {e}")
+            return None
+        result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        plan: Any = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def count(self, db: AsyncSession, select_stmt: Select) -> tuple[int, bool]:
+        froms = select_stmt.get_final_froms()
+        if select_stmt.whereclause is None and len(froms) == 1 and hasattr(froms[0], "name"):
+            estimate = await self._reltuples(db, froms[0].name)
+        else:
+            estimate = await self._explain(db, select_stmt)
+
+        if estimate is None or estimate < self.exact_below:
+            return await _exact_count(db, select_stmt), True
+        return estimate, False
+
+
+class CappedCount(CountStrategy):
+
+    def __init__(self, cap: int = 1000):
+        self.cap = cap
+
+    async def count(self, db: AsyncSession, select_stmt: Select) -> tuple[int, bool]:
+        item_count = await _exact_count(db, select_stmt.limit(self.cap + 1))
+        if item_count > self.cap:
+            return self.cap, False
+        return item_count, True
+
+
+async def invalidate_counts(cache: Cache, namespace: str) -> None:
+    "сбрасывает закешированные CachedCount пространства имён (вызывать при записи в таблицу)"
+    await cache.invalidate(f"{CachedCount.prefix}:{namespace}")
@@ -0,0 +1,138 @@
+"""L1-кеш процесса перед Redis.
+
+:LocalCache: ограниченный LRU с TTL, отдельный лимит на каждое пространство имён
+    (часть ключа до первого ":"). Хранит сырые байты из Redis, поэтому
+    десериализация выполняется на каждом попадании и запросы не делят изменяемые объекты.
+:InvalidationBus: рассылает удалённые ключи через Redis pub/sub, каждый воркер
+    слушает канал в фоне и вытесняет их из своего L1.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Iterable
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+def namespace_of(key: bytes | str) -> str:
+    if isinstance(key, bytes):
+        key = key.decode()
+    return key.split(":", 1)[0]
+
+
+class LocalCache:
+
+    def __init__(self, size: int = 1000, ttl: int = 30, limits: dict[str, int] | None = None):
+        self.size = size
+        self.ttl = ttl
+        self.limits = limits or {}
+        self._entries: dict[str, OrderedDict[bytes, tuple[float, bytes]]] = defaultdict(OrderedDict)
+        self.stats: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0, "evictions": 0}
+        )
+
+    @staticmethod
+    def _key(key: bytes | str) -> bytes:
+        return key if isinstance(key, bytes) else key.encode()
+
+    def record(self, key: bytes | str, metric: str) -> None:
+        self.stats[namespace_of(key)][metric] += 1
+
+    def get(self, key: bytes | str) -> bytes | None:
+        key = self._key(key)
+        namespace = namespace_of(key)
+        entries = self._entries[namespace]
+        entry = entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del entries[key]
+            self.stats[namespace]["l1_misses"] += 1
+            return None
+
+        entries.move_to_end(key)
+        self.stats[namespace]["l1_hits"] += 1
+        return entry[1]
+
+    def set(self, key: bytes | str, value: bytes, ttl: int | None = None) -> None:
+        key = self._key(key)
+        namespace = namespace_of(key)
+        limit = self.limits.get(namespace, self.size)
+        if limit <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        entries = self._entries[namespace]
+        entries[key] = (time.monotonic() + ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+            self.stats[namespace]["evictions"] += 1
+
+    def evict(self, keys: Iterable[bytes | str]) -> None:
+        for key in keys:
+            key = self._key(key)
+            self._entries[namespace_of(key)].pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        "метрики и размер по пространствам имён"
+        return {
+            namespace: {**stats, "size": len(self._entries.get(namespace, ()))}
+            for namespace, stats in self.stats.items()
+        }
+
+
+class InvalidationBus:
+
+    def __init__(self, redis: Redis, local: LocalCache, channel: str):
+        self.redis = redis
+        self.local = local
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+
+    async def publish(self, keys: Iterable[bytes | str]) -> None:
+        "вытесняет ключи из своего L1 сразу и из L1 остальных воркеров через канал"
+        keys = [key.decode() if isinstance(key, bytes) else key for key in keys]
+        if not keys:
+            return
+        self.local.evict(keys)
+        try:
+            await self.redis.publish(self.channel, json.dumps(keys))
+        except Exception as e:
+            logger.error(f"Cache invalidation publish failed: {e}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # пока не были подписаны, сообщения могли потеряться
+                    self.local.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.local.evict(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed: {e}")
+                self.local.clear()
+                await asyncio.sleep(1)
@@ -1,9 +1,16 @@
+import base64
+import json
 import logging
+from datetime import datetime
+from typing import Any, Sequence
 
-from sqlalchemy import Select, func, select
+from sqlalchemy import Select, func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
 
+from app.exceptions import UnprocessableEntity
 from app.schemas.response import Paginator
+from app.utils.counting import CountStrategy, ExactCount
 
 
 async def get_page_async(
@@ -12,29 +19,117 @@ async def get_page_async(
     page: int | None = None,
     size: int | None = None,
     scalars: bool = True,
+    counter: CountStrategy | None = None,
 ) -> tuple[list, Paginator | None]:
+    """counter - стратегия подсчёта Paginator.total (по умолчанию точный count).
+
+    Если стратегия вернула неточное значение, has_next определяется
+    выборкой size + 1 строки, а не по количеству страниц.
+    """
     paginator = None
     if page:
         if size is None or size > 1000:
             size = 30
-        count_stmt = select(func.count()).select_from(select_stmt.subquery())
-        item_count = (await db.scalars(count_stmt)).one()
-        logging.info(f"{item_count=}")
+        item_count, is_exact = await (counter or ExactCount()).count(db, select_stmt)
+        logging.info(f"{item_count=} {is_exact=}")
         page_count = ((item_count - 1) // size) + 1
+        offset = (page - 1) * size
+        select_stmt = select_stmt.offset(offset).limit(size if is_exact else size + 1)
+        items = (await db.execute(select_stmt)).unique()
+        if scalars:
+            items = items.scalars()
+        items = items.all()
+        if is_exact:
+            has_next = page < page_count
+        else:
+            has_next = len(items) > size
+            items = items[:size]
+            page_count = max(page_count, page + int(has_next))
         paginator = Paginator(
             page=page,
             total=page_count,  # кол-во страниц
             has_prev=page > 1,
-            has_next=page < page_count,
+            has_next=has_next,
+            is_total_exact=is_exact,
         )
-        offset = (page - 1) * size
-        select_stmt = select_stmt.offset(offset).limit(size)
+        return items, paginator
     items = (await db.execute(select_stmt)).unique()
     if scalars:
         items = items.scalars()
     return items.all(), paginator
 
 
+def encode_cursor(values: Sequence[Any]) -> str:
+    "значения ключа последнего элемента страницы -> непрозрачная строка курсора"
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> list[Any] | None:
+    "строка курсора -> значения ключа. Пустой курсор означает первую страницу"
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise UnprocessableEntity(message="Некорректный курсор", path="$query.cursor")
+
+
+async def get_page_keyset_async(
+    db: AsyncSession,
+    select_stmt: Select,
+    cursor: str | None,
+    order_columns: Sequence[InstrumentedAttribute],
+    size: int | None = None,
+    scalars: bool = True,
+) -> tuple[list, Paginator]:
+    """Постраничная выборка по ключу (keyset) без OFFSET и без подсчёта общего количества.
+
+    Выборка упорядочивается по убыванию order_columns (например created, id),
+    следующая страница начинается строго после ключа из курсора.
+    """
+    size = 30 if size is None or size > 1000 else size
+    key = decode_cursor(cursor)
+    if key is not None and len(key) != len(order_columns):
+        raise UnprocessableEntity(message="Некорректный курсор", path="$query.cursor")
+
+    select_stmt = select_stmt.order_by(None).order_by(*(column.desc() for column in order_columns))
+    if key is not None:
+        select_stmt = select_stmt.where(tuple_(*order_columns) < tuple_(*key))
+    select_stmt = select_stmt.limit(size + 1)
+
+    items = (await db.execute(select_stmt)).unique()
+    if scalars:
+        items = items.scalars()
+    items = items.all()
+
+    has_next = len(items) > size
+    items = items[:size]
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in order_columns])
+
+    paginator = Paginator(
+        page=1,
+        total=None,
+        has_prev=key is not None,
+        has_next=has_next,
+        next_cursor=next_cursor,
+    )
+    return items, paginator
+
+
 async def get_page_async_no_total(
     db: AsyncSession,
     select_stmt: Select,
@@ -0,0 +1,28 @@
+"""Побочные эффекты записи, выполняемые после коммита.
+
+Запись уже сохранена: сбой сброса кеша, рассылки в ленты или счётчика популярности
+(например, Redis упал раньше, чем redis_breaker это заметил) логируется и не
+превращает ответ в 500. Сбой отмечается в breaker как пропущенный сброс, поэтому
+после восстановления Redis кеш сбрасывается целиком, а не доживает до TTL.
+"""
+import logging
+from typing import Awaitable
+
+from redis.exceptions import RedisError
+
+from app.utils.circuit_breaker import RedisCircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+async def after_commit(*effects: Awaitable, breaker: RedisCircuitBreaker | None = None) -> None:
+    "выполняет эффекты по порядку; сбой одного не отменяет следующие"
+    for effect in effects:
+        try:
+            await effect
+        except Exception as e:
+            logger.exception("Post-commit side effect failed")
+            if breaker is not None:
+                if isinstance(e, RedisError):
+                    breaker.failure(e)
+                breaker.skipped()
@@ -0,0 +1,137 @@
+"""Объединение одновременных промахов кеша (single-flight).
+
+Внутри воркера на ключ заводится один future: остальные запросы ждут его и
+читают уже заполненный кеш. Между воркерами вычисление защищено коротким
+Redis-локом, ожидающие опрашивают кеш до заполнения, снятия лока или таймаута.
+
+spawn запускает фоновое обновление устаревшего ключа (stale-while-revalidate):
+не более одного на ключ в процессе и, через лок, в кластере.
+"""
+import asyncio
+import copy
+import logging
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+
+    def __init__(self, redis: Redis, lock_ttl: int = 10, wait_timeout: float = 5, poll_interval: float = 0.05):
+        self.redis = redis
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._release = redis.register_script(RELEASE_LOCK)
+
+    async def run(
+            self,
+            key: bytes | str,
+            load: Callable[[], Awaitable[Any]],
+            compute: Callable[[], Awaitable[Any]],
+    ) -> tuple[Any, bool]:
+        """load - чтение из кеша (None - промах), compute - вычисление с записью в кеш.
+
+        Возвращает (значение, из кеша)"""
+        key = key.decode() if isinstance(key, bytes) else key
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                result, _ = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                return await self.run(key, load, compute)
+            # свой экземпляр из кеша, а не объект ведущего запроса
+            value = await load()
+            if value is not None:
+                return value, True
+            # ведущий не записал кеш (ошибка записи, Redis недоступен или значение не кешируется):
+            # копия, чтобы ожидающие не делили изменяемый объект
+            logger.warning(f"SingleFlight follower of {key} missed the cache after the leader")
+            return copy.deepcopy(result), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_locked(key, load, compute)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run_locked(self, key: str, load, compute) -> tuple[Any, bool]:
+        lock = f"cache:lock:{key}"
+        token = uuid4().hex
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while True:
+            try:
+                acquired = await self.redis.set(lock, token, nx=True, ex=self.lock_ttl)
+            except Exception as e:
+                logger.error(f"SingleFlight lock failed: {e}")
+                return await compute(), False
+
+            if acquired:
+                try:
+                    value = await load()
+                    if value is not None:
+                        return value, True
+                    return await compute(), False
+                finally:
+                    try:
+                        await self._release(keys=[lock], args=[token])
+                    except Exception as e:
+                        # лок истечёт по lock_ttl, вычисленное значение не теряется
+                        logger.error(f"SingleFlight unlock failed: {e}")
+
+            await asyncio.sleep(self.poll_interval)
+            value = await load()
+            if value is not None:
+                return value, True
+            if loop.time() >= deadline:
+                return await compute(), False
+
+    def spawn(self, key: bytes | str, refresh: Callable[[], Awaitable[Any]]) -> None:
+        key = key.decode() if isinstance(key, bytes) else key
+        if key in self._refreshing or key in self._inflight:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, refresh))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: str, refresh) -> None:
+        lock = f"cache:refresh:{key}"
+        token = uuid4().hex
+        try:
+            if await self.redis.set(lock, token, nx=True, ex=self.lock_ttl):
+                try:
+                    await refresh()
+                finally:
+                    await self._release(keys=[lock], args=[token])
+        except Exception as e:
+            logger.error(f"Background cache refresh of {key} failed: {e}")
+        finally:
+            self._refreshing.discard(key)
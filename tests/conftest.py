@@ -0,0 +1,19 @@
+import os
+
+# .env в корне репозитория - переменные docker-compose, лишние для Settings
+os.chdir(os.path.dirname(__file__))
+
+# обязательные настройки app.config; реальные значения не нужны - тесты не ходят в Redis и S3
+for name, value in {
+    "API_STR": "/api",
+    "PROJECT_NAME": "test",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "test",
+    "FIRST_SUPERUSER": "admin",
+    "FIRST_SUPERUSER_PASSWORD": "admin",
+    "REDIS_URL": "redis://localhost:6379/15",
+    "CACHE_TTL": "60",
+}.items():
+    os.environ.setdefault(name, value)